@@ -9,6 +9,7 @@ import threading
 import queue
 import argparse
 import copy
+import functools
 import json
 from pathlib import Path
 
@@ -20,7 +21,20 @@ from utilities.model_catalog import (
 from utilities.HF_model_downloader import (
     download_hf_file,
     download_hf_snapshot,
+    create_downloader,
+    CONNECTION_BUDGET,
+    BANDWIDTH_LIMITER,
+    DEFAULT_DOWNLOAD_CONFIG,
+    REPO_METADATA,
 )
+from utilities.file_audit import audit_files
+from utilities.download_planner import plan_downloads, recent_throughput, VERIFY as PLAN_VERIFY
+from utilities.blob_store import BlobStore
+from utilities.file_mover import FILE_MOVER
+from utilities.peer_cache import PeerCacheServer
+from utilities.download_queue import DownloadTaskQueue, task_role, MOVING as TASK_MOVING
+from utilities.download_metrics import MetricsServer, QUEUE_DEPTH, RUNNING_DOWNLOADS, TASKS, TASK_SECONDS
+from utilities.event_bus import EventBus, format_event
 from utilities.url_downloader import create_url_downloader
 from utilities.folder_manager import create_folder_manager
 try:
@@ -673,30 +687,57 @@ def ensure_directories_exist(base_path: str, is_comfy_ui_structure: bool, is_for
 
 # --- Download Queue and Worker ---
 
-download_queue = queue.Queue()
-status_updates = queue.Queue()
+download_queue = DownloadTaskQueue()
+ui_events = EventBus()  # Log lines and per-download progress, pulled by the UI timer
+LOG_LINES_SHOWN = 100  # Log lines in the status box
 stop_worker = threading.Event()
 cancel_current_download = threading.Event()  # New: Signal to cancel current download
-current_download_info = {"model_name": None, "file_path": None}  # Track current download
-current_download_lock = threading.Lock()  # Protect current download info
-log_history = []
-log_lock = threading.Lock()
+active_downloads = {}  # Worker thread id -> {"model_name", "file_path"} for every running download
+active_downloads_lock = threading.Lock()  # Protect active downloads
+current_task = threading.local()  # The queue task each worker thread is running
+QUEUE_DEPTH.set_function(download_queue.qsize)
+RUNNING_DOWNLOADS.set_function(lambda: len(active_downloads))
+worker_threads = []
+DEFAULT_PARALLEL_DOWNLOADS = 3  # Models downloaded at the same time
+DEFAULT_MAX_CONNECTIONS = 32  # Connections shared by all running downloads
+download_settings = {"engine": "thread", "model_store": True}  # Set from the command line at startup
+hf_transfer_env_lock = threading.Lock()  # HF_HUB_ENABLE_HF_TRANSFER is process-wide, shared by workers
+hf_transfer_env_state = {"users": 0, "original": None}
+audit_lock = threading.Lock()  # One bulk SHA256 audit at a time; each already uses every core
+audits_pending = {}  # Target path -> Event set once the background audit covering it has finished
+
+def report_task_state(state):
+    """Status callback for the downloader: records downloading/verifying on the running task"""
+    task = getattr(current_task, "task", None)
+    if task is not None:
+        download_queue.set_state(task, state)
+
+def report_task_progress(text):
+    """Progress callback for the downloader: latest progress line of the running task"""
+    task = getattr(current_task, "task", None)
+    if task is not None:
+        ui_events.set_progress(task.task_id, text)
+
+def render_progress(progress):
+    return "\n".join(progress.values()) if progress else "No download running."
+
+def restore_download_queue(discard=False):
+    """Keep the queue in the download cache database and re-queue what the last run left unfinished"""
+    cache_store = create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread").cache_store
+    if cache_store is None:
+        print("Warning: Download cache database unavailable; the queue will not survive a restart.")
+        return
+    table = cache_store.table("download_tasks")
+    if discard:
+        table.clear()
+    restored = download_queue.restore(table)
+    if restored:
+        add_log(f"Restored {restored} unfinished downloads from the previous session; partial files resume where they stopped.")
 
 def add_log(message):
-    """Adds a message to the log history and prints it."""
+    """Prints a message and publishes it to the UI event bus."""
     print(message)
-    with log_lock:
-        log_history.append(f"[{time.strftime('%H:%M:%S')}] {message}")
-        if len(log_history) > 100:
-            log_history.pop(0)
-    if status_updates:
-        try:
-            log_str = "\n".join(map(str, log_history))
-            status_updates.put_nowait(log_str) 
-        except queue.Full:
-            print("Warning: Status update queue is full, skipping update.") 
-        except Exception as e:
-            print(f"Error putting log update to queue: {e}")
+    ui_events.publish(message)
 
 
 def get_target_path(base_path: str, model_info: dict, sub_category_info: dict, is_comfy_ui_structure: bool, is_forge_structure: bool = False, lowercase_folders: bool = False) -> str:
@@ -724,10 +765,79 @@ def get_target_path(base_path: str, model_info: dict, sub_category_info: dict, i
         add_log(f"ERROR: Could not ensure target directory {target_dir} exists: {e}")
     return target_dir
 
+def render_queue_table():
+    """Markdown table of running and waiting downloads for the queue panel."""
+    running, queued = download_queue.snapshot()
+    if not running and not queued:
+        return "*The download queue is empty.*"
+    lines = ["| # | ID | Model | Size | Type | State |", "|---|---|---|---|---|---|"]
+    rows = [("▶", task) for task in running] + [(str(position), task) for position, task in enumerate(queued, 1)]
+    for position, task in rows:
+        size = f"{task['size'] / (1024 ** 3):.2f} GB" if task['size'] else "?"
+        name = str(task['name']).replace("|", "/")
+        lines.append(f"| {position} | {task['id']} | {name} | {size} | {task['role']} | {task['state']} |")
+    return "\n".join(lines)
+
+def plan_models(models, base_path, is_comfy_ui_structure, is_forge_structure=False, lowercase_folders=False):
+    """Plan a single, bulk or bundle request before anything is queued.
+
+    models is a list of (model_info, sub_category_info). Logs what will be
+    downloaded, verified, linked or skipped with the estimated time. Returns
+    the DownloadPlan, or None if it doesn't fit on disk and nothing may be
+    queued. Already-present files are checked afterwards by
+    audit_in_background(), once the tasks are queued.
+    """
+    downloader = create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread")
+    targets = [(model_info, get_target_path(base_path, model_info, sub_category_info, is_comfy_ui_structure, is_forge_structure, lowercase_folders))
+               for model_info, sub_category_info in models]
+    blob_store = BlobStore(base_path) if download_settings["model_store"] else None
+    plan = plan_downloads(targets, downloader, blob_store, recent_throughput(downloader, BANDWIDTH_LIMITER.rate))
+    for line in plan.summary_lines():
+        add_log(line)
+    if not plan.fits:
+        add_log("ERROR: Not enough free disk space for this request. Nothing was queued.")
+        return None
+    return plan
+
+def audit_in_background(plan):
+    """SHA256-check the plan's already-present files at once (process pool) on a background thread.
+
+    Runs after the tasks are queued so the click returns right away. Matches
+    land in the verified cache; a task whose file is still being checked
+    waits for the audit instead of hashing the file again on its own.
+    """
+    to_verify = plan.by_action(PLAN_VERIFY)
+    if not to_verify:
+        return
+    done = threading.Event()
+    for item in to_verify:
+        audits_pending[item["path"]] = done
+
+    def run():
+        try:
+            with audit_lock:
+                add_log(f"Checking {len(to_verify)} existing files (SHA256, in parallel)...")
+                report = audit_files(create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread"), to_verify)
+            for entry in report["corrupt"]:
+                add_log(f"  -> {os.path.basename(entry['path'])} failed verification ({entry.get('error')}), will re-download")
+            add_log(f"Existing files: {len(report['verified'])} verified, {len(report['corrupt'])} corrupt.")
+        except Exception as e:
+            add_log(f"WARNING: Checking existing files failed ({e}); each download verifies its own file instead.")
+        finally:
+            for item in to_verify:
+                if audits_pending.get(item["path"]) is done:
+                    del audits_pending[item["path"]]
+            done.set()
+
+    threading.Thread(target=run, name="file-audit", daemon=True).start()
+
 def _download_model_internal(model_info, sub_category_info, base_path, use_hf_transfer, is_comfy_ui_structure, is_forge_structure=False, lowercase_folders=False):
     """
     Handles the download of a single model or snapshot directly to the target folder.
     
+    Returns True once the model is in place, or its target path while a download staged
+    on scratch is still being moved there; anything else means it failed or was cancelled.
+
     SHA Verification Logic:
     - For individual files: HF downloader automatically verifies SHA256 from HuggingFace
     - If file exists and SHA matches: Skip download (file is verified correct)
@@ -744,11 +854,6 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
     pre_delete = model_info.get('pre_delete_target', False)
     # Removed allow_overwrite - SHA verification will handle this automatically
 
-    # Update current download tracking
-    with current_download_lock:
-        current_download_info["model_name"] = model_name
-        current_download_info["file_path"] = None
-
     if not repo_id:
         add_log(f"ERROR: Missing 'repo_id' for model {model_name}. Skipping.")
         return
@@ -788,6 +893,15 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
         else:
             add_log(f"INFO: Creating snapshot target directory '{target_dir}' for download.")
 
+    # Files of this model still in a background audit: wait for it rather than hash them again
+    audits = {done for path, done in list(audits_pending.items())
+              if path == final_target_path or (is_snapshot and path.startswith(os.path.join(target_dir, "")))}
+    if any(not done.is_set() for done in audits):
+        add_log(f"Waiting for the SHA256 check of existing files of {model_name} to finish...")
+        while not all(done.wait(0.5) for done in audits):
+            if cancel_current_download.is_set():
+                break
+
     add_log(f"Starting download: {model_name}...")
     
     # Check for cancellation before starting
@@ -796,6 +910,9 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
         return
     
     try:
+        # Update current download tracking (the finally below removes it on every way out)
+        with active_downloads_lock:
+            active_downloads[threading.get_ident()] = {"model_name": model_name, "file_path": None}
         start_time = time.time()
         actual_downloaded_path = None 
 
@@ -806,6 +923,9 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
                 target_dir=target_dir,
                 allow_patterns=allow_patterns,
                 cancel_event=cancel_current_download,
+                engine=download_settings["engine"],
+                status_callback=report_task_state,
+                progress_callback=report_task_progress,
             )
             if success:
                 add_log(f" -> Snapshot download complete for {repo_id} into {target_dir}.")
@@ -819,25 +939,63 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
             add_log(f" -> Downloading file '{filename}' from {repo_id} into '{target_dir}' as '{save_filename}'...")
 
             # Update file path tracking
-            with current_download_lock:
-                current_download_info["file_path"] = os.path.join(target_dir, save_filename)
+            with active_downloads_lock:
+                active_downloads[threading.get_ident()]["file_path"] = os.path.join(target_dir, save_filename)
             
             # Check for cancellation before download
             if cancel_current_download.is_set():
                 add_log(f"Download cancelled: {model_name}")
                 return
 
-            success = download_hf_file(
-                repo_id=repo_id,
-                filename=filename,
-                target_dir=target_dir,
-                save_filename=save_filename,
-                cancel_event=cancel_current_download,
-            )
+            # Identical files shared by several models/layouts are stored once under
+            # <base path>/.blobs and hardlinked (or reflinked) into place
+            blob_store = BlobStore(base_path) if download_settings["model_store"] else None
+            file_info = REPO_METADATA.get_file(repo_id, filename) if blob_store else None
+            expected_sha = file_info['sha256'] if file_info else None
+            linked = None
+            if expected_sha and blob_store.has(expected_sha, file_info['size']):
+                try:
+                    linked = blob_store.materialize(expected_sha, final_target_path)
+                except OSError as e:
+                    add_log(f" -> WARNING: Could not link '{save_filename}' from the model store: {e}")
+
+            if linked:
+                add_log(f" -> '{save_filename}' is already in the model store ({linked}), nothing to download.")
+                create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread").mark_file_verified(repo_id, filename, final_target_path, expected_sha)
+                success = True
+            else:
+                if expected_sha:
+                    # Never let a download write through a hardlink into a stored blob
+                    blob_store.detach(final_target_path, file_info['size'])
+                success = download_hf_file(
+                    repo_id=repo_id,
+                    filename=filename,
+                    target_dir=target_dir,
+                    save_filename=save_filename,
+                    cancel_event=cancel_current_download,
+                    engine=download_settings["engine"],
+                    status_callback=report_task_state,
+                    progress_callback=report_task_progress,
+                )
+                if success and expected_sha and not cancel_current_download.is_set():
+                    def add_to_model_store(in_place):
+                        if not in_place:
+                            return
+                        try:
+                            stored = blob_store.ingest(expected_sha, os.path.join(target_dir, save_filename))
+                            if stored and stored != "linked":
+                                add_log(f" -> Added '{save_filename}' to the model store ({stored}).")
+                        except OSError as e:
+                            add_log(f" -> WARNING: Could not add '{save_filename}' to the model store: {e}")
+                    # A download staged on scratch is stored once the mover has put it in place
+                    FILE_MOVER.after(os.path.join(target_dir, save_filename), add_to_model_store)
             
             if success:
                 actual_downloaded_path = os.path.join(target_dir, save_filename)
-                add_log(f" -> File downloaded successfully to: {actual_downloaded_path}")
+                if FILE_MOVER.is_pending(actual_downloaded_path):
+                    add_log(f" -> File verified on scratch, moving it to: {actual_downloaded_path}")
+                else:
+                    add_log(f" -> File downloaded successfully to: {actual_downloaded_path}")
                 
                 # Check if we need to rename to final target path
                 if actual_downloaded_path != final_target_path:
@@ -910,6 +1068,9 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
                         target_dir=target_dir,
                         save_filename=companion_json,
                         cancel_event=cancel_current_download,
+                        engine=download_settings["engine"],
+                        status_callback=report_task_state,
+                        progress_callback=report_task_progress,
                     )
                     
                     if json_success:
@@ -922,7 +1083,12 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
 
         end_time = time.time()
         success_path = final_target_path if not is_snapshot else actual_downloaded_path 
+        if not is_snapshot and FILE_MOVER.is_pending(success_path):
+            # The worker finishes the task once the move has landed (or failed)
+            add_log(f"VERIFIED: Downloaded {model_name} in {end_time - start_time:.2f} seconds; moving it to {success_path} in the background...")
+            return success_path
         add_log(f"SUCCESS: Downloaded and processed {model_name} in {end_time - start_time:.2f} seconds. Final location: {success_path}")
+        return True
 
     except (HfHubHTTPError, HFValidationError) as e:
         add_log(f"ERROR downloading {model_name} (HF Hub): {type(e).__name__} - {str(e)}")
@@ -938,26 +1104,58 @@ def _download_model_internal(model_info, sub_category_info, base_path, use_hf_tr
              add_log(f" -> State before error: final_target_path='{final_target_path}'")
     finally:
         # Clear current download tracking
-        with current_download_lock:
-            current_download_info["model_name"] = None
-            current_download_info["file_path"] = None
+        with active_downloads_lock:
+            active_downloads.pop(threading.get_ident(), None)
+
+def acquire_hf_transfer_env(use_hf_transfer):
+    """Set HF_HUB_ENABLE_HF_TRANSFER for a task, remembering the original value for the first user."""
+    with hf_transfer_env_lock:
+        if hf_transfer_env_state["users"] == 0:
+            hf_transfer_env_state["original"] = os.environ.get('HF_HUB_ENABLE_HF_TRANSFER')
+        hf_transfer_env_state["users"] += 1
+        os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = '1' if use_hf_transfer and HF_TRANSFER_AVAILABLE else '0'
+
+def release_hf_transfer_env():
+    """Restore HF_HUB_ENABLE_HF_TRANSFER once the last running task is done with it."""
+    with hf_transfer_env_lock:
+        hf_transfer_env_state["users"] -= 1
+        if hf_transfer_env_state["users"] > 0:
+            return
+        original = hf_transfer_env_state["original"]
+        if original is None:
+            os.environ.pop('HF_HUB_ENABLE_HF_TRANSFER', None)
+        else:
+            os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = original
+
+def finish_task(task, success, task_start):
+    """Count a finished task and take it off the queue; success None means cancelled."""
+    TASKS.labels("cancelled" if success is None else "success" if success else "failed").inc()
+    TASK_SECONDS.observe(time.time() - task_start)
+    # Finished tasks leave the saved queue, failed ones stay marked failed, cancelled ones are dropped
+    download_queue.task_done(task, success)
+
+def finish_moved_task(task, target, task_start, landed):
+    """FILE_MOVER callback for a task whose file was verified on scratch."""
+    if landed:
+        add_log(f"SUCCESS: {task.name} is in place. Final location: {target}")
+    else:
+        add_log(f"ERROR: {task.name} was downloaded and verified but could not be moved to {target} (see the move error above).")
+    finish_task(task, landed, task_start)
 
 def download_worker():
-    """Worker thread function to process the download queue."""
-    print("Download worker thread started.")
+    """Worker thread function to process the download queue. Several run side by side."""
+    print(f"Download worker thread started ({threading.current_thread().name}).")
     while not stop_worker.is_set():
         try:
             task = download_queue.get(timeout=1)
         except queue.Empty:
-            # Check if cancellation was requested while queue was empty
-            if cancel_current_download.is_set():
+            # Check if cancellation was requested while queue was empty; only reset it
+            # once every worker has stopped its download
+            with active_downloads_lock:
+                downloads_running = bool(active_downloads)
+            if cancel_current_download.is_set() and not downloads_running:
                 add_log("Clearing download queue due to cancellation...")
-                # Clear the queue
-                while not download_queue.empty():
-                    try:
-                        download_queue.get_nowait()
-                    except queue.Empty:
-                        break
+                download_queue.clear()
                 cancel_current_download.clear()
                 add_log("Download queue cleared and cancellation reset.")
             continue
@@ -965,29 +1163,41 @@ def download_worker():
         # Check for cancellation before processing task
         if cancel_current_download.is_set():
             add_log("Skipping queued download due to cancellation...")
-            download_queue.task_done()
+            download_queue.task_done(task)
             continue
 
-        model_info, sub_category_info, base_path, use_hf_transfer, is_comfy_ui_structure, is_forge_structure, lowercase_folders = task
-        original_hf_transfer_env = None
+        model_info, sub_category_info, base_path, use_hf_transfer, is_comfy_ui_structure, is_forge_structure, lowercase_folders = task.args
+        acquire_hf_transfer_env(use_hf_transfer)
+        current_task.task = task
+        result = None
+        task_start = time.time()
         try:
-            original_hf_transfer_env = os.environ.get('HF_HUB_ENABLE_HF_TRANSFER')
-            transfer_env_value = '1' if use_hf_transfer and HF_TRANSFER_AVAILABLE else '0'
-            os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = transfer_env_value
-            
-            _download_model_internal(model_info, sub_category_info, base_path, use_hf_transfer, is_comfy_ui_structure, is_forge_structure, lowercase_folders)
+            result = _download_model_internal(model_info, sub_category_info, base_path, use_hf_transfer, is_comfy_ui_structure, is_forge_structure, lowercase_folders)
 
         except Exception as e:
             model_name_for_log = model_info.get('name', 'unknown task')
             add_log(f"CRITICAL WORKER ERROR processing '{model_name_for_log}': {type(e).__name__} - {e}")
         finally:
-            if original_hf_transfer_env is None:
-                if 'HF_HUB_ENABLE_HF_TRANSFER' in os.environ:
-                    del os.environ['HF_HUB_ENABLE_HF_TRANSFER']
+            current_task.task = None
+            ui_events.clear_progress(task.task_id)
+            release_hf_transfer_env()
+            cancelled = cancel_current_download.is_set()
+            if isinstance(result, str) and not cancelled:
+                # Verified on scratch: the task stays listed as moving until the file has landed
+                download_queue.set_state(task, TASK_MOVING)
+                FILE_MOVER.after(result, functools.partial(finish_moved_task, task, result, task_start))
             else:
-                os.environ['HF_HUB_ENABLE_HF_TRANSFER'] = original_hf_transfer_env
-            download_queue.task_done()
-    print("Download worker thread stopped.")
+                finish_task(task, None if cancelled else bool(result), task_start)
+    print(f"Download worker thread stopped ({threading.current_thread().name}).")
+
+def start_download_workers(parallel_downloads, max_connections):
+    """Start the worker pool and cap the connections all workers share."""
+    CONNECTION_BUDGET.set_limit(max_connections)
+    for i in range(max(1, parallel_downloads)):
+        worker = threading.Thread(target=download_worker, name=f"download-worker-{i + 1}", daemon=True)
+        worker.start()
+        worker_threads.append(worker)
+    print(f"Started {len(worker_threads)} download workers sharing {max_connections or 'unlimited'} connections.")
 
 
 # --- Filtering Logic ---
@@ -1161,12 +1371,15 @@ def create_ui(default_base_path):
                 gr.Markdown("### Select models or bundles to download. Downloads will be added to a queue. Use the search bar to filter.")
                 
                 log_output = gr.Textbox(label="Download Status / Log - Watch CMD / Terminal To See Download Status & Speed", lines=10, max_lines=20, interactive=False, value="Welcome! Logs will appear here.")
+                progress_output = gr.Textbox(label="Download Progress", lines=2, max_lines=8, interactive=False, value=render_progress({}))
                 
                 # Cancel button and queue status
                 with gr.Row():
                     cancel_button = gr.Button("🛑 Cancel Current Download", variant="stop", size="sm", scale=1)
                     with gr.Column(scale=2):
                         queue_status_label = gr.Markdown(f"Queue Size: {download_queue.qsize()}")
+                    speed_limit_input = gr.Number(label="Download Speed Limit (MB/s, 0 = unlimited)", value=BANDWIDTH_LIMITER.rate / (1024 * 1024), minimum=0, precision=1, scale=1)
+                    apply_speed_limit_button = gr.Button("Apply Speed Limit", size="sm", scale=1)
                 
                 # Confirmation dialog for cancel - will be shown/hidden dynamically
                 cancel_confirm_dialog = gr.Column(visible=False)
@@ -1177,6 +1390,15 @@ def create_ui(default_base_path):
                         confirm_cancel_button = gr.Button("Yes, Cancel Download", variant="stop", size="sm")
                         cancel_cancel_button = gr.Button("No, Continue Download", variant="secondary", size="sm")
 
+                with gr.Accordion("Download Queue - reorder or remove waiting downloads", open=False):
+                    queue_table = gr.Markdown(render_queue_table())
+                    with gr.Row():
+                        queue_task_id = gr.Number(label="Task ID", precision=0, minimum=0, scale=1)
+                        queue_top_button = gr.Button("⏫ Move to Top", size="sm", scale=1)
+                        queue_up_button = gr.Button("▲ Up", size="sm", scale=1)
+                        queue_down_button = gr.Button("▼ Down", size="sm", scale=1)
+                        queue_remove_button = gr.Button("✖ Remove", variant="stop", size="sm", scale=1)
+
                 with gr.Row():
                      search_box = gr.Textbox(placeholder="Search models or bundles...", label="Search", scale=2, interactive=True)
                      use_hf_transfer_checkbox = gr.Checkbox(label="Enable hf_transfer (Faster Downloads)", value=HF_TRANSFER_AVAILABLE, scale=1)
@@ -1238,11 +1460,11 @@ def create_ui(default_base_path):
                 # === CANCEL FUNCTIONALITY ===
                 def handle_cancel_request():
                     """Show the confirmation dialog when cancel is requested"""
-                    with current_download_lock:
-                        current_model = current_download_info.get("model_name")
+                    with active_downloads_lock:
+                        current_models = [info["model_name"] for info in active_downloads.values()]
                     
-                    if current_model:
-                        add_log(f"Cancel requested for: {current_model}")
+                    if current_models:
+                        add_log(f"Cancel requested for: {', '.join(current_models)}")
                         return gr.update(visible=True)  # Show confirmation dialog
                     else:
                         add_log("No active download to cancel.")
@@ -1250,24 +1472,25 @@ def create_ui(default_base_path):
                 
                 def handle_confirm_cancel():
                     """Actually cancel the download"""
-                    with current_download_lock:
-                        current_model = current_download_info.get("model_name")
-                        current_file = current_download_info.get("file_path")
+                    with active_downloads_lock:
+                        current_downloads = list(active_downloads.values())
                     
-                    if current_model:
-                        add_log(f"⚠️ CANCELLING DOWNLOAD: {current_model}")
+                    if current_downloads:
+                        add_log(f"⚠️ CANCELLING DOWNLOADS: {', '.join(info['model_name'] for info in current_downloads)}")
                         cancel_current_download.set()
                         
-                        # Try to clean up current file immediately if we know where it is
-                        if current_file and os.path.exists(current_file):
-                            try:
-                                if os.path.isfile(current_file):
-                                    os.remove(current_file)
-                                    add_log(f"Immediately cleaned up: {current_file}")
-                            except Exception as e:
-                                add_log(f"Warning: Could not immediately clean up {current_file}: {e}")
+                        # Try to clean up current files immediately if we know where they are
+                        for info in current_downloads:
+                            current_file = info.get("file_path")
+                            if current_file and os.path.exists(current_file):
+                                try:
+                                    if os.path.isfile(current_file):
+                                        os.remove(current_file)
+                                        add_log(f"Immediately cleaned up: {current_file}")
+                                except Exception as e:
+                                    add_log(f"Warning: Could not immediately clean up {current_file}: {e}")
                         
-                        add_log("Download cancellation signal sent. Current download will stop and queue will be cleared.")
+                        add_log("Download cancellation signal sent. Running downloads will stop and queue will be cleared.")
                     else:
                         add_log("No active download found to cancel.")
                     
@@ -1278,6 +1501,48 @@ def create_ui(default_base_path):
                     add_log("Download cancellation aborted by user.")
                     return gr.update(visible=False)  # Hide confirmation dialog
 
+                def handle_speed_limit(limit_mb):
+                    """Change the global download rate; running downloads pick it up right away"""
+                    limit_mb = max(0.0, float(limit_mb or 0))
+                    BANDWIDTH_LIMITER.set_rate(limit_mb * 1024 * 1024)
+                    if limit_mb:
+                        add_log(f"Download speed limited to {limit_mb:g} MB/s (shared by all active downloads).")
+                    else:
+                        add_log("Download speed limit removed.")
+                    return limit_mb
+
+                apply_speed_limit_button.click(
+                    fn=handle_speed_limit,
+                    inputs=[speed_limit_input],
+                    outputs=[speed_limit_input]
+                )
+
+                def handle_queue_action(action, task_id):
+                    """Reorder or remove a waiting download by its task ID"""
+                    task_id = int(task_id or 0)
+                    if action == "top":
+                        done = download_queue.move_to_top(task_id)
+                    elif action == "up":
+                        done = download_queue.move(task_id, -1)
+                    elif action == "down":
+                        done = download_queue.move(task_id, 1)
+                    else:
+                        removed = download_queue.remove(task_id)
+                        done = removed is not None
+                        if done:
+                            add_log(f"Removed from queue: {removed.name}")
+                    if not done:
+                        add_log(f"Task {task_id} is not waiting in the queue (already started, finished or removed).")
+                    return render_queue_table(), f"Queue Size: {download_queue.qsize()}"
+
+                for button, action in ((queue_top_button, "top"), (queue_up_button, "up"),
+                                       (queue_down_button, "down"), (queue_remove_button, "remove")):
+                    button.click(
+                        fn=lambda task_id, action=action: handle_queue_action(action, task_id),
+                        inputs=[queue_task_id],
+                        outputs=[queue_table, queue_status_label]
+                    )
+
                 # Connect cancel button handlers
                 cancel_button.click(
                     fn=handle_cancel_request,
@@ -1390,8 +1655,17 @@ def create_ui(default_base_path):
                             add_log(f"  - {err}")
                         return f"Queue Size: {download_queue.qsize()}"
 
-                    download_queue.put((model_info, sub_category_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders))
+                    plan = plan_models([(model_info, sub_category_info)], current_base_path, is_comfy_checked, is_forge_checked, lowercase_folders)
+                    if plan is None:
+                        return f"Queue Size: {download_queue.qsize()}"
+                    if plan.complete_models():
+                        add_log(f"Already downloaded and verified: {model_info.get('name', model_info.get('repo_id'))}")
+                        return f"Queue Size: {download_queue.qsize()}"
+
+                    download_queue.put((model_info, sub_category_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders),
+                                       model_info.get('name', model_info.get('repo_id')), plan.model_bytes(0), task_role(model_info, sub_category_info))
                     add_log(f"Queued: {model_info.get('name', model_info.get('repo_id'))}")
+                    audit_in_background(plan)
                     return f"Queue Size: {download_queue.qsize()}"
 
                 def enqueue_bulk_download(models_list, sub_category_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders):
@@ -1411,12 +1685,20 @@ def create_ui(default_base_path):
                             add_log(f"  - {err}")
                         return f"Queue Size: {download_queue.qsize()}"
 
-                    count = 0
+                    plan = plan_models([(model_info, sub_category_info) for model_info in models_list],
+                                       current_base_path, is_comfy_checked, is_forge_checked, lowercase_folders)
+                    if plan is None:
+                        return f"Queue Size: {download_queue.qsize()}"
+
+                    complete = plan.complete_models()
                     sub_cat_name = sub_category_info.get("name", "Group") 
-                    for model_info in models_list:
-                         download_queue.put((model_info, sub_category_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders))
-                         count += 1
-                    add_log(f"Queued {count} models from '{sub_cat_name}'.")
+                    tasks = download_queue.put_group([
+                        ((model_info, sub_category_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders),
+                         model_info.get('name', model_info.get('repo_id')), plan.model_bytes(index), task_role(model_info, sub_category_info))
+                        for index, model_info in enumerate(models_list) if index not in complete
+                    ])
+                    add_log(f"Queued {len(tasks)} models from '{sub_cat_name}' ({len(complete)} already complete).")
+                    audit_in_background(plan)
                     return f"Queue Size: {download_queue.qsize()}"
 
                 def enqueue_bundle_download(bundle_definition, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders):
@@ -1438,17 +1720,33 @@ def create_ui(default_base_path):
                     errors = 0
 
                     add_log(f"Queueing bundle: '{bundle_name}'...")
-                    for cat_name, sub_cat_name, model_name in model_keys:
-                        model_info, sub_cat_info = find_model_by_key(cat_name, sub_cat_name, model_name)
-                        if model_info and sub_cat_info:
-                            # Use the standard enqueue function, passing comfy_checked state
-                            enqueue_download(model_info, sub_cat_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders)
-                            queued_count += 1
-                        else:
+                    found_models = [find_model_by_key(cat_name, sub_cat_name, model_name)
+                                    for cat_name, sub_cat_name, model_name in model_keys]
+                    valid_models = [found for found in found_models if found[0] and found[1]]
+                    plan = plan_models(valid_models, current_base_path, is_comfy_checked, is_forge_checked, lowercase_folders)
+                    if plan is None:
+                        add_log(f"Bundle '{bundle_name}' was not queued.")
+                        return f"Queue Size: {download_queue.qsize()}"
+
+                    for (cat_name, sub_cat_name, model_name), (model_info, sub_cat_info) in zip(model_keys, found_models):
+                        if not (model_info and sub_cat_info):
                             errors += 1
                             add_log(f"  -> ERROR: Could not find model '{model_name}' for bundle. Skipping.")
 
-                    add_log(f"Bundle '{bundle_name}' processed. Queued: {queued_count}, Errors: {errors}.")
+                    # Queue the bundle as one group: VAE / text encoders / LoRAs before the main models
+                    complete = plan.complete_models()
+                    skipped_count = len(complete)
+                    tasks = download_queue.put_group([
+                        ((model_info, sub_cat_info, current_base_path, hf_transfer_enabled, is_comfy_checked, is_forge_checked, lowercase_folders),
+                         model_info.get('name', model_info.get('repo_id')), plan.model_bytes(index), task_role(model_info, sub_cat_info))
+                        for index, (model_info, sub_cat_info) in enumerate(valid_models) if index not in complete
+                    ])
+                    queued_count = len(tasks)
+                    for task in tasks:
+                        add_log(f"  -> Queued: {task.name}")
+
+                    add_log(f"Bundle '{bundle_name}' processed. Queued: {queued_count}, Already complete: {skipped_count}, Errors: {errors}.")
+                    audit_in_background(plan)
                     return f"Queue Size: {download_queue.qsize()}"
 
                 for cat_name, cat_data in MODEL_CATALOG.items():
@@ -1781,35 +2079,44 @@ def create_ui(default_base_path):
 
                 try:
                     timer = gr.Timer(1, active=True) 
-                    def update_log_display():
+                    # Last log sequence number / progress version / queue version this browser session
+                    # has seen, and the log lines it shows (new events are appended to them)
+                    shown_events = gr.State({"log": 0, "progress": -1, "queue": None, "lines": []})
+                    def update_log_display(seen):
                         log_update = gr.update() 
                         queue_update = gr.update() 
-                        new_log_available = False
-                        try:
-                            latest_log = status_updates.get_nowait()
-                            log_update = latest_log 
-                            new_log_available = True
-                        except queue.Empty:
-                            pass 
+                        table_update = gr.update()
+                        progress_update = gr.update()
+                        last_seq, new_events = ui_events.events_since(seen["log"])
+                        lines = seen.get("lines", [])
+                        if new_events:
+                            lines = (lines + [format_event(event) for event in new_events])[-LOG_LINES_SHOWN:]
+                            log_update = "\n".join(lines)
+                        progress_version, progress = ui_events.progress_since(seen["progress"])
+                        if progress is not None:
+                            progress_update = render_progress(progress)
+                        queue_version = download_queue.version
+                        if queue_version != seen.get("queue"):
+                            table_update = render_queue_table()  # Only redraw the queue table when it changed
+                        seen = {"log": last_seq, "progress": progress_version, "queue": queue_version, "lines": lines}
                         q_size = download_queue.qsize()
-                        queue_update = f"Queue Size: {q_size}"
-                        return log_update, queue_update
-                    timer.tick(update_log_display, None, [log_output, queue_status_label])
+                        with active_downloads_lock:
+                            running = len(active_downloads)
+                        queue_update = f"Queue Size: {q_size} | Downloading: {running}"
+                        return log_update, progress_update, queue_update, table_update, seen
+                    timer.tick(update_log_display, shown_events, [log_output, progress_output, queue_status_label, queue_table, shown_events])
                     add_log("Using gr.Timer for UI updates.")
                 except AttributeError:
                     add_log("gr.Timer not found, falling back to deprecated app.load(every=1) for UI updates.")
                     def update_log_display_legacy():
-                         log_update = gr.update()
-                         queue_update = gr.update()
-                         try:
-                             latest_log = status_updates.get_nowait()
-                             log_update = latest_log
-                         except queue.Empty:
-                             pass
+                         log_update = "\n".join(ui_events.tail(LOG_LINES_SHOWN))
                          q_size = download_queue.qsize()
-                         queue_update = f"Queue Size: {q_size}"
-                         return {log_output: log_update, queue_status_label: queue_update}
-                    app.load(update_log_display_legacy, None, [log_output, queue_status_label], every=1)
+                         with active_downloads_lock:
+                             running = len(active_downloads)
+                         queue_update = f"Queue Size: {q_size} | Downloading: {running}"
+                         return {log_output: log_update, progress_output: render_progress(ui_events.progress()),
+                                 queue_status_label: queue_update, queue_table: render_queue_table()}
+                    app.load(update_log_display_legacy, None, [log_output, progress_output, queue_status_label, queue_table], every=1)
 
             with gr.Tab("URL Downloader"):
                 gr.Markdown("### Download models from direct URLs (CivitAI, HuggingFace, and generic URLs)")
@@ -2195,6 +2502,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="SwarmUI Model Downloader - Direct Download Version with Search and Bundles")
     parser.add_argument("--share", action="store_true", help="Enable Gradio sharing link")
     parser.add_argument("--model-path", type=str, default=None, help="Override default SwarmUI Models path")
+    parser.add_argument("--parallel-downloads", type=int, default=DEFAULT_PARALLEL_DOWNLOADS, help="Number of models downloaded at the same time")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS, help="Total HTTP connections shared by all downloads (0 = unlimited)")
+    parser.add_argument("--max-download-speed", type=float, default=0, help="Download speed limit in MB/s shared by all downloads (0 = unlimited, can be changed in the UI)")
+    parser.add_argument("--download-engine", choices=["thread", "async"], default="thread", help="HuggingFace download engine (async needs aiohttp)")
+    parser.add_argument("--no-model-store", action="store_true", help="Save every model as its own copy instead of hardlinking identical files to one stored blob")
+    parser.add_argument("--peers", type=str, default="", help="Comma-separated host:port of LAN peer caches tried before HuggingFace")
+    parser.add_argument("--serve-peer-cache", type=int, default=0, metavar="PORT", help="Serve already-verified models to other pods on this port (0 = off)")
+    parser.add_argument("--metrics-port", type=int, default=0, metavar="PORT", help="Export Prometheus metrics on http://<host>:PORT/metrics (0 = off)")
+    parser.add_argument("--write-behind-mb", type=int, default=0, metavar="MB", help="Flush downloaded data to disk and drop it from the page cache every MB written, so big files don't fill RAM with dirty pages (Linux, 0 = off)")
+    parser.add_argument("--scratch-dir", type=str, default="", help="Fast local directory (e.g. the pod's NVMe) to download and verify on; finished files are moved to the models folder in the background")
+    parser.add_argument("--scratch-backlog", type=int, default=DEFAULT_DOWNLOAD_CONFIG["scratch_backlog"], help="Finished files allowed to wait on scratch for the background move")
+    parser.add_argument("--no-stall-watchdog", action="store_true", help="Don't restart download connections that stall or crawl far below the others")
+    parser.add_argument("--no-hedge", action="store_true", help="Don't race a duplicate request against the last, slowest ranges of a file")
+    parser.add_argument("--discard-queue", action="store_true", help="Forget downloads left queued by the previous session instead of resuming them")
     args = parser.parse_args()
 
     if args.model_path:
@@ -2211,8 +2532,28 @@ if __name__ == "__main__":
     # Ensure Base Dirs Exist Early (default ComfyUI mode to False for this initial call)
     # ensure_directories_exist(current_base_path, False) 
 
-    worker_thread = threading.Thread(target=download_worker, daemon=True)
-    worker_thread.start()
+    download_settings["engine"] = args.download_engine
+    download_settings["model_store"] = not args.no_model_store
+    DEFAULT_DOWNLOAD_CONFIG["write_behind"] = max(0, args.write_behind_mb) * 1024 * 1024
+    if args.no_stall_watchdog:
+        DEFAULT_DOWNLOAD_CONFIG["stall_ratio"] = DEFAULT_DOWNLOAD_CONFIG["stall_timeout"] = 0
+    DEFAULT_DOWNLOAD_CONFIG["hedge_tail"] = not args.no_hedge
+    DEFAULT_DOWNLOAD_CONFIG["scratch_dir"] = args.scratch_dir
+    DEFAULT_DOWNLOAD_CONFIG["scratch_backlog"] = max(1, args.scratch_backlog)
+    if args.scratch_dir:
+        print(f"Staging downloads on {os.path.abspath(args.scratch_dir)} (up to {max(1, args.scratch_backlog)} waiting to move)")
+    DEFAULT_DOWNLOAD_CONFIG["peers"] = [peer.strip() for peer in args.peers.split(",") if peer.strip()]
+    if DEFAULT_DOWNLOAD_CONFIG["peers"]:
+        print(f"Peer caches: {', '.join(DEFAULT_DOWNLOAD_CONFIG['peers'])}")
+    if args.serve_peer_cache:
+        peer_server = PeerCacheServer(create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread"), port=args.serve_peer_cache).start()
+        print(f"Serving verified models to peers on {peer_server.address}")
+    if args.metrics_port:
+        metrics_server = MetricsServer(args.metrics_port).start()
+        print(f"Serving download metrics on http://{metrics_server.address}/metrics")
+    BANDWIDTH_LIMITER.set_rate(max(0.0, args.max_download_speed) * 1024 * 1024)
+    restore_download_queue(discard=args.discard_queue)
+    start_download_workers(args.parallel_downloads, args.max_connections)
 
     gradio_app = create_ui(current_base_path)
     allowed_paths_list = get_available_drives()
@@ -2254,13 +2595,12 @@ if __name__ == "__main__":
          print("Please ensure Gradio is installed correctly (`pip install gradio`) and that the specified port is available.")
     finally:
         stop_worker.set()
-        print("Waiting for download worker to finish current task (up to 5s)...")
-        worker_thread.join(timeout=5.0) 
-        if worker_thread.is_alive():
-            print("Worker thread did not finish cleanly after 5 seconds.")
+        print("Waiting for download workers to finish current tasks (up to 5s)...")
+        shutdown_deadline = time.time() + 5.0
+        for worker in worker_threads:
+            worker.join(timeout=max(0.0, shutdown_deadline - time.time()))
+        if any(worker.is_alive() for worker in worker_threads):
+            print("Worker threads did not finish cleanly after 5 seconds.")
         else:
-            print("Download worker stopped.")
-        if status_updates is not None:
-             status_updates.put(None) 
-             status_updates = None
+            print("Download workers stopped.")
     print("Gradio app closed.")
\ No newline at end of file
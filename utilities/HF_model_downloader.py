@@ -2,15 +2,49 @@ from huggingface_hub import HfApi, list_repo_files, hf_hub_url, get_hf_file_meta
 import os
 import argparse
 import requests
+from urllib3.util.retry import Retry
 import threading
 import time
 import sys
 import hashlib
 from pathlib import Path
 import concurrent.futures
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 import shutil
 import json
+import re
+import contextlib
+import ctypes
+import ctypes.util
+import urllib.parse
+import calendar
+import collections
+import email.utils
+import random
+import socket
+
+try:
+    from .repo_metadata import REPO_METADATA
+    from .cache_store import get_cache_store
+    from .file_audit import audit_files
+    from .peer_cache import PEER_RESOLVER
+    from .file_mover import FILE_MOVER
+    from .download_metrics import (
+        ACTIVE_CONNECTIONS, CACHE_LOOKUPS, MERGE_SECONDS, PENDING_MOVES, VERIFY_SECONDS,
+        REDIRECTS_AVOIDED, REDIRECT_RESOLVES, REDIRECT_SECONDS_SAVED, STALLED_CONNECTIONS, HEDGED_REQUESTS,
+        CIRCUIT_TRIPS, TransferMeter, record_retry, record_failure, url_labels,
+    )
+except ImportError:
+    from repo_metadata import REPO_METADATA
+    from cache_store import get_cache_store
+    from file_audit import audit_files
+    from peer_cache import PEER_RESOLVER
+    from file_mover import FILE_MOVER
+    from download_metrics import (
+        ACTIVE_CONNECTIONS, CACHE_LOOKUPS, MERGE_SECONDS, PENDING_MOVES, VERIFY_SECONDS,
+        REDIRECTS_AVOIDED, REDIRECT_RESOLVES, REDIRECT_SECONDS_SAVED, STALLED_CONNECTIONS, HEDGED_REQUESTS,
+        CIRCUIT_TRIPS, TransferMeter, record_retry, record_failure, url_labels,
+    )
 
 # Configuration for CLI usage (legacy)
 DEFAULT_TARGET_DIR = "index-tts/checkpoints"
@@ -23,34 +57,1108 @@ DEFAULT_MODEL_CONFIGS = {
     }
 }
 DEFAULT_DOWNLOAD_CONFIG = {
-    "num_connections": 16,      # Fixed 16 connections
+    "num_connections": 16,      # Starting connections when nothing was learned for the host yet
     "chunk_size": 10485760,     # 10MB buffer for streaming
     "max_retries": 5,           # Reasonable retry count
     "retry_delay": 2,           # Base delay between retries
     "max_retry_delay": 30,      # Cap exponential backoff
     "timeout": 300,             # 5 minute timeout per request
+    "preallocate": True,        # Write ranges in place into one preallocated file (no .partN merge)
+    "journal_interval": 2.0,    # Seconds between resume journal checkpoints
+    "journal_fsync": True,      # fsync data and journal at checkpoints so a crash can't leave torn ranges
+    "stream_hash": True,        # Compute SHA256 while downloading instead of a verify pass
+    "segment_size": 33554432,   # 32MB ranges handed out in file order when hashing while downloading
+    "hash_buffer_size": 268435456,  # 256MB max out-of-order data held in memory for the hasher
+    "min_split_size": 4194304,  # Don't steal work from ranges with less than 2x4MB left
+    "adaptive_connections": True,  # Tune active connections per host (AIMD) and remember the result
+    "max_connections": 32,      # Upper bound for adaptive connections
+    "tuning_interval": 2.0,     # Seconds between connection count adjustments
+    "stall_ratio": 0.1,         # Restart range connections running below 10% of the file's median rate (0 = off)
+    "stall_timeout": 30,        # Restart range connections that received nothing for this long (0 = off)
+    "hedge_tail": True,         # Race a duplicate request against the last ranges; the first to finish wins
+    "engine": "thread",         # "thread" (requests + thread pool) or "async" (aiohttp, one event loop)
+    "audit_workers": 0,         # Processes hashing existing files in bulk checks (0 = one per CPU)
+    "peers": [],                # LAN peer caches ("host:port") asked for a file before HuggingFace
+    "write_behind": 0,          # Bytes written between writeback + page cache drops (Linux; 0 = plain buffered writes)
+    "scratch_dir": "",          # Local disk to download + verify on before moving to the target in the background ("" = off)
+    "scratch_backlog": 2,       # Finished files allowed to wait on scratch for the mover
+    "scratch_min_free": 2147483648,  # Download straight to the target when scratch would have less than 2GB left
+    "cache_dir": "",            # Directory of the cache database and tuning files ("" = next to this script)
 }
 
+# ------------------------- Preallocated in-place output -------------------------
+
+_libc = None
+_libc_loaded = False
+
+def _load_libc():
+    """Load the C library once (Linux only); returns None when unavailable"""
+    global _libc, _libc_loaded
+    if not _libc_loaded:
+        _libc_loaded = True
+        if sys.platform.startswith('linux'):
+            try:
+                _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            except OSError:
+                _libc = None
+    return _libc
+
+def _fallocate(fd: int, size: int) -> bool:
+    """Reserve disk blocks with fallocate(2). Returns False if the filesystem can't do it.
+
+    Unlike os.posix_fallocate, this never falls back to writing zeros block by
+    block, which would be slow on network volumes.
+    """
+    libc = _load_libc()
+    if libc is None or not hasattr(libc, 'fallocate'):
+        return False
+    libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    libc.fallocate.restype = ctypes.c_int
+    return libc.fallocate(fd, 0, 0, size) == 0
+
+SYNC_FILE_RANGE_WAIT_BEFORE = 1
+SYNC_FILE_RANGE_WRITE = 2
+SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+def _sync_file_range(fd: int, offset: int, nbytes: int, flags: int) -> bool:
+    """sync_file_range(2); returns False where it is unavailable or fails"""
+    libc = _load_libc()
+    if libc is None or not hasattr(libc, 'sync_file_range'):
+        return False
+    libc.sync_file_range.argtypes = [ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_uint]
+    libc.sync_file_range.restype = ctypes.c_int
+    return libc.sync_file_range(fd, offset, nbytes, flags) == 0
+
+def _fsync_dir(path: str):
+    """Make a rename in path durable (no-op where directories can't be opened, e.g. Windows)"""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class WriteBehind:
+    """Keeps the page cache used by one file being written bounded (Linux).
+
+    Buffered writes of a 40GB checkpoint pile up as dirty pages until the
+    kernel flushes them in bursts that stall every writer on the machine.
+    Here, every ``window`` bytes written, writeback of those bytes is
+    started with sync_file_range, and the window before it is waited for and
+    dropped from the page cache with posix_fadvise(DONTNEED). The writer that
+    crosses a window boundary waits for the disk, so roughly two windows of
+    the file are ever cached. Where the calls are unavailable this is a no-op.
+    """
+
+    def __init__(self, fd: int, window: int):
+        self.fd = fd
+        self.window = window
+        # A zero-flag call does nothing but tells whether the call works on this file
+        self.enabled = window > 0 and hasattr(os, 'posix_fadvise') and _sync_file_range(fd, 0, 0, 0)
+        self._pending = {}      # end offset -> start of a contiguous extent written since the last flush
+        self._pending_bytes = 0
+        self._flushing = []     # (start, end) extents whose writeback was started
+        self._lock = threading.Lock()
+
+    def wrote(self, offset: int, nbytes: int):
+        """Report nbytes written at offset; may wait for the previous window to reach the disk"""
+        if not self.enabled or nbytes <= 0:
+            return
+        with self._lock:
+            # Extend the extent this write continues (one per connection / stream)
+            start = self._pending.pop(offset, offset)
+            self._pending[offset + nbytes] = start
+            self._pending_bytes += nbytes
+            if self._pending_bytes < self.window:
+                return
+            started = [(start, end) for end, start in self._pending.items()]
+            finished = self._flushing
+            self._pending, self._pending_bytes, self._flushing = {}, 0, started
+        for start, end in started:
+            _sync_file_range(self.fd, start, end - start, SYNC_FILE_RANGE_WRITE)
+        self._drop(finished)
+
+    def finish(self):
+        """Write out and drop whatever is still cached; call before closing the file"""
+        if not self.enabled:
+            return
+        with self._lock:
+            extents = self._flushing + [(start, end) for end, start in self._pending.items()]
+            self._pending, self._pending_bytes, self._flushing = {}, 0, []
+        self._drop(extents)
+
+    def _drop(self, extents: List[Tuple[int, int]]):
+        for start, end in extents:
+            _sync_file_range(self.fd, start, end - start,
+                             SYNC_FILE_RANGE_WAIT_BEFORE | SYNC_FILE_RANGE_WRITE | SYNC_FILE_RANGE_WAIT_AFTER)
+            try:
+                os.posix_fadvise(self.fd, start, end - start, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+class PreallocatedFile:
+    """Download target that workers write into at absolute offsets.
+
+    The file is sized (and, where supported, block-reserved) up front, so every
+    range connection writes its bytes straight to their final position and no
+    merge pass is needed.
+    """
+
+    def __init__(self, path: str, size: int, write_behind: int = 0):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()  # Only used where os.pwrite is unavailable
+        self.write_listener = None     # Called as listener(offset, data) after each write
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        current_size = os.fstat(self.fd).st_size
+        if current_size != size:
+            if current_size > size or not _fallocate(self.fd, size):
+                os.ftruncate(self.fd, size)
+        self.write_behind = WriteBehind(self.fd, write_behind)
+
+    def write_at(self, offset: int, data: bytes):
+        """Write data at an absolute file offset (thread-safe)"""
+        view = memoryview(data)
+        if hasattr(os, 'pwrite'):
+            position = offset
+            while view:
+                written = os.pwrite(self.fd, view, position)
+                view = view[written:]
+                position += written
+        else:
+            with self._lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                while view:
+                    written = os.write(self.fd, view)
+                    view = view[written:]
+        if self.write_listener is not None:
+            self.write_listener(offset, data)
+        self.write_behind.wrote(offset, len(data))
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Read back bytes from an absolute file offset (thread-safe)"""
+        if hasattr(os, 'pread'):
+            return os.pread(self.fd, size, offset)
+        with self._lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            return os.read(self.fd, size)
+
+    def close(self):
+        if self.fd is not None:
+            self.write_behind.finish()
+            os.close(self.fd)
+            self.fd = None
+
+class StreamingHasher:
+    """SHA256 of a file that is being written out of order by several connections.
+
+    Writes are reported through ``feed``; a background thread hashes bytes
+    strictly in file order. Pieces that arrive ahead of the hash position are
+    kept in a bounded reorder buffer; anything that doesn't fit (and bytes
+    already on disk from a resumed download) is read back from the file once
+    the hash position reaches it, which is normally still in the page cache.
+    """
+
+    READ_BACK_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, output: PreallocatedFile, buffer_limit: int,
+                 written_ranges: Optional[List[Tuple[int, int]]] = None):
+        self.output = output
+        self.size = output.size
+        self.buffer_limit = buffer_limit
+        self.error = None
+        self.read_back_bytes = 0
+
+        self._sha = hashlib.sha256()
+        self._position = 0
+        self._buffer = {}          # offset -> bytes received ahead of the hash position
+        self._buffered_bytes = 0
+        self._written = []         # Sorted, merged [start, end) ranges known to be on disk
+        self._aborted = False
+        self._cond = threading.Condition()
+
+        for start, end in written_ranges or []:
+            self._add_written(start, end)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _add_written(self, start: int, end: int):
+        if end <= start:
+            return
+        merged = []
+        for existing_start, existing_end in self._written:
+            if existing_end < start or existing_start > end:
+                merged.append([existing_start, existing_end])
+            else:
+                start = min(start, existing_start)
+                end = max(end, existing_end)
+        merged.append([start, end])
+        merged.sort()
+        self._written = merged
+
+    def _contiguous_end(self) -> int:
+        """End of the on-disk run that contains the current hash position"""
+        for start, end in self._written:
+            if start <= self._position < end:
+                return end
+        return self._position
+
+    def feed(self, offset: int, data: bytes):
+        """Report that data was written at offset"""
+        with self._cond:
+            self._add_written(offset, offset + len(data))
+            if offset + len(data) > self._position and self._buffered_bytes + len(data) <= self.buffer_limit:
+                if offset not in self._buffer:
+                    self._buffer[offset] = data
+                    self._buffered_bytes += len(data)
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._aborted and self._position < self.size and self._contiguous_end() <= self._position:
+                        self._cond.wait()
+                    if self._aborted or self._position >= self.size:
+                        return
+                    position = self._position
+                    available_end = self._contiguous_end()
+                    data = self._buffer.pop(position, None)
+                    if data is not None:
+                        self._buffered_bytes -= len(data)
+
+                if data is None:
+                    data = self.output.read_at(position, min(self.READ_BACK_SIZE, available_end - position))
+                    if not data:
+                        raise IOError(f"Unexpected end of file at offset {position}")
+                    self.read_back_bytes += len(data)
+                self._sha.update(data)
+
+                with self._cond:
+                    self._position = position + len(data)
+                    # Drop buffered pieces that were covered by a read-back
+                    for offset in [o for o, d in self._buffer.items() if o + len(d) <= self._position]:
+                        self._buffered_bytes -= len(self._buffer.pop(offset))
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+
+    def finish(self) -> Optional[str]:
+        """Wait until every byte is hashed and return the hex digest (None on error)"""
+        self._thread.join()
+        if self.error is not None or self._position != self.size:
+            return None
+        return self._sha.hexdigest()
+
+    def abort(self):
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+        self._thread.join()
+
+class ByteRange:
+    """Part of a download owned by at most one worker at a time.
+
+    ``end`` can shrink while the range is being downloaded when an idle
+    worker steals its tail; ``done`` counts bytes written from ``start``.
+    ``twin`` links a range and the hedge racing it; ``connection`` is the
+    RangeConnection currently streaming it.
+    """
+
+    __slots__ = ('start', 'end', 'done', 'active', 'failed', 'twin', 'connection')
+
+    def __init__(self, start: int, end: int, done: int = 0):
+        self.start = start
+        self.end = end
+        self.done = done
+        self.active = False
+        self.failed = False
+        self.twin = None
+        self.connection = None
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def remaining(self) -> int:
+        return self.length - self.done
+
+class RangeScheduler:
+    """Hands out byte ranges to download workers, in file order.
+
+    When nothing is left to start, an idle worker splits the active range with
+    the most bytes remaining and takes its tail half, so one slow connection
+    can't hold up the whole file.
+
+    With ``hedge`` set, once the last ranges are too small to split an idle
+    worker instead races a duplicate request (a hedge) for the rest of the
+    range with the most bytes left. Both write the same bytes at the same
+    offsets; whichever finishes first completes the range and the other's
+    connection is aborted. Hedges are not part of ``ranges`` (nor of the
+    resume journal).
+    """
+
+    HEDGE_MIN_SIZE = 256 * 1024  # Not worth a second connection below this
+
+    def __init__(self, ranges: List[List[int]], min_split_size: int, hedge: bool = False):
+        self.ranges = [ByteRange(start, end, done) for start, end, done in ranges]
+        self.min_split_size = max(1, min_split_size)
+        self.hedge = hedge
+        self.steals = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self._lock = threading.Lock()
+
+    def next_range(self) -> Optional[ByteRange]:
+        """Claim the next unstarted range, or steal half of the largest active one"""
+        with self._lock:
+            for byte_range in self.ranges:
+                if not byte_range.active and not byte_range.failed and byte_range.remaining > 0:
+                    byte_range.active = True
+                    return byte_range
+
+            active = [r for r in self.ranges if r.active and r.remaining > 0]
+            if not active:
+                return None
+            victim = max(active, key=lambda r: r.remaining)
+            tail_size = victim.remaining // 2
+            if tail_size < self.min_split_size:
+                return self._start_hedge(active) if self.hedge else None
+
+            split_at = victim.end - tail_size + 1
+            stolen = ByteRange(split_at, victim.end)
+            stolen.active = True
+            victim.end = split_at - 1
+            self.ranges.insert(self.ranges.index(victim) + 1, stolen)
+            self.steals += 1
+            return stolen
+
+    def _start_hedge(self, active: List[ByteRange]) -> Optional[ByteRange]:
+        """Duplicate of the rest of the unhedged range with the most bytes left (lock held)"""
+        candidates = [r for r in active if r.twin is None and r.remaining >= self.HEDGE_MIN_SIZE]
+        if not candidates:
+            return None
+        original = max(candidates, key=lambda r: r.remaining)
+        hedge = ByteRange(original.start + original.done, original.end)
+        hedge.active = True
+        hedge.twin, original.twin = original, hedge
+        self.hedges += 1
+        return hedge
+
+    def release(self, byte_range: ByteRange, failed: bool = False):
+        with self._lock:
+            byte_range.active = False
+            if byte_range.remaining > 0 and byte_range.twin is not None and byte_range not in self.ranges:
+                byte_range.twin.twin = None  # Abandoned hedge: the range may be hedged again
+                byte_range.twin = None
+            if failed and byte_range.remaining > 0:
+                byte_range.failed = True
+
+    def attach(self, byte_range: ByteRange, connection: Optional["RangeConnection"]):
+        """Record the connection streaming byte_range (None once it's closed)"""
+        with self._lock:
+            byte_range.connection = connection
+
+    def position(self, byte_range: ByteRange) -> Tuple[int, int]:
+        """Current (next offset, end) of a range"""
+        with self._lock:
+            return byte_range.start + byte_range.done, byte_range.end
+
+    def reserve(self, byte_range: ByteRange, size: int) -> Tuple[int, int]:
+        """Offset to write the next piece at, and how many of its bytes still belong to the range"""
+        with self._lock:
+            offset = byte_range.start + byte_range.done
+            return offset, max(0, min(size, byte_range.end - offset + 1))
+
+    def commit(self, byte_range: ByteRange, offset: int, size: int):
+        """Record bytes written at offset (clamped if the tail was stolen meanwhile)"""
+        loser = None
+        with self._lock:
+            written_to = min(offset + size, byte_range.end + 1) - byte_range.start
+            byte_range.done = max(byte_range.done, written_to)
+            twin = byte_range.twin
+            if twin is not None and byte_range.remaining <= 0:
+                # Won the race: the twin's bytes are all on disk now
+                twin.done = twin.length
+                twin.twin = byte_range.twin = None
+                if byte_range not in self.ranges:
+                    self.hedges_won += 1
+                loser = twin.connection
+        if loser is not None:
+            loser.abort()
+
+    def is_complete(self, byte_range: ByteRange) -> bool:
+        with self._lock:
+            return byte_range.remaining <= 0
+
+    def total_done(self) -> int:
+        with self._lock:
+            return sum(min(r.done, r.length) for r in self.ranges)
+
+    def incomplete(self) -> List[ByteRange]:
+        with self._lock:
+            return [r for r in self.ranges if r.remaining > 0]
+
+    def has_work(self) -> bool:
+        """True while a range can still be started or is being downloaded (failed ones don't count)"""
+        with self._lock:
+            return any(r.remaining > 0 and (r.active or not r.failed) for r in self.ranges)
+
+    def snapshot(self) -> List[List[int]]:
+        """[start, end, done] for every range, as stored in the resume journal"""
+        with self._lock:
+            return [[r.start, r.end, min(r.done, r.length)] for r in self.ranges]
+
+def mark_done_spans(ranges: List[List[int]], spans: List[Tuple[int, int]]) -> List[List[int]]:
+    """Split contiguous [start, end, 0] ranges at the edges of (offset, length) spans
+    that are already on disk, and mark the pieces inside those spans done."""
+    file_end = ranges[-1][1] + 1
+    cuts = {start for start, _, _ in ranges}
+    for offset, length in spans:
+        cuts.update((offset, offset + length))
+    cuts = sorted(cut for cut in cuts if cut < file_end)
+    result = []
+    for start, next_start in zip(cuts, cuts[1:] + [file_end]):
+        done = any(offset <= start and next_start <= offset + length for offset, length in spans)
+        result.append([start, next_start - 1, next_start - start if done else 0])
+    return result
+
+class ConnectionBudget:
+    """Process-wide cap on open connections, shared fairly between downloads.
+
+    Every download registers as an owner. A connection is granted while the
+    total is under ``limit``; an owner may only go past its fair share
+    (limit / owners) when nobody else is waiting, and ``over_share`` tells a
+    download to give connections back once someone is. A limit of 0 means
+    unlimited.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._held = {}      # owner -> open connections
+        self._waiting = {}   # owner -> workers blocked in acquire
+
+    def set_limit(self, limit: int):
+        with self._cond:
+            self.limit = max(0, int(limit))
+            self._cond.notify_all()
+
+    def register(self, owner):
+        with self._cond:
+            self._held.setdefault(owner, 0)
+
+    def unregister(self, owner):
+        with self._cond:
+            self._held.pop(owner, None)
+            self._waiting.pop(owner, None)
+            self._cond.notify_all()
+
+    def _fair_share(self) -> int:
+        return max(1, self.limit // max(1, len(self._held)))
+
+    def _others_waiting(self, owner) -> bool:
+        return any(count for waiter, count in self._waiting.items() if waiter != owner)
+
+    def _can_grant(self, owner) -> bool:
+        if not self.limit:
+            return True
+        if sum(self._held.values()) >= self.limit:
+            return False
+        return self._held.get(owner, 0) < self._fair_share() or not self._others_waiting(owner)
+
+    def acquire(self, owner, timeout: Optional[float] = None) -> bool:
+        """Wait for a connection slot; returns False if timeout passed first"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            self._waiting[owner] = self._waiting.get(owner, 0) + 1
+            try:
+                while not self._can_grant(owner):
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._held[owner] = self._held.get(owner, 0) + 1
+                return True
+            finally:
+                self._waiting[owner] -= 1
+
+    def release(self, owner):
+        with self._cond:
+            if self._held.get(owner):
+                self._held[owner] -= 1
+            self._cond.notify_all()
+
+    def want(self, owner):
+        """Count one worker of owner as waiting without blocking, for workers that poll acquire(timeout=0)"""
+        with self._cond:
+            self._waiting[owner] = self._waiting.get(owner, 0) + 1
+
+    def unwant(self, owner):
+        """Undo want() once the worker got its slot or stopped waiting"""
+        with self._cond:
+            if self._waiting.get(owner):
+                self._waiting[owner] -= 1
+            self._cond.notify_all()
+
+    def held(self) -> int:
+        """Connections open right now across all downloads"""
+        with self._cond:
+            return sum(self._held.values())
+
+    def over_share(self, owner) -> bool:
+        """True when owner holds more than its fair share while another download waits"""
+        with self._cond:
+            return bool(self.limit) and self._held.get(owner, 0) > self._fair_share() and self._others_waiting(owner)
+
+    @contextlib.contextmanager
+    def connection(self, owner):
+        """Hold one slot for a download that only ever uses a single connection"""
+        self.register(owner)
+        try:
+            self.acquire(owner)
+            try:
+                yield
+            finally:
+                self.release(owner)
+        finally:
+            self.unregister(owner)
+
+# Shared by every RobustDownloader in the process; the Gradio app sets its limit
+CONNECTION_BUDGET = ConnectionBudget()
+ACTIVE_CONNECTIONS.set_function(CONNECTION_BUDGET.held)
+PENDING_MOVES.set_function(FILE_MOVER.pending_count)
+
+REDIRECT_TTL = 600             # Seconds a resolved location without an expiry is trusted
+REDIRECT_EXPIRY_MARGIN = 60    # Resolve again this long before a signed location expires
+
+def _signed_url_expiry(location: str) -> Optional[float]:
+    """Expiry time of a signed CDN URL (CloudFront Expires= or S3 X-Amz-Date + X-Amz-Expires)"""
+    query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(location).query))
+    expires = query.get('Expires', '')
+    if expires.isdigit():
+        return float(expires)
+    amz_expires, amz_date = query.get('X-Amz-Expires', ''), query.get('X-Amz-Date', '')
+    if amz_expires.isdigit() and amz_date:
+        try:
+            return calendar.timegm(time.strptime(amz_date, "%Y%m%dT%H%M%SZ")) + int(amz_expires)
+        except ValueError:
+            return None
+    return None
+
+class RedirectCache:
+    """Final (CDN) location of each download URL, shared by all its range requests.
+
+    A HuggingFace /resolve/ URL answers with a redirect to a signed CDN URL.
+    Following it on every range request and retry costs a round trip to the
+    Hub each time; the location is resolved once per file instead, and
+    re-resolved shortly before its signature expires or when the CDN
+    rejects it (403/410). Time the skipped redirects would have taken is
+    counted per URL and in the metrics.
+    """
+
+    def __init__(self):
+        self._entries = {}    # url -> {"location", "expires", "hop_seconds"}
+        self._savings = {}    # url -> [requests, seconds] not yet reported
+        self._resolving = {}  # url -> lock held while one thread resolves it
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[str]:
+        """Cached location of url, counted as a skipped redirect; None when unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or time.time() >= entry["expires"]:
+                return None
+            if entry["location"] != url:
+                savings = self._savings.setdefault(url, [0, 0.0])
+                savings[0] += 1
+                savings[1] += entry["hop_seconds"]
+                host = url_labels(url)[1]
+                REDIRECTS_AVOIDED.labels(host).inc()
+                REDIRECT_SECONDS_SAVED.labels(host).inc(entry["hop_seconds"])
+            return entry["location"]
+
+    def resolve(self, url: str, follow: Callable[[str], Tuple[str, float]]) -> str:
+        """Location of url, resolved with follow(url) -> (location, redirect seconds) when not cached.
+
+        Only one thread resolves a URL at a time; the others wait and reuse
+        its answer. If resolving fails, url itself is returned and the
+        request follows the redirect as usual.
+        """
+        location = self.get(url)
+        if location:
+            return location
+        with self._lock:
+            lock = self._resolving.setdefault(url, threading.Lock())
+        with lock:
+            location = self.get(url)
+            if location:
+                return location
+            try:
+                location, hop_seconds = follow(url)
+            except Exception:
+                return url
+            expiry = _signed_url_expiry(location)
+            expires = expiry - REDIRECT_EXPIRY_MARGIN if expiry else time.time() + REDIRECT_TTL
+            with self._lock:
+                reason = "expired" if url in self._entries else "new"
+                self._entries[url] = {"location": location, "expires": expires, "hop_seconds": hop_seconds}
+            if location != url:
+                REDIRECT_RESOLVES.labels(url_labels(url)[1], reason).inc()
+            return location
+
+    def invalidate(self, url: str, location: str):
+        """Forget location after the CDN rejected it (e.g. its signature expired)"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and entry["location"] == location:
+                del self._entries[url]
+                REDIRECT_RESOLVES.labels(url_labels(url)[1], "rejected").inc()
+
+    def take_savings(self, url: str) -> Tuple[int, float]:
+        """(requests, seconds) of redirects skipped for url since the last call"""
+        with self._lock:
+            requests_saved, seconds = self._savings.pop(url, (0, 0.0))
+        return requests_saved, seconds
+
+# Shared by every RobustDownloader in the process
+REDIRECT_CACHE = RedirectCache()
+
+class BandwidthLimiter:
+    """Process-wide download rate cap, split evenly between the files being downloaded.
+
+    Every active file (owner) gets a token bucket refilled at rate / owners
+    bytes per second. ``reserve`` takes tokens for bytes that were just read
+    and returns how long the caller should pause; a bucket may go into debt,
+    so big reads are paid for afterwards. The rate can be changed at any
+    time and applies to running downloads. A rate of 0 means unlimited.
+    """
+
+    BURST_SECONDS = 0.5      # Bytes a bucket may save up, in seconds of its share
+    MIN_READ_SIZE = 65536
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._owners = {}    # owner -> [refcount, tokens, last refill time]
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            for state in self._owners.values():
+                state[1] = 0.0
+                state[2] = time.time()
+
+    def register(self, owner):
+        """Mark owner as active; nested registrations (one per connection) are counted"""
+        with self._lock:
+            state = self._owners.setdefault(owner, [0, 0.0, time.time()])
+            state[0] += 1
+
+    def unregister(self, owner):
+        with self._lock:
+            state = self._owners.get(owner)
+            if state is not None:
+                state[0] -= 1
+                if state[0] <= 0:
+                    del self._owners[owner]
+
+    @contextlib.contextmanager
+    def transfer(self, owner):
+        self.register(owner)
+        try:
+            yield
+        finally:
+            self.unregister(owner)
+
+    def share(self) -> float:
+        """Current bytes per second for each active file (0 = unlimited)"""
+        if not self.rate:
+            return 0.0
+        return self.rate / max(1, len(self._owners))
+
+    def read_size(self, default: int) -> int:
+        """Read size that keeps a limited stream smooth (about 1/10s of its share)"""
+        share = self.share()
+        if not share:
+            return default
+        return max(self.MIN_READ_SIZE, min(default, int(share / 10)))
+
+    def reserve(self, owner, nbytes: int) -> float:
+        """Account for nbytes read by owner; returns seconds to wait before reading more"""
+        with self._lock:
+            share = self.share()
+            if not share:
+                return 0.0
+            state = self._owners.get(owner)
+            if state is None:
+                return 0.0
+            now = time.time()
+            state[1] = min(share * self.BURST_SECONDS, state[1] + (now - state[2]) * share)
+            state[2] = now
+            state[1] -= nbytes
+            return -state[1] / share if state[1] < 0 else 0.0
+
+# Shared by every RobustDownloader in the process; the Gradio app changes the rate at runtime
+BANDWIDTH_LIMITER = BandwidthLimiter()
+
+class ConnectionController:
+    """Additive-increase / multiplicative-decrease control of active range connections.
+
+    Every ``interval`` seconds the aggregate throughput of the download is
+    compared with the previous interval. While adding a connection keeps
+    paying off, one more is allowed; when it stops helping the last step is
+    undone and the count is held for a while. Errors halve the count; 429/503
+    responses halve it right away, through the host's circuit in
+    RETRY_CONTROLLER (``back_off``). Workers whose slot is at or above
+    ``limit`` park.
+
+    Without ``adaptive`` the count never goes below what was asked for on
+    its own: after a back-off it only climbs back, one per interval.
+    """
+
+    IMPROVEMENT = 1.05   # Throughput must grow 5% for an added connection to count
+    HOLD_INTERVALS = 3   # Intervals to stay put after backing off
+
+    def __init__(self, host: str, initial: int, max_connections: int,
+                 min_connections: int = 1, interval: float = 2.0,
+                 budget: Optional[ConnectionBudget] = None, owner=None, adaptive: bool = True):
+        self.host = host
+        self.adaptive = adaptive
+        self.budget = budget
+        self.owner = owner
+        self.min_connections = max(1, min_connections)
+        self.max_connections = max(self.min_connections, max_connections)
+        self.limit = min(self.max_connections, max(self.min_connections, initial))
+        self.interval = interval
+        self.best_limit = self.limit
+        self.best_rate = 0.0
+
+        self._cond = threading.Condition()
+        self._errors = 0
+        self._throttled = 0
+        self._last_time = None
+        self._last_bytes = 0
+        self._last_rate = None
+        self._hold = 0
+
+    def record_error(self, throttled: bool = False):
+        with self._cond:
+            if throttled:
+                self._throttled += 1
+            else:
+                self._errors += 1
+
+    def should_yield(self, slot: int) -> bool:
+        """True when the worker in this slot is over the current limit or the global budget"""
+        return slot >= self.limit or (self.budget is not None and self.budget.over_share(self.owner))
+
+    def wait_for_slot(self, slot: int, timeout: float = 0.5) -> bool:
+        """Block up to timeout until the slot is allowed to run; returns whether it is"""
+        with self._cond:
+            if slot >= self.limit:
+                self._cond.wait(timeout)
+            return slot < self.limit
+
+    def acquire(self, slot: int, timeout: float = 0.5) -> bool:
+        """Wait up to timeout for this slot to be enabled and for a global connection"""
+        if not self.wait_for_slot(slot, timeout):
+            return False
+        return self.budget is None or self.budget.acquire(self.owner, timeout)
+
+    def release(self):
+        if self.budget is not None:
+            self.budget.release(self.owner)
+
+    def wake(self):
+        """Let parked workers look at the scheduler again (e.g. after a range failed)"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def back_off(self):
+        """Halve the connections now and hold (the host is rate limiting)"""
+        with self._cond:
+            self.limit = max(self.min_connections, self.limit // 2)
+            self._hold = self.HOLD_INTERVALS
+            self._last_rate = None
+            self._cond.notify_all()
+
+    def update(self, total_bytes: int, now: Optional[float] = None):
+        """Feed the download's total byte count; adjusts the limit once per interval"""
+        now = time.time() if now is None else now
+        with self._cond:
+            if self._last_time is None:
+                self._last_time, self._last_bytes = now, total_bytes
+                return
+            elapsed = now - self._last_time
+            if elapsed < self.interval:
+                return
+
+            rate = (total_bytes - self._last_bytes) / elapsed
+            errors, throttled = self._errors, self._throttled
+            self._errors = self._throttled = 0
+            self._last_time, self._last_bytes = now, total_bytes
+
+            if rate > self.best_rate and not (errors or throttled):
+                self.best_rate, self.best_limit = rate, self.limit
+
+            if errors and self.adaptive:
+                self.limit = max(self.min_connections, self.limit // 2)
+                self._hold = self.HOLD_INTERVALS
+                self._last_rate = None
+            elif throttled:
+                # back_off() already halved the limit; stay there while it lasts
+                self._hold = self.HOLD_INTERVALS
+                self._last_rate = None
+            elif self._hold > 0:
+                self._hold -= 1
+                self._last_rate = rate
+            elif not self.adaptive or self._last_rate is None or rate >= self._last_rate * self.IMPROVEMENT:
+                self.limit = min(self.max_connections, self.limit + 1)
+                self._last_rate = rate
+            else:
+                self.limit = max(self.min_connections, self.limit - 1)
+                self._hold = self.HOLD_INTERVALS
+                self._last_rate = rate
+            self._cond.notify_all()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RetryController:
+    """Retry timing shared by every download in the process, per host.
+
+    Each retry waits a random time between 0 and the capped exponential
+    backoff ("full jitter"), so connections that failed together don't come
+    back together. A 429 or 503 opens the host's circuit: until its
+    Retry-After has passed (or, without one, a backoff that doubles with
+    every trip in a row), no new request to that host starts, and every
+    registered ConnectionController of the host backs off once. Waiters
+    leave the open circuit spread over another ``jitter`` seconds, and a
+    response that gets through resets the trip count.
+    """
+
+    MAX_RETRY_AFTER = 600  # Longest Retry-After honored, in seconds
+
+    def __init__(self):
+        self._circuits = {}     # host -> {"open_until", "trips", "jitter"}
+        self._controllers = {}  # host -> set of ConnectionController of active downloads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urllib.parse.urlsplit(url).hostname or ""
+
+    def register(self, controller: ConnectionController):
+        with self._lock:
+            self._controllers.setdefault(controller.host, set()).add(controller)
+
+    def unregister(self, controller: ConnectionController):
+        with self._lock:
+            controllers = self._controllers.get(controller.host)
+            if controllers is not None:
+                controllers.discard(controller)
+                if not controllers:
+                    del self._controllers[controller.host]
+
+    @staticmethod
+    def backoff(attempt: int, base: float, cap: float) -> float:
+        """Full-jitter exponential backoff for the given attempt (0-based)"""
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    def open_for(self, url: str) -> float:
+        """Seconds to wait before a request to url's host may start (0 when the circuit is closed)"""
+        with self._lock:
+            circuit = self._circuits.get(self._host(url))
+            if circuit is None:
+                return 0.0
+            remaining = circuit["open_until"] - time.time()
+            jitter = circuit["jitter"]
+        return remaining + random.uniform(0, jitter) if remaining > 0 else 0.0
+
+    def delay(self, url: str, attempt: int, base: float, cap: float) -> float:
+        """How long to wait before retrying a request to url"""
+        return max(self.backoff(attempt, base, cap), self.open_for(url))
+
+    def throttled(self, url: str, retry_after: Optional[float], base: float, cap: float) -> float:
+        """Open url's host circuit after a 429/503; returns how long it stays open"""
+        host = self._host(url)
+        now = time.time()
+        with self._lock:
+            circuit = self._circuits.setdefault(host, {"open_until": 0.0, "trips": 0, "jitter": base})
+            if retry_after is not None:
+                retry_after = min(retry_after, self.MAX_RETRY_AFTER)
+            if now < circuit["open_until"]:
+                # Same burst: the circuit is open and the downloads have backed off already
+                if retry_after is not None:
+                    circuit["open_until"] = max(circuit["open_until"], now + retry_after)
+                return circuit["open_until"] - now
+            circuit["trips"] += 1
+            wait = retry_after if retry_after is not None else min(cap, base * (2 ** (circuit["trips"] - 1)))
+            circuit["open_until"] = now + wait
+            circuit["jitter"] = base
+            controllers = list(self._controllers.get(host, ()))
+        for controller in controllers:
+            controller.back_off()
+        CIRCUIT_TRIPS.labels(host or "-").inc()
+        return wait
+
+    def succeeded(self, url: str):
+        """A request to url's host got through: the next trip starts from the base backoff again"""
+        host = self._host(url)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None and time.time() >= circuit["open_until"]:
+                del self._circuits[host]
+
+# Shared by every RobustDownloader in the process
+RETRY_CONTROLLER = RetryController()
+
+class RangeConnection:
+    """One open range request, which the StallWatchdog or a winning hedge can cut short"""
+
+    def __init__(self, close: Callable[[], None]):
+        self._close = close
+        self._lock = threading.Lock()
+        self.closed = False
+        self.aborted = False
+        self.bytes = 0
+        self.opened = self.last_data = self.window_start = time.time()
+        self.window_bytes = 0
+        self.rate: Optional[float] = None  # Bytes/s over the last full watchdog window
+
+    def received(self, nbytes: int):
+        self.bytes += nbytes
+        self.last_data = time.time()
+
+    def abort(self):
+        """Close the connection from another thread; a read blocked on it fails at once"""
+        with self._lock:
+            if self.closed or self.aborted:
+                return
+            self.aborted = True
+            try:
+                self._close()
+            except Exception:
+                pass
+
+    def finish(self):
+        """Called by the worker before it closes the response itself"""
+        with self._lock:
+            self.closed = True
+
+class StallWatchdog:
+    """Restarts the range connections of one download that stall or crawl.
+
+    ``check`` runs from the download's monitor. Every ``window`` seconds it
+    measures each open connection's rate over the last window; a connection
+    that received nothing for ``stall_timeout`` seconds, or whose rate is
+    below ``min_ratio`` times the median rate, is aborted. The median also
+    covers connections that finished recently, so the last connection of a
+    file is still judged once the others are done. The aborted worker gives
+    its range back and it's picked up again on a fresh connection, instead
+    of waiting out the full request timeout. 0 turns either check off.
+    """
+
+    MIN_SAMPLE_BYTES = 1024 * 1024  # Finished connections smaller than this say little about the rate
+    RECENT_SAMPLES = 16
+
+    def __init__(self, min_ratio: float = 0.1, stall_timeout: float = 30.0, window: float = 3.0):
+        self.min_ratio = min_ratio
+        self.stall_timeout = stall_timeout
+        self.window = window
+        self.aborted = 0
+        self._connections = set()
+        self._recent = collections.deque(maxlen=self.RECENT_SAMPLES)  # Rates of finished connections
+        self._lock = threading.Lock()
+
+    def watch(self, connection: RangeConnection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def unwatch(self, connection: RangeConnection):
+        with self._lock:
+            self._connections.discard(connection)
+            elapsed = time.time() - connection.opened
+            if not connection.aborted and connection.bytes >= self.MIN_SAMPLE_BYTES and elapsed > 0:
+                self._recent.append(connection.bytes / elapsed)
+
+    def check(self, now: Optional[float] = None) -> int:
+        """Abort stalled and crawling connections; returns how many"""
+        if not (self.min_ratio or self.stall_timeout):
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            connections = list(self._connections)
+            recent = list(self._recent)
+        for connection in connections:
+            elapsed = now - connection.window_start
+            if elapsed >= self.window:
+                received = connection.bytes
+                connection.rate = (received - connection.window_bytes) / elapsed
+                connection.window_start, connection.window_bytes = now, received
+
+        rates = sorted([c.rate for c in connections if c.rate is not None] + recent)
+        median = rates[len(rates) // 2] if len(rates) >= 2 else 0.0
+        stalled = [c for c in connections if not c.aborted and (
+            (self.stall_timeout and now - c.last_data >= self.stall_timeout)
+            or (self.min_ratio and median > 0 and c.rate is not None and c.rate < self.min_ratio * median))]
+        for connection in stalled:
+            connection.abort()
+        self.aborted += len(stalled)
+        return len(stalled)
+
+JOURNAL_VERSION = 2  # Journals older than this lack the SHA / revision needed to resume without probing
+
 class RobustDownloader:
     def __init__(self, config: Dict):
         self.config = config
         self.cancel_event = None  # Will be set if cancellation is supported
+        self.status_callback = None  # Optional callable("downloading" / "verifying")
+        self.progress_callback = None  # Optional callable(text) receiving every progress line
         # Create session with connection pooling
         self.session = requests.Session()
+        # Connection errors are retried here; 429/503 come back to us so
+        # RETRY_CONTROLLER sees them instead of urllib3 sleeping per thread.
+        # Room for every range worker, or connections past the pool size are
+        # dropped after each range and the next one pays a new handshake.
+        pool_size = max(20, config.get("max_connections", 32), config.get("num_connections", 16))
         adapter = requests.adapters.HTTPAdapter(
             pool_connections=20,
-            pool_maxsize=20,
-            max_retries=3
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, respect_retry_after_header=False)
         )
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
-        # Cache files in the same directory where script runs
-        script_dir = os.path.dirname(os.path.abspath(__file__)) if __file__ else os.getcwd()
+        # Cache files in the same directory where script runs, unless configured elsewhere
+        script_dir = config.get("cache_dir") or (os.path.dirname(os.path.abspath(__file__)) if __file__ else os.getcwd())
         
-        # SHA256 cache file
+        # SHA256 and verified-files caches live in one SQLite database shared
+        # by every downloader and process; the old JSON files are imported once
+        self.cache_db_file = os.path.join(script_dir, "download_cache.db")
+        self.cache_store = get_cache_store(self.cache_db_file)
+
+        # SHA256 cache (legacy JSON file is migrated on first use)
         self.sha_cache_file = os.path.join(script_dir, "sha256_cache.json")
         self.sha_cache = self.load_sha_cache()
         
@@ -58,11 +1166,14 @@ class RobustDownloader:
         self.verified_cache_file = os.path.join(script_dir, "verified_files_cache.json")
         self.verified_cache = self.load_verified_cache()
         
-        # Debug: Print cache file locations
-        print(f"[DEBUG] Cache files will be saved in: {script_dir}")
-        print(f"[DEBUG] SHA256 cache: {self.sha_cache_file}")
-        print(f"[DEBUG] Verified cache: {self.verified_cache_file}")
-        print(f"[DEBUG] Current working directory: {os.getcwd()}")
+        # Revision / validator of probed URLs, filled by get_file_size
+        self.remote_info = {}
+        self.upstream_changed = False
+
+        # Learned per-host connection counts from earlier downloads
+        self.connection_tuning_file = os.path.join(script_dir, "connection_tuning.json")
+        self.connection_tuning = self.load_connection_tuning()
+
 
         # Console/progress management (single-line, cross-platform)
         self._progress_lock = threading.Lock()
@@ -101,6 +1212,11 @@ class RobustDownloader:
                 self._clear_progress_line_locked()
 
     def show_progress_line(self, text: str):
+        if self.progress_callback:
+            try:
+                self.progress_callback(text)
+            except Exception:
+                pass
         # Ensure we never wrap: truncate to terminal width - 1
         with self._progress_lock:
             width = self._get_terminal_width()
@@ -140,6 +1256,10 @@ class RobustDownloader:
             self._last_progress_len = 0
             self._active_progress = False
 
+    def throttle(self, owner, nbytes: int):
+        """Pause as long as the global bandwidth limit asks for (wakes up on cancel)"""
+        self.pause(BANDWIDTH_LIMITER.reserve(owner, nbytes))
+
     def log(self, msg: str):
         # Print a normal log line, ensuring it doesn't collide with progress line
         with self._progress_lock:
@@ -149,43 +1269,52 @@ class RobustDownloader:
 
     # --------------------------- SHA256 cache utils ---------------------------
 
-    def load_sha_cache(self) -> Dict[str, str]:
-        """Load SHA256 cache from file"""
-        if os.path.exists(self.sha_cache_file):
+    def _load_cache_table(self, name: str, json_path: str):
+        """Open a cache table, importing the legacy JSON cache the first time.
+
+        Falls back to the JSON file as a plain dict if the database can't be
+        opened, so downloads still work from a read-only folder.
+        """
+        if self.cache_store is not None:
             try:
-                with open(self.sha_cache_file, 'r') as f:
+                table = self.cache_store.table(name)
+                self.cache_store.migrate_json(json_path, table)
+                return table
+            except Exception as e:
+                self.log(f"Warning: Could not use cache database for {name}: {e}")
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r') as f:
                     return json.load(f)
             except:
                 return {}
         return {}
 
+    def load_sha_cache(self) -> Dict[str, str]:
+        """Load SHA256 cache (a dict-like view of the cache database)"""
+        return self._load_cache_table("sha256", self.sha_cache_file)
+
     def save_sha_cache(self):
-        """Save SHA256 cache to file"""
-        try:
-            with open(self.sha_cache_file, 'w') as f:
-                json.dump(self.sha_cache, f, indent=2)
-        except Exception as e:
-            self.log(f"Warning: Could not save SHA cache: {e}")
+        """Entries are written as they are set; only the JSON fallback needs saving"""
+        if isinstance(self.sha_cache, dict):
+            try:
+                with open(self.sha_cache_file, 'w') as f:
+                    json.dump(self.sha_cache, f, indent=2)
+            except Exception as e:
+                self.log(f"Warning: Could not save SHA cache: {e}")
 
     def load_verified_cache(self) -> Dict[str, Dict]:
-        """Load verified files cache from file"""
-        if os.path.exists(self.verified_cache_file):
-            try:
-                with open(self.verified_cache_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        """Load verified files cache (a dict-like view of the cache database)"""
+        return self._load_cache_table("verified", self.verified_cache_file)
 
     def save_verified_cache(self):
-        """Save verified files cache to file"""
-        try:
-            with open(self.verified_cache_file, 'w') as f:
-                json.dump(self.verified_cache, f, indent=2)
-            print(f"[DEBUG] Verified cache saved to: {self.verified_cache_file}")
-            print(f"[DEBUG] Cache contains {len(self.verified_cache)} entries")
-        except Exception as e:
-            self.log(f"Warning: Could not save verified cache: {e}")
+        """Entries are written as they are set; only the JSON fallback needs saving"""
+        if isinstance(self.verified_cache, dict):
+            try:
+                with open(self.verified_cache_file, 'w') as f:
+                    json.dump(self.verified_cache, f, indent=2)
+            except Exception as e:
+                self.log(f"Warning: Could not save verified cache: {e}")
 
     def is_file_verified(self, repo_id: str, filename: str, filepath: str, expected_sha: str) -> bool:
         """Check if file has already been verified and hasn't changed"""
@@ -194,28 +1323,28 @@ class RobustDownloader:
             
         cache_key = f"{repo_id}/{filename}"
         
-        if cache_key not in self.verified_cache:
-            return False
-            
-        cached_info = self.verified_cache[cache_key]
-        
+        cached_info = self.verified_cache.get(cache_key)
+        verified = False
         # Check if file exists and has same size and modification time
-        if not os.path.exists(filepath):
-            return False
-            
-        current_size = os.path.getsize(filepath)
-        current_mtime = os.path.getmtime(filepath)
-        
-        return (cached_info.get('sha256') == expected_sha and
-                cached_info.get('size') == current_size and
-                abs(cached_info.get('mtime', 0) - current_mtime) < 1.0)  # Allow 1 second tolerance
+        if cached_info is not None and os.path.exists(filepath) and (
+                not cached_info.get('path') or cached_info['path'] == os.path.abspath(filepath)):
+            current_size = os.path.getsize(filepath)
+            current_mtime = os.path.getmtime(filepath)
+            verified = (cached_info.get('sha256') == expected_sha and
+                        cached_info.get('size') == current_size and
+                        abs(cached_info.get('mtime', 0) - current_mtime) < 1.0)  # Allow 1 second tolerance
+
+        CACHE_LOOKUPS.labels("verified", "hit" if verified else "miss").inc()
+        return verified
 
     def mark_file_verified(self, repo_id: str, filename: str, filepath: str, sha256: str):
         """Mark file as verified in cache"""
+        if FILE_MOVER.is_pending(filepath):
+            # Still on scratch: record it once it has landed at filepath
+            FILE_MOVER.after(filepath, lambda ok: ok and self.mark_file_verified(repo_id, filename, filepath, sha256))
+            return
         cache_key = f"{repo_id}/{filename}"
         
-        print(f"[DEBUG] Marking file as verified: {filename}")
-        
         if os.path.exists(filepath):
             file_size = os.path.getsize(filepath)
             file_mtime = os.path.getmtime(filepath)
@@ -224,13 +1353,48 @@ class RobustDownloader:
                 'sha256': sha256,
                 'size': file_size,
                 'mtime': file_mtime,
+                'path': os.path.abspath(filepath),
                 'verified_at': time.time()
             }
-            
-            print(f"[DEBUG] Added to cache: {cache_key}")
             self.save_verified_cache()
-        else:
-            print(f"[DEBUG] File does not exist, cannot mark as verified: {filepath}")
+
+    # ------------------------ Per-host connection tuning ----------------------
+
+    def load_connection_tuning(self) -> Dict[str, Dict]:
+        """Load learned per-host connection counts from file"""
+        if os.path.exists(self.connection_tuning_file):
+            try:
+                with open(self.connection_tuning_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def save_connection_tuning(self, controller: ConnectionController):
+        """Remember the best connection count a download found for its host"""
+        if controller.best_rate <= 0:
+            return
+        try:
+            # Re-read so concurrent downloads to other hosts aren't overwritten
+            tuning = self.load_connection_tuning()
+            tuning[controller.host] = {
+                'connections': controller.best_limit,
+                'throughput': controller.best_rate,
+                'updated_at': time.time(),
+            }
+            temp_file = f"{self.connection_tuning_file}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(tuning, f, indent=2)
+            os.replace(temp_file, self.connection_tuning_file)
+            self.connection_tuning = tuning
+        except Exception as e:
+            self.log(f"Warning: Could not save connection tuning: {e}")
+
+    def get_learned_connections(self, host: str) -> Optional[int]:
+        learned = self.connection_tuning.get(host)
+        if learned and learned.get('connections'):
+            return int(learned['connections'])
+        return None
 
     def get_file_sha256(self, repo_id: str, filename: str) -> Optional[str]:
         """Get SHA256 hash for a file from Hugging Face"""
@@ -238,7 +1402,17 @@ class RobustDownloader:
 
         # Check cache first
         if cache_key in self.sha_cache:
+            CACHE_LOOKUPS.labels("sha256", "hit").inc()
             return self.sha_cache[cache_key]
+        CACHE_LOOKUPS.labels("sha256", "miss").inc()
+
+        # The repo listing answers this for every file of the repo at once
+        info = REPO_METADATA.get_file(repo_id, filename)
+        if info is not None:
+            if info['sha256']:
+                self.sha_cache[cache_key] = info['sha256']
+                self.save_sha_cache()
+            return info['sha256']
 
         try:
             # Method 1: Try to get from file metadata
@@ -359,14 +1533,33 @@ class RobustDownloader:
 
     # ------------------------------ Networking --------------------------------
 
-    def get_file_url(self, repo_id: str, filename: str) -> str:
+    def get_file_url(self, repo_id: str, filename: str, revision: str = "main") -> str:
         """Get direct download URL for HuggingFace file"""
-        return f"https://huggingface.co/{repo_id}/resolve/main/{filename}"
+        return f"https://huggingface.co/{repo_id}/resolve/{revision}/{filename}"
+
+    def resolve_file(self, repo_id: str, filename: str) -> Tuple[str, Optional[str], Optional[int]]:
+        """Download URL, expected SHA256 and size of a repo file.
+
+        Normally answered from the repo listing (one request per repo, see
+        repo_metadata), with the URL pinned to the listed commit. Falls back
+        to per-file metadata and a HEAD request when the listing is
+        unavailable.
+        """
+        url = self.get_file_url(repo_id, filename)
+        info = REPO_METADATA.get_file(repo_id, filename)
+        if info and info.get('size') is not None:
+            pinned = self.get_file_url(repo_id, filename, info['commit'])
+            self.remote_info[pinned] = {'source_url': url, 'revision': info['commit'], 'validator': None}
+            return pinned, info['sha256'], info['size']
+        expected_sha = self.get_file_sha256(repo_id, filename)
+        file_size = self.get_file_size(url)
+        return self.pin_revision(url), expected_sha, file_size
 
     def get_file_size(self, url: str) -> Optional[int]:
-        """Get file size from remote server"""
+        """Get file size from remote server (also records its revision and validator)"""
         try:
             response = self.session.head(url, timeout=30, allow_redirects=True)
+            self.remote_info[url] = self.get_remote_identity(url, response)
             if response.status_code == 200:
                 content_length = response.headers.get('content-length')
                 if content_length:
@@ -376,6 +1569,7 @@ class RobustDownloader:
             headers = {'Range': 'bytes=0-0'}
             response = self.session.get(url, headers=headers, timeout=30, stream=True)
             if response.status_code == 206:
+                self.remote_info[url] = self.get_remote_identity(url, response)
                 content_range = response.headers.get('content-range')
                 if content_range and '/' in content_range:
                     total_size = content_range.split('/')[-1]
@@ -395,6 +1589,120 @@ class RobustDownloader:
             self.log(f"Warning: Could not get file size: {e}")
             return None
 
+    @staticmethod
+    def get_validator(headers) -> Optional[str]:
+        """Strong ETag, else Last-Modified: what If-Range can compare against"""
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return headers.get('Last-Modified')
+
+    def get_remote_identity(self, url: str, response) -> Dict:
+        """Which version of a file a probe response describes.
+
+        ``revision`` is the HuggingFace commit the URL resolved to (sent on the
+        Hub response before the CDN redirect); ``validator`` comes from the
+        server that actually serves the bytes.
+        """
+        revision = None
+        for hop in list(response.history) + [response]:
+            revision = revision or hop.headers.get('X-Repo-Commit')
+        return {'source_url': url, 'revision': revision, 'validator': self.get_validator(response.headers)}
+
+    def pin_revision(self, url: str) -> str:
+        """Point a /resolve/<branch>/ URL at the commit it resolved to when probed.
+
+        Every range, and any later resume, then reads the same immutable
+        bytes even if the branch moves on in the meantime.
+        """
+        info = self.remote_info.get(url)
+        revision = info.get('revision') if info else None
+        if not revision:
+            return url
+        pinned = re.sub(r'/resolve/[^/]+/', f'/resolve/{revision}/', url, count=1)
+        self.remote_info[pinned] = info
+        return pinned
+
+    def get_range_headers(self, url: str, start: int, end: int) -> Dict[str, str]:
+        """Range request headers; If-Range makes a changed file come back as a 200"""
+        headers = {'Range': f'bytes={start}-{end}'}
+        validator = (self.remote_info.get(url) or {}).get('validator')
+        if validator:
+            headers['If-Range'] = validator
+        return headers
+
+    def follow_redirects(self, url: str) -> Tuple[str, float]:
+        """Final location of url and how long its redirect hops took (for REDIRECT_CACHE)"""
+        response = self.session.head(url, timeout=30, allow_redirects=True)
+        response.close()
+        return response.url, sum(hop.elapsed.total_seconds() for hop in response.history)
+
+    @staticmethod
+    def location_headers(url: str, location: str, headers: Dict[str, str]) -> Dict[str, str]:
+        """Request headers for a cached location: like a followed redirect, no credentials to another host"""
+        if urllib.parse.urlsplit(location).netloc == urllib.parse.urlsplit(url).netloc:
+            return headers
+        return dict(headers, Authorization=None)
+
+    def get_range(self, url: str, headers: Dict[str, str]):
+        """Streamed GET of url at its cached CDN location (see RedirectCache).
+
+        Waits first while the host's circuit is open (see RetryController).
+        A 403/410 from a cached location means its signature expired or was
+        revoked: the location is resolved again and the request repeated once.
+        """
+        self.pause(RETRY_CONTROLLER.open_for(url))
+        for retry in (False, True):
+            location = REDIRECT_CACHE.resolve(url, self.follow_redirects)
+            response = self.session.get(location, headers=self.location_headers(url, location, headers),
+                                        timeout=self.config["timeout"], stream=True)
+            if retry or location == url or response.status_code not in (403, 410):
+                self.note_response(url, response.status_code, response.headers)
+                return response
+            response.close()
+            REDIRECT_CACHE.invalidate(url, location)
+        return response
+
+    def note_response(self, url: str, status_code: int, headers):
+        """Report a response status to the host's circuit: 429/503 open it, a success resets it"""
+        if status_code in (429, 503):
+            RETRY_CONTROLLER.throttled(url, parse_retry_after(headers.get('Retry-After')),
+                                       self.config["retry_delay"], self.config["max_retry_delay"])
+        elif status_code < 400:
+            RETRY_CONTROLLER.succeeded(url)
+
+    def retry_delay(self, url: str, attempt: int) -> float:
+        """Seconds to wait before retry attempt + 1: jittered backoff, or longer while the host's circuit is open"""
+        return RETRY_CONTROLLER.delay(url, attempt, self.config["retry_delay"], self.config["max_retry_delay"])
+
+    def pause(self, seconds: float):
+        """Sleep, but return early when the download is cancelled"""
+        if seconds <= 0:
+            return
+        if self.cancel_event:
+            self.cancel_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    def is_upstream_change(self, url: str, status_code: int, headers) -> bool:
+        """True when a ranged request came back whole because the file changed on the server"""
+        validator = (self.remote_info.get(url) or {}).get('validator')
+        return status_code == 200 and bool(validator) and self.get_validator(headers) != validator
+
+    @staticmethod
+    def range_start_matches(headers, start: int) -> bool:
+        """False when a 206 response's Content-Range begins anywhere but where we asked"""
+        match = re.match(r'bytes\s+(\d+)-', headers.get('Content-Range', ''))
+        return match is None or int(match.group(1)) == start
+
+    def report_status(self, state: str):
+        """Tell the caller what this download is doing; never fails the download"""
+        if self.status_callback:
+            try:
+                self.status_callback(state)
+            except Exception:
+                pass
+
     # ----------------------- Chunk I/O and verification -----------------------
 
     def verify_file_sha256(self, filepath: str, expected_sha: str, filename: str = "") -> bool:
@@ -404,6 +1712,7 @@ class RobustDownloader:
             return True  # Can't verify, assume OK
 
         display_name = filename or os.path.basename(filepath) or filepath
+        self.report_status("verifying")
         self.log(f"[VERIFYING] Computing SHA256 for {display_name}...")
 
         try:
@@ -439,6 +1748,7 @@ class RobustDownloader:
 
             # Finalize
             computed_sha = sha256_hash.hexdigest()
+            VERIFY_SECONDS.observe(time.time() - start_time)
 
             if computed_sha == expected_sha:
                 self.finalize_progress_line(f"[VERIFIED] SHA256 match: {computed_sha[:16]}...")
@@ -458,6 +1768,12 @@ class RobustDownloader:
                       filepath: str, chunk_id: int,
                       progress_callback=None) -> bool:
         """Download a specific chunk with resume support"""
+        with CONNECTION_BUDGET.connection(f"{filepath}.part{chunk_id}"), BANDWIDTH_LIMITER.transfer(filepath):
+            return self._download_chunk(url, start, end, filepath, chunk_id, progress_callback)
+
+    def _download_chunk(self, url: str, start: int, end: int,
+                        filepath: str, chunk_id: int,
+                        progress_callback=None) -> bool:
         chunk_file = os.path.normpath(f"{filepath}.part{chunk_id}")
         chunk_size_expected = end - start + 1
 
@@ -490,24 +1806,47 @@ class RobustDownloader:
                 actual_start = start + resume_pos
                 headers = {'Range': f'bytes={actual_start}-{end}'}
 
-                response = self.session.get(url, headers=headers,
-                                          timeout=self.config["timeout"],
-                                          stream=True)
+                response = self.get_range(url, headers)
 
-                if response.status_code not in [200, 206]:
+                # A whole-file 200 only fits a chunk that is the whole file
+                if response.status_code == 200:
+                    if actual_start != 0 or response.headers.get('Content-Length') != str(chunk_size_expected):
+                        response.close()
+                        raise Exception("Server ignored the Range header")
+                elif response.status_code != 206:
+                    response.close()
                     raise Exception(f"Bad status code: {response.status_code}")
+                elif not self.range_start_matches(response.headers, actual_start):
+                    response.close()
+                    raise Exception(f"Content-Range mismatch: {response.headers.get('Content-Range')}")
 
                 # Download chunk
                 mode = 'ab' if resume_pos > 0 else 'wb'
                 downloaded = resume_pos
+                meter = TransferMeter(url)
 
-                with open(chunk_file, mode) as f:
-                    for data in response.iter_content(chunk_size=self.config["chunk_size"]):
-                        if data:
-                            f.write(data)
-                            downloaded += len(data)
-                            if progress_callback:
-                                progress_callback(chunk_id, downloaded)
+                try:
+                    with open(chunk_file, mode) as f:
+                        # The chunks of one file share its window
+                        window = self.config.get("write_behind", 0)
+                        if window:
+                            window = max(1024 * 1024, window // max(1, self.config["num_connections"]))
+                        write_behind = WriteBehind(f.fileno(), window)
+                        try:
+                            for data in response.iter_content(chunk_size=BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
+                                if data:
+                                    f.write(data)
+                                    write_behind.wrote(downloaded, len(data))
+                                    downloaded += len(data)
+                                    meter.add(len(data))
+                                    if progress_callback:
+                                        progress_callback(chunk_id, downloaded)
+                                    self.throttle(filepath, len(data))
+                        finally:
+                            f.flush()
+                            write_behind.finish()
+                finally:
+                    meter.finish()
 
                 # Verify chunk is complete
                 final_size = os.path.getsize(chunk_file)
@@ -526,16 +1865,264 @@ class RobustDownloader:
                     raise Exception(f"Chunk too large: {final_size}/{chunk_size_expected}")
 
             except Exception as e:
+                # A stream that broke mid-body still wrote what it got: resume after it
+                resume_pos = os.path.getsize(chunk_file) if os.path.exists(chunk_file) else 0
+                if resume_pos > chunk_size_expected:
+                    os.remove(chunk_file)
+                    resume_pos = 0
                 if attempt < max_retries - 1:
-                    delay = min(self.config["retry_delay"] * (2 ** attempt),
-                              self.config["max_retry_delay"])
-                    time.sleep(delay)
+                    record_retry(url)
+                    self.pause(self.retry_delay(url, attempt))
                 else:
+                    record_failure(url)
                     self.log(f"Chunk {chunk_id} failed after {max_retries} attempts: {e}")
                     return False
 
         return False
 
+    @staticmethod
+    def abort_response(response):
+        """Shut down the socket of a streamed response so a read blocked on it returns at once"""
+        connection = getattr(response.raw, 'connection', None)
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+
+    def download_range(self, url: str, byte_range: ByteRange, output: PreallocatedFile,
+                       scheduler: RangeScheduler,
+                       controller: Optional[ConnectionController] = None, slot: int = 0,
+                       watchdog: Optional[StallWatchdog] = None) -> bool:
+        """Download the rest of a byte range straight into its offsets in the output file.
+
+        The range's end is re-read under the scheduler lock before every write,
+        so the worker stops early when another worker steals its tail. It also
+        stops (returning True, range left unfinished) when the connection
+        controller lowers the limit below this worker's slot, or when its
+        connection is aborted by the stall watchdog or by a hedge that
+        finished first. Returns False only when the range failed.
+        """
+        max_retries = self.config["max_retries"]
+
+        for attempt in range(max_retries):
+            if self.cancel_event and self.cancel_event.is_set():
+                return False
+            actual_start, end = scheduler.position(byte_range)
+            if actual_start > end:
+                return True
+            try:
+                headers = self.get_range_headers(url, actual_start, end)
+
+                response = self.get_range(url, headers)
+
+                if self.is_upstream_change(url, response.status_code, response.headers):
+                    response.close()
+                    self.upstream_changed = True
+                    return False
+
+                # A 200 means the server ignored our Range and is sending the
+                # file from byte 0; writing that at our offset would corrupt it.
+                if response.status_code != 206 and not (response.status_code == 200 and actual_start == 0):
+                    response.close()
+                    if controller:
+                        controller.record_error(throttled=response.status_code in (429, 503))
+                    raise Exception(f"Bad status code: {response.status_code}")
+                if response.status_code == 206 and not self.range_start_matches(response.headers, actual_start):
+                    response.close()
+                    if controller:
+                        controller.record_error()
+                    raise Exception(f"Content-Range mismatch: {response.headers.get('Content-Range')}")
+
+                meter = TransferMeter(url)
+                connection = RangeConnection(lambda: self.abort_response(response))
+                scheduler.attach(byte_range, connection)
+                if watchdog:
+                    watchdog.watch(connection)
+                try:
+                    for data in response.iter_content(chunk_size=BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
+                        if not data:
+                            continue
+                        meter.add(len(data))
+                        connection.received(len(data))
+                        if self.cancel_event and self.cancel_event.is_set():
+                            return False
+                        if controller and controller.should_yield(slot):
+                            return True
+                        offset, allowed = scheduler.reserve(byte_range, len(data))
+                        if allowed < len(data):
+                            data = data[:allowed]
+                        if data:
+                            output.write_at(offset, data)
+                            scheduler.commit(byte_range, offset, len(data))
+                            self.throttle(output.path, len(data))
+                        if scheduler.is_complete(byte_range) or connection.aborted:
+                            break
+                except Exception:
+                    if not connection.aborted:
+                        raise
+                finally:
+                    connection.finish()
+                    scheduler.attach(byte_range, None)
+                    if watchdog:
+                        watchdog.unwatch(connection)
+                    meter.finish()
+                    response.close()
+
+                # Aborted: give the range back so it's picked up on a fresh connection
+                if scheduler.is_complete(byte_range) or connection.aborted:
+                    return True
+                if controller:
+                    controller.record_error()
+                raise Exception(f"Range incomplete: {byte_range.done}/{byte_range.length}")
+
+            except Exception as e:
+                if controller and isinstance(e, requests.exceptions.RequestException):
+                    controller.record_error()
+                if attempt < max_retries - 1:
+                    record_retry(url)
+                    self.pause(self.retry_delay(url, attempt))
+                else:
+                    record_failure(url)
+                    self.log(f"Range {byte_range.start}-{byte_range.end} failed after {max_retries} attempts: {e}")
+                    return False
+
+        return False
+
+    # ------------------------------ Resume journal ----------------------------
+
+    def get_journal_path(self, partial_path: str) -> str:
+        """Sidecar file that records per-range progress of an in-place download"""
+        return f"{partial_path}.json"
+
+    def read_journal(self, partial_path: str) -> Optional[Dict]:
+        """Parsed resume journal whose ranges tile the partial file, or None.
+
+        Besides ``ranges`` ([start, end, done] each) a journal holds ``url``
+        (what is fetched, pinned to a revision when known), ``source_url``,
+        ``size``, ``sha256``, ``revision`` and ``validator``.
+        """
+        journal_path = self.get_journal_path(partial_path)
+        if not (os.path.exists(journal_path) and os.path.exists(partial_path)):
+            return None
+        try:
+            with open(journal_path, 'r') as f:
+                journal = json.load(f)
+            file_size = journal.get('size')
+            if not isinstance(file_size, int) or os.path.getsize(partial_path) != file_size:
+                return None
+            ranges = [[int(start), int(end), int(done)] for start, end, done in journal['ranges']]
+            # Ranges must tile the whole file, otherwise we can't trust them
+            expected_start = 0
+            for start, end, done in ranges:
+                if start != expected_start or end < start or not 0 <= done <= end - start + 1:
+                    return None
+                expected_start = end + 1
+            if expected_start != file_size:
+                return None
+            journal['ranges'] = ranges
+            return journal
+        except Exception:
+            return None
+
+    def load_journal(self, partial_path: str, url: str, file_size: int,
+                     expected_sha: Optional[str] = None) -> Optional[List[List[int]]]:
+        """Load [start, end, done] ranges if the journal belongs to this download, or None.
+
+        A journal written while fetching from another source (a LAN peer
+        instead of HuggingFace, or the other way round) still counts when it
+        records the same SHA256: the bytes are the same either way.
+        """
+        journal = self.read_journal(partial_path)
+        if not journal or journal['size'] != file_size:
+            return None
+        if expected_sha and journal.get('sha256') and journal['sha256'] != expected_sha:
+            return None
+        if journal.get('url') != url and not (expected_sha and journal.get('sha256') == expected_sha):
+            return None
+        return journal['ranges']
+
+    def load_resume_journal(self, source_url: str, filepath: str) -> Optional[Dict]:
+        """Journal of an interrupted download of source_url into filepath that can resume without probing.
+
+        It must record everything a probe would tell us (size, SHA256 and the
+        revision or validator that pins the bytes), otherwise returns None.
+        """
+        journal = None
+        if self.config.get("scratch_dir"):
+            journal = self.read_journal(os.path.normpath(f"{self.get_staging_path(filepath)}.partial"))
+        journal = journal or self.read_journal(os.path.normpath(f"{filepath}.partial"))
+        if not journal or journal.get('version', 1) < JOURNAL_VERSION:
+            return None
+        if journal.get('source_url') != source_url or not journal.get('sha256'):
+            return None
+        if not (journal.get('revision') or journal.get('validator')):
+            return None
+        return journal
+
+    def save_journal(self, partial_path: str, info: Dict, ranges: List[List[int]],
+                     output: Optional[PreallocatedFile] = None):
+        """Atomically replace the resume journal for an in-place download.
+
+        With ``journal_fsync`` the data file is flushed before the journal is
+        written, so every byte the journal counts as done is on disk even if
+        the machine dies right after. ``ranges`` must be snapshotted before
+        calling this.
+        """
+        journal_path = self.get_journal_path(partial_path)
+        temp_path = f"{journal_path}.tmp"
+        sync = self.config.get("journal_fsync", True)
+        try:
+            if sync and output is not None:
+                os.fsync(output.fd)
+            with open(temp_path, 'w') as f:
+                json.dump(dict(info, version=JOURNAL_VERSION, ranges=ranges, updated_at=time.time()), f)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, journal_path)
+            if sync:
+                _fsync_dir(os.path.dirname(journal_path))
+        except Exception as e:
+            self.log(f"Warning: Could not save resume journal: {e}")
+
+    def remove_journal(self, partial_path: str):
+        for path in (self.get_journal_path(partial_path), f"{self.get_journal_path(partial_path)}.tmp"):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def find_legacy_parts(self, filepath: str, file_size: int, num_chunks: int) -> List[Tuple[str, int, int]]:
+        """(path, offset, length) of the usable .partN files left by the legacy chunked mode"""
+        parts = []
+        base_chunk_size = file_size // num_chunks
+        for i in range(num_chunks):
+            chunk_file = os.path.normpath(f"{filepath}.part{i}")
+            if not os.path.exists(chunk_file):
+                continue
+            start = i * base_chunk_size
+            end = file_size - 1 if i == num_chunks - 1 else (i + 1) * base_chunk_size - 1
+            size = os.path.getsize(chunk_file)
+            if size > end - start + 1:
+                self.log(f"[WARNING] Ignoring {os.path.basename(chunk_file)}: {self.format_bytes(size)} "
+                         f"does not fit its {self.format_bytes(end - start + 1)} chunk")
+            elif size > 0:
+                parts.append((chunk_file, start, size))
+        return parts
+
+    def remove_legacy_parts(self, filepath: str, num_chunks: int, reason: str):
+        removed = 0
+        for i in range(num_chunks):
+            chunk_file = os.path.normpath(f"{filepath}.part{i}")
+            try:
+                if os.path.exists(chunk_file):
+                    os.remove(chunk_file)
+                    removed += 1
+            except OSError as e:
+                self.log(f"Warning: Could not remove {chunk_file}: {e}")
+        if removed:
+            self.log(f"[INFO] Removed {removed} legacy .partN files ({reason})")
+
     # ------------------------------ Merge chunks ------------------------------
 
     def merge_chunks(self, filepath: str, num_chunks: int) -> bool:
@@ -567,6 +2154,7 @@ class RobustDownloader:
             last_update = 0.0
 
             with open(temp_file, 'wb') as outfile:
+                write_behind = WriteBehind(outfile.fileno(), self.config.get("write_behind", 0))
                 for chunk_file, chunk_size in chunk_files:
                     with open(chunk_file, 'rb') as infile:
                         bytes_copied = 0
@@ -576,6 +2164,7 @@ class RobustDownloader:
                             if not data:
                                 break
                             outfile.write(data)
+                            write_behind.wrote(merged_size, len(data))
                             bytes_copied += len(data)
                             merged_size += len(data)
 
@@ -591,6 +2180,8 @@ class RobustDownloader:
                                 )
                                 self.show_progress_line(line)
                                 last_update = now
+                outfile.flush()
+                write_behind.finish()
 
             # Final progress line
             elapsed = max(0.001, time.time() - start_time)
@@ -636,6 +2227,7 @@ class RobustDownloader:
 
             # Use buffered concat for portability
             with open(temp_file, 'wb') as outfile:
+                write_behind = WriteBehind(outfile.fileno(), self.config.get("write_behind", 0))
                 for i, (chunk_file, chunk_size) in enumerate(chunk_files):
                     # Update line per chunk and overall bytes to avoid extra prints
                     now = time.time()
@@ -646,8 +2238,17 @@ class RobustDownloader:
                         last_update = now
 
                     with open(chunk_file, 'rb') as infile:
-                        shutil.copyfileobj(infile, outfile, length=128 * 1024 * 1024)  # 128MB buffer
-                    merged_size += chunk_size
+                        if write_behind.enabled:
+                            # Copy a window at a time so writeback keeps pace with the copy
+                            for data in iter(lambda: infile.read(write_behind.window), b''):
+                                outfile.write(data)
+                                write_behind.wrote(merged_size, len(data))
+                                merged_size += len(data)
+                        else:
+                            shutil.copyfileobj(infile, outfile, length=128 * 1024 * 1024)  # 128MB buffer
+                            merged_size += chunk_size
+                outfile.flush()
+                write_behind.finish()
 
             elapsed = max(0.001, time.time() - start_time)
             avg_speed = total_size / elapsed
@@ -690,14 +2291,16 @@ class RobustDownloader:
         file_dir = os.path.dirname(filepath)
         os.makedirs(file_dir, exist_ok=True)
 
-        # Get expected SHA256
-        expected_sha = self.get_file_sha256(repo_id, filename)
+        # An interrupted download resumes from its journal without asking the server again
+        resumed = self.resume_from_journal(url, filepath, filename, repo_id, filename)
+        if resumed is not None:
+            return resumed
+
+        # Get expected SHA256 and file size
+        download_url, expected_sha, file_size = self.resolve_file(repo_id, filename)
         if expected_sha:
             self.log(f"[INFO] Expected SHA256: {expected_sha[:16]}...")
 
-        # Get file size
-        file_size = self.get_file_size(url)
-
         # Check if already complete
         if os.path.exists(filepath):
             actual_size = os.path.getsize(filepath)
@@ -746,16 +2349,65 @@ class RobustDownloader:
         elif file_size == -1:
             # Handle compressed/chunked files - download without size info
             self.log(f"[INFO] {filename} is compressed, downloading without size info")
-            return self.download_unknown_size(url, filepath, filename, expected_sha, repo_id)
+            return self.download_unknown_size(download_url, filepath, filename, expected_sha, repo_id)
+
+        success = self.download_from_sources(download_url, filepath, filename, file_size, expected_sha)
+
+        # Mark file as verified after successful verification
+        if success and expected_sha:
+            self.mark_file_verified(repo_id, filename, filepath, expected_sha)
+
+        return success
+
+    def resume_from_journal(self, url: str, filepath: str, filename: str,
+                            repo_id: str, remote_filename: str) -> Optional[bool]:
+        """Finish an interrupted download using only what its journal recorded.
+
+        Size, SHA256 and the pinned revision come from the journal, so no
+        HEAD or metadata request is made. Returns None when there is nothing
+        to resume.
+        """
+        journal = self.load_resume_journal(url, filepath)
+        if journal is None:
+            return None
+        done = sum(done for _, _, done in journal['ranges'])
+        pinned = f", revision {journal['revision'][:12]}" if journal.get('revision') else ""
+        self.log(f"[RESUMING] {filename} from its journal "
+                 f"({self.format_bytes(done)}/{self.format_bytes(journal['size'])}{pinned})")
+        success = self.download_verified(journal['url'], filepath, filename, journal['size'], journal['sha256'])
+        if success:
+            self.mark_file_verified(repo_id, remote_filename, filepath, journal['sha256'])
+        return success
 
+    def download_verified(self, url: str, filepath: str, filename: str,
+                          file_size: int, expected_sha: Optional[str] = None) -> bool:
+        """Download a file of known size and check its SHA256 when one is available.
+
+        Large files in in-place mode are hashed while they download; everything
+        else gets a verify pass afterwards. A failed check removes the file.
+        With ``scratch_dir`` configured the work happens on scratch and the
+        file reaches filepath in the background (see download_staged).
+        """
+        if self.config.get("scratch_dir"):
+            return self.download_staged(url, filepath, filename, file_size, expected_sha)
+        return self._download_verified(url, filepath, filename, file_size, expected_sha)
+
+    def _download_verified(self, url: str, filepath: str, filename: str,
+                           file_size: int, expected_sha: Optional[str] = None) -> bool:
+        streamed = False
+        self.report_status("downloading")
         # Use parallel download for files > 10MB
         if file_size > 10 * 1024 * 1024:
-            success = self.download_parallel(url, filepath, filename, file_size)
+            streamed = bool(expected_sha) and self.config.get("preallocate", True) and self.config.get("stream_hash", True)
+            success = self.download_parallel(url, filepath, filename, file_size, expected_sha)
+            requests_saved, seconds_saved = REDIRECT_CACHE.take_savings(url)
+            if requests_saved:
+                self.log(f"[INFO] {filename}: {requests_saved} range requests went straight to the CDN "
+                         f"(~{seconds_saved:.1f}s of redirects saved)")
         else:
             success = self.download_single(url, filepath, filename, file_size)
 
-        # Verify SHA256 after successful download
-        if success and expected_sha:
+        if success and expected_sha and not streamed:
             if not self.verify_file_sha256(filepath, expected_sha, filename):
                 self.log(f"[ERROR] {filename} downloaded but failed SHA256 verification")
                 try:
@@ -763,14 +2415,81 @@ class RobustDownloader:
                 except:
                     pass
                 return False
-            else:
-                # Mark file as verified after successful verification
-                self.mark_file_verified(repo_id, filename, filepath, expected_sha)
 
         return success
 
+    # ----------------------------- Scratch staging ----------------------------
+
+    def get_staging_path(self, filepath: str) -> str:
+        """Where filepath is downloaded on scratch; stable, so a staged download resumes"""
+        target = os.path.abspath(filepath)
+        key = hashlib.sha1(target.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(os.path.abspath(self.config["scratch_dir"]), key, os.path.basename(target))
+
+    def download_staged(self, url: str, filepath: str, filename: str,
+                        file_size: int, expected_sha: Optional[str] = None) -> bool:
+        """download_verified into scratch, then hand the file to FILE_MOVER.
+
+        Returns as soon as the file is verified on scratch, so the next
+        download starts while this one is still being copied to filepath;
+        callers that report the file as in place wait for the move with
+        FILE_MOVER.after() or wait(). Falls back to downloading straight into filepath when scratch lacks
+        the room.
+        """
+        # A move of the same file still running has to land first
+        if FILE_MOVER.wait(filepath) and os.path.exists(filepath) and os.path.getsize(filepath) == file_size:
+            self.log(f"[SKIP] {filename} just moved into place")
+            return True
+
+        staged = self.get_staging_path(filepath)
+        try:
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            partial = f"{staged}.partial"
+            already = max((os.path.getsize(path) for path in (staged, partial) if os.path.exists(path)), default=0)
+            free = shutil.disk_usage(os.path.dirname(staged)).free
+        except OSError as e:
+            self.log(f"[WARNING] Scratch directory unusable ({e}), downloading {filename} straight to its target")
+            return self._download_verified(url, filepath, filename, file_size, expected_sha)
+        if free - max(0, file_size - already) < self.config.get("scratch_min_free", 0):
+            self.log(f"[WARNING] Not enough room on scratch for {filename}, downloading straight to its target")
+            return self._download_verified(url, filepath, filename, file_size, expected_sha)
+
+        # Verified on scratch by an earlier run that died before the move
+        if os.path.exists(staged) and os.path.getsize(staged) == file_size and \
+                (not expected_sha or self.verify_file_sha256(staged, expected_sha, filename)):
+            self.log(f"[INFO] {filename} is already complete on scratch")
+        elif not self._download_verified(url, staged, filename, file_size, expected_sha):
+            return False
+
+        self.log(f"[INFO] Moving {filename} to {os.path.dirname(os.path.abspath(filepath))} in the background")
+        FILE_MOVER.set_backlog(self.config.get("scratch_backlog", 2))
+        FILE_MOVER.submit(staged, filepath, self.log, self.config.get("write_behind", 0))
+        return True
+
+    def download_from_sources(self, url: str, filepath: str, filename: str,
+                              file_size: int, expected_sha: Optional[str] = None) -> bool:
+        """download_verified from a LAN peer that has the file, falling back to url.
+
+        Peers are looked up by SHA256, so files without one always come from url.
+        """
+        peers = self.config.get("peers") or []
+        if peers and expected_sha and file_size > 0:
+            peer_url = PEER_RESOLVER.find(peers, expected_sha, file_size)
+            if peer_url:
+                self.log(f"[INFO] {filename} found on peer {urllib.parse.urlsplit(peer_url).netloc}")
+                if self.download_verified(peer_url, filepath, filename, file_size, expected_sha):
+                    return True
+                if self.cancel_event and self.cancel_event.is_set():
+                    return False
+                self.log(f"[WARNING] Peer download of {filename} failed, falling back to HuggingFace")
+        return self.download_verified(url, filepath, filename, file_size, expected_sha)
+
     def download_unknown_size(self, url: str, filepath: str, filename: str, expected_sha: str, repo_id: str = "") -> bool:
         """Download file when size cannot be determined (compressed/chunked files)"""
+        with CONNECTION_BUDGET.connection(filepath), BANDWIDTH_LIMITER.transfer(filepath):
+            return self._download_unknown_size(url, filepath, filename, expected_sha, repo_id)
+
+    def _download_unknown_size(self, url: str, filepath: str, filename: str, expected_sha: str, repo_id: str = "") -> bool:
         max_retries = self.config["max_retries"]
 
         for attempt in range(max_retries):
@@ -778,6 +2497,7 @@ class RobustDownloader:
                 self.log(f"[DOWNLOADING] {filename} (unknown size)")
                 
                 response = self.session.get(url, timeout=self.config["timeout"], stream=True)
+                self.note_response(url, response.status_code, response.headers)
                 response.raise_for_status()
 
                 # Download the file
@@ -785,11 +2505,14 @@ class RobustDownloader:
                 start_time = time.time()
                 last_update = 0.0
 
+                meter = TransferMeter(url)
                 with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=self.config["chunk_size"]):
+                    for chunk in response.iter_content(chunk_size=BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
                         if chunk:
                             f.write(chunk)
                             downloaded += len(chunk)
+                            meter.add(len(chunk))
+                            self.throttle(filepath, len(chunk))
 
                             # Show progress without total size
                             now = time.time()
@@ -802,6 +2525,7 @@ class RobustDownloader:
                                 last_update = now
 
                 # Finalize download
+                meter.finish()
                 final_size = os.path.getsize(filepath)
                 elapsed = max(0.001, time.time() - start_time)
                 avg_speed = final_size / elapsed
@@ -831,17 +2555,24 @@ class RobustDownloader:
                 self.finalize_progress_line()
                 self.log(f"[ERROR] Attempt {attempt + 1}: {e}")
                 if attempt < max_retries - 1:
-                    delay = min(self.config["retry_delay"] * (2 ** attempt),
-                              self.config["max_retry_delay"])
-                    time.sleep(delay)
+                    record_retry(url)
+                    self.pause(self.retry_delay(url, attempt))
                 else:
+                    record_failure(url)
                     return False
 
         return False
 
     def download_parallel(self, url: str, filepath: str, filename: str,
-                         file_size: int) -> bool:
-        """Download using 16 parallel connections"""
+                         file_size: int, expected_sha: Optional[str] = None) -> bool:
+        """Download using 16 parallel connections.
+
+        ``expected_sha`` is only used by the in-place mode, which hashes while
+        downloading and returns False on a mismatch.
+        """
+        if self.config.get("preallocate", True):
+            return self.download_parallel_in_place(url, filepath, filename, file_size, expected_sha)
+
         num_chunks = self.config["num_connections"]
 
         # Calculate chunk boundaries
@@ -980,7 +2711,10 @@ class RobustDownloader:
 
         # Merge chunks
         self.log(f"[MERGING] Merging {num_chunks} chunks...")
-        if self.merge_chunks(filepath, num_chunks):
+        merge_start = time.time()
+        merged = self.merge_chunks(filepath, num_chunks)
+        MERGE_SECONDS.observe(time.time() - merge_start)
+        if merged:
             # Verify final file size
             final_size = os.path.getsize(filepath)
             if final_size == file_size:
@@ -1000,9 +2734,320 @@ class RobustDownloader:
             self.log(f"[ERROR] Merge failed")
             return False
 
+    def download_parallel_in_place(self, url: str, filepath: str, filename: str,
+                                   file_size: int, expected_sha: Optional[str] = None) -> bool:
+        """Parallel download where every connection writes its range in place.
+
+        Bytes go into a preallocated ``{filepath}.partial`` at their final
+        offsets, and per-range progress is checkpointed to a small sidecar
+        journal. When all ranges are done the file is renamed into place, so
+        there is no merge pass. Ranges are handed out by a RangeScheduler, so a
+        connection that runs out of work takes over the tail of the slowest one.
+
+        With ``expected_sha`` the file is split into ``segment_size`` ranges
+        that are fetched roughly in file order and hashed as they land, so the
+        SHA256 is known as soon as the last byte is written.
+
+        The journal also records the expected SHA256 and the revision/validator
+        of the bytes; if the server starts returning a different file the
+        partial download is thrown away instead of mixing old and new bytes.
+        """
+        num_chunks = self.config["num_connections"]
+        partial_path = os.path.normpath(f"{filepath}.partial")
+        stream_hash = bool(expected_sha) and self.config.get("stream_hash", True)
+        self.upstream_changed = False
+
+        # Resume from the journal if it matches this download, otherwise start fresh
+        journal = self.read_journal(partial_path)
+        ranges = self.load_journal(partial_path, url, file_size, expected_sha)
+        if ranges is not None and url not in self.remote_info and journal.get('url') == url:
+            # Resumed without probing: trust what the journal recorded about the bytes
+            self.remote_info[url] = {key: journal.get(key) for key in ('source_url', 'revision', 'validator')}
+        remote = self.remote_info.get(url) or {}
+        journal_info = {
+            'url': url,
+            'source_url': remote.get('source_url') or url,
+            'size': file_size,
+            'sha256': expected_sha or (journal.get('sha256') if ranges is not None else None),
+            'revision': remote.get('revision'),
+            'validator': remote.get('validator'),
+        }
+        legacy_parts = []
+        if ranges is None:
+            self.remove_journal(partial_path)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+            num_ranges = num_chunks
+            if stream_hash:
+                segment_size = max(1, self.config.get("segment_size", 32 * 1024 * 1024))
+                num_ranges = max(num_chunks, -(-file_size // segment_size))
+
+            base_chunk_size = file_size // num_ranges
+            ranges = []
+            for i in range(num_ranges):
+                start = i * base_chunk_size
+                end = file_size - 1 if i == num_ranges - 1 else (i + 1) * base_chunk_size - 1
+                ranges.append([start, end, 0])
+
+            # Bytes left by the legacy chunked mode are copied in below instead of refetched
+            legacy_parts = self.find_legacy_parts(filepath, file_size, num_chunks)
+            if legacy_parts:
+                ranges = mark_done_spans(ranges, [(start, length) for _, start, length in legacy_parts])
+        else:
+            self.remove_legacy_parts(filepath, num_chunks, "the in-place journal already covers this download")
+
+        scheduler = RangeScheduler(ranges, self.config.get("min_split_size", 4 * 1024 * 1024),
+                                   hedge=self.config.get("hedge_tail", True))
+        watchdog = StallWatchdog(self.config.get("stall_ratio", 0.1), self.config.get("stall_timeout", 30))
+        initial_bytes = scheduler.total_done()
+
+        # Small files don't benefit from many connections: give each at least
+        # two split sizes of work. Start from what was learned for this host.
+        host = urllib.parse.urlparse(url).hostname or ""
+        adaptive = self.config.get("adaptive_connections", True)
+        max_connections = self.config.get("max_connections", 32) if adaptive else num_chunks
+        useful_connections = -(-(file_size - initial_bytes) // (2 * scheduler.min_split_size))
+        num_workers = max(1, min(max_connections, useful_connections))
+        initial_connections = (self.get_learned_connections(host) if adaptive else None) or num_chunks
+        controller = ConnectionController(
+            host, min(initial_connections, num_workers), num_workers,
+            interval=self.config.get("tuning_interval", 2.0),
+            budget=CONNECTION_BUDGET, owner=partial_path, adaptive=adaptive,
+        )
+        if adaptive:
+            self.log(f"[DOWNLOADING] {filename} ({self.format_bytes(file_size)}) starting with "
+                     f"{controller.limit} connections (adaptive, up to {num_workers})")
+        else:
+            self.log(f"[DOWNLOADING] {filename} ({self.format_bytes(file_size)}) using {controller.limit} connections")
+        if initial_bytes > 0:
+            self.log(f"[RESUMING] Already downloaded: {self.format_bytes(initial_bytes)}")
+
+        output = None
+
+        def checkpoint():
+            self.save_journal(partial_path, journal_info, scheduler.snapshot(), output)
+
+        try:
+            output = PreallocatedFile(partial_path, file_size, self.config.get("write_behind", 0))
+        except OSError as e:
+            self.log(f"[ERROR] Could not allocate {partial_path}: {e}")
+            return False
+
+        if legacy_parts:
+            # Copied before the hasher exists; it reads the done spans back from disk.
+            # Without a journal a failed copy is simply redone on the next attempt.
+            try:
+                for path, start, length in legacy_parts:
+                    with open(path, 'rb') as part:
+                        offset = start
+                        while offset < start + length:
+                            block = part.read(min(self.config["chunk_size"], start + length - offset))
+                            if not block:
+                                raise OSError(f"{path} is shorter than {length} bytes")
+                            output.write_at(offset, block)
+                            offset += len(block)
+                checkpoint()
+            except OSError as e:
+                self.log(f"[ERROR] Could not import legacy part files into {partial_path}: {e}")
+                output.close()
+                return False
+            imported = sum(length for _, _, length in legacy_parts)
+            self.log(f"[RESUMING] Imported {self.format_bytes(imported)} from {len(legacy_parts)} "
+                     f"legacy .partN files into {os.path.basename(partial_path)}")
+            if os.path.exists(self.get_journal_path(partial_path)):
+                self.remove_legacy_parts(filepath, num_chunks, "their bytes are now in the partial file")
+            else:
+                self.log("[WARNING] Keeping the legacy .partN files until the resume journal can be written")
+
+        hasher = None
+        if stream_hash:
+            hasher = StreamingHasher(
+                output,
+                self.config.get("hash_buffer_size", 256 * 1024 * 1024),
+                [(start, start + done) for start, _, done in scheduler.snapshot()],
+            )
+            output.write_listener = hasher.feed
+
+        start_time = time.time()
+        journal_interval = self.config.get("journal_interval", 2.0)
+        computed_sha = None
+
+        # Monitor progress
+        last_update = 0.0
+        last_checkpoint = time.time()
+        last_bytes = initial_bytes
+
+        def monitor(finished: bool):
+            nonlocal last_update, last_checkpoint, last_bytes
+            current_time = time.time()
+            if current_time - last_checkpoint >= journal_interval:
+                checkpoint()
+                last_checkpoint = current_time
+
+            controller.update(scheduler.total_done(), current_time)
+            watchdog.check(current_time)
+
+            # Update progress (once per ~1s)
+            if current_time - last_update >= 1.0 or finished:
+                current_bytes = scheduler.total_done()
+
+                time_delta = current_time - last_update if last_update > 0 else (current_time - start_time)
+                bytes_delta = current_bytes - last_bytes if last_update > 0 else (current_bytes - initial_bytes)
+                speed = bytes_delta / max(0.001, time_delta)
+
+                self.print_progress(current_bytes, file_size, start_time, filename, speed)
+
+                last_update = current_time
+                last_bytes = current_bytes
+
+        try:
+            CONNECTION_BUDGET.register(partial_path)
+            BANDWIDTH_LIMITER.register(partial_path)
+            RETRY_CONTROLLER.register(controller)
+            checkpoint()
+            self.run_range_workers(url, output, scheduler, controller, num_workers, monitor, watchdog)
+
+            incomplete = scheduler.incomplete()
+            if hasher is not None and not incomplete:
+                computed_sha = hasher.finish()
+        finally:
+            CONNECTION_BUDGET.unregister(partial_path)
+            BANDWIDTH_LIMITER.unregister(partial_path)
+            RETRY_CONTROLLER.unregister(controller)
+            if hasher is not None:
+                hasher.abort()
+            checkpoint()
+            output.close()
+
+        self.clear_progress_line()
+
+        if self.upstream_changed:
+            self.log(f"[ERROR] {filename} changed on the server during the download; "
+                     f"discarding the partial file so old and new bytes don't mix")
+            self.remove_journal(partial_path)
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            return False
+        if watchdog.aborted:
+            STALLED_CONNECTIONS.labels(host).inc(watchdog.aborted)
+        if scheduler.hedges:
+            HEDGED_REQUESTS.labels(host, "won").inc(scheduler.hedges_won)
+            HEDGED_REQUESTS.labels(host, "lost").inc(scheduler.hedges - scheduler.hedges_won)
+        if incomplete:
+            described = ", ".join(f"{r.start}-{r.end} ({r.done}/{r.length})" for r in incomplete[:5])
+            more = f" and {len(incomplete) - 5} more" if len(incomplete) > 5 else ""
+            self.log(f"[ERROR] Incomplete ranges: {described}{more} (progress kept for resume)")
+            return False
+        if scheduler.steals:
+            self.log(f"[INFO] Idle connections took over {scheduler.steals} range tails")
+        if watchdog.aborted:
+            self.log(f"[INFO] Restarted {watchdog.aborted} stalled connections")
+        if scheduler.hedges:
+            self.log(f"[INFO] Hedged the last ranges with {scheduler.hedges} duplicate requests "
+                     f"({scheduler.hedges_won} finished first)")
+        if adaptive and controller.best_rate > 0:
+            self.log(f"[INFO] Best throughput for {host}: {self.format_bytes(controller.best_rate)}/s "
+                     f"with {controller.best_limit} connections")
+            self.save_connection_tuning(controller)
+
+        if hasher is not None:
+            if computed_sha is None:
+                # Hasher failed (e.g. read error); fall back to a full verify pass
+                self.log(f"[WARNING] Streaming hash unavailable ({hasher.error}), verifying from disk")
+                computed_sha = expected_sha if self.verify_file_sha256(partial_path, expected_sha, filename) else ""
+            if computed_sha != expected_sha:
+                self.log(f"[ERROR] SHA256 mismatch for {filename}!")
+                self.log(f"  Expected: {expected_sha}")
+                self.log(f"  Got:      {computed_sha}")
+                self.remove_journal(partial_path)
+                try:
+                    os.remove(partial_path)
+                except OSError:
+                    pass
+                return False
+            self.log(f"[VERIFIED] SHA256 match: {computed_sha[:16]}... (hashed during download"
+                     + (f", {self.format_bytes(hasher.read_back_bytes)} read back)" if hasher.read_back_bytes else ")"))
+
+        try:
+            os.replace(partial_path, filepath)
+        except OSError as e:
+            self.log(f"[ERROR] Could not move {partial_path} into place: {e}")
+            return False
+        self.remove_journal(partial_path)
+
+        elapsed = max(0.001, time.time() - start_time)
+        avg_speed = (file_size - initial_bytes) / elapsed
+        self.log(f"[OK] {filename} completed in {self.format_time(elapsed)} "
+                 f"- Average: {self.format_bytes(avg_speed)}/s")
+        return True
+
+    def run_range_workers(self, url: str, output: PreallocatedFile, scheduler: RangeScheduler,
+                          controller: ConnectionController, num_workers: int, monitor,
+                          watchdog: Optional[StallWatchdog] = None) -> None:
+        """Run num_workers range workers until the scheduler runs dry.
+
+        ``monitor(finished)`` is called about twice a second from the calling
+        thread and once more when every worker has stopped. This engine uses
+        one thread per worker; AsyncDownloader overrides it.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(self._range_worker, url, output, scheduler, controller, slot, watchdog)
+                       for slot in range(num_workers)]
+
+            while futures:
+                done_futures, _ = concurrent.futures.wait(
+                    futures,
+                    timeout=0.5,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done_futures:
+                    futures.remove(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        self.log(f"Download worker exception: {e}")
+
+                monitor(not futures)
+
+    def _range_worker(self, url: str, output: PreallocatedFile, scheduler: RangeScheduler,
+                      controller: ConnectionController, slot: int,
+                      watchdog: Optional[StallWatchdog] = None) -> bool:
+        """Keep taking ranges from the scheduler until there is nothing left to do"""
+        while True:
+            if self.cancel_event and self.cancel_event.is_set():
+                return False
+            # Park while our slot is disabled or the global connection budget is used up
+            if not controller.acquire(slot):
+                if not scheduler.has_work():
+                    return True
+                continue
+            try:
+                byte_range = scheduler.next_range()
+                if byte_range is None:
+                    return True
+                success = False
+                try:
+                    success = self.download_range(url, byte_range, output, scheduler, controller, slot, watchdog)
+                finally:
+                    scheduler.release(byte_range, failed=not success)
+            finally:
+                controller.release()
+            if not success:
+                controller.wake()
+                return False
+
     def download_single(self, url: str, filepath: str, filename: str,
                        file_size: int) -> bool:
         """Single connection download for small files"""
+        with CONNECTION_BUDGET.connection(filepath), BANDWIDTH_LIMITER.transfer(filepath):
+            return self._download_single(url, filepath, filename, file_size)
+
+    def _download_single(self, url: str, filepath: str, filename: str,
+                         file_size: int) -> bool:
         max_retries = self.config["max_retries"]
 
         for attempt in range(max_retries):
@@ -1020,6 +3065,9 @@ class RobustDownloader:
                 response = self.session.get(url, headers=headers,
                                           timeout=self.config["timeout"],
                                           stream=True)
+                self.note_response(url, response.status_code, response.headers)
+                if response.status_code in (429, 503):
+                    response.raise_for_status()  # Rate limited, not a server that can't resume
 
                 if resume_pos > 0 and response.status_code != 206:
                     self.log(f"[WARNING] Resume not supported, restarting")
@@ -1040,11 +3088,14 @@ class RobustDownloader:
                 else:
                     self.log(f"[DOWNLOADING] {filename} ({self.format_bytes(file_size)})")
 
+                meter = TransferMeter(url)
                 with open(filepath, mode) as f:
-                    for chunk in response.iter_content(chunk_size=self.config["chunk_size"]):
+                    for chunk in response.iter_content(chunk_size=BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
                         if chunk:
                             f.write(chunk)
                             downloaded += len(chunk)
+                            meter.add(len(chunk))
+                            self.throttle(filepath, len(chunk))
 
                             # Progress update once per ~0.5s
                             now = time.time()
@@ -1054,6 +3105,7 @@ class RobustDownloader:
                                 last_update = now
 
                 # Final progress update
+                meter.finish()
                 total = resume_pos + downloaded
                 self.print_progress(total, file_size, start_time, filename)
                 # Move to next line cleanly
@@ -1071,14 +3123,34 @@ class RobustDownloader:
                 self.finalize_progress_line()
                 self.log(f"[ERROR] Attempt {attempt + 1}: {e}")
                 if attempt < max_retries - 1:
-                    delay = min(self.config["retry_delay"] * (2 ** attempt),
-                              self.config["max_retry_delay"])
-                    time.sleep(delay)
+                    record_retry(url)
+                    self.pause(self.retry_delay(url, attempt))
                 else:
+                    record_failure(url)
                     return False
 
         return False
 
+def create_downloader(config: Dict, engine: Optional[str] = None) -> RobustDownloader:
+    """Create a downloader for the configured engine.
+
+    ``engine`` overrides ``config["engine"]``. "async" runs every range stream
+    of every file on one shared event loop and needs aiohttp; without it the
+    thread engine is used.
+    """
+    engine = engine or config.get("engine", "thread")
+    if engine == "async":
+        try:
+            from .async_downloader import AsyncDownloader, AIOHTTP_AVAILABLE
+        except ImportError:
+            from async_downloader import AsyncDownloader, AIOHTTP_AVAILABLE
+        if AIOHTTP_AVAILABLE:
+            return AsyncDownloader(config)
+        print("[WARNING] aiohttp is not installed, using the thread download engine")
+    elif engine != "thread":
+        print(f"[WARNING] Unknown download engine '{engine}', using the thread download engine")
+    return RobustDownloader(config)
+
 # ------------------------------- Repo scanning -------------------------------
 
 def scan_repo_files(repo_id: str, specific_files: List[str] = None) -> List[str]:
@@ -1106,14 +3178,16 @@ def download_file_with_rename(downloader: RobustDownloader, repo_id: str, remote
     file_dir = os.path.dirname(filepath)
     os.makedirs(file_dir, exist_ok=True)
 
-    # Get expected SHA256 - using the original remote filename
-    expected_sha = downloader.get_file_sha256(repo_id, remote_filename)
+    # An interrupted download resumes from its journal without asking the server again
+    resumed = downloader.resume_from_journal(url, filepath, local_filename, repo_id, remote_filename)
+    if resumed is not None:
+        return resumed
+
+    # Get expected SHA256 and file size - using the original remote filename
+    download_url, expected_sha, file_size = downloader.resolve_file(repo_id, remote_filename)
     if expected_sha:
         downloader.log(f"[INFO] Expected SHA256: {expected_sha[:16]}...")
 
-    # Get file size
-    file_size = downloader.get_file_size(url)
-
     # Check if already complete
     if os.path.exists(filepath):
         actual_size = os.path.getsize(filepath)
@@ -1162,26 +3236,13 @@ def download_file_with_rename(downloader: RobustDownloader, repo_id: str, remote
     elif file_size == -1:
         # Handle compressed/chunked files - download without size info
         downloader.log(f"[INFO] {local_filename} is compressed, downloading without size info")
-        return downloader.download_unknown_size(url, filepath, local_filename, expected_sha, repo_id)
+        return downloader.download_unknown_size(download_url, filepath, local_filename, expected_sha, repo_id)
 
-    # Use parallel download for files > 10MB
-    if file_size > 10 * 1024 * 1024:
-        success = downloader.download_parallel(url, filepath, local_filename, file_size)
-    else:
-        success = downloader.download_single(url, filepath, local_filename, file_size)
+    success = downloader.download_from_sources(download_url, filepath, local_filename, file_size, expected_sha)
 
-    # Verify SHA256 after successful download
+    # Mark file as verified after successful verification
     if success and expected_sha:
-        if not downloader.verify_file_sha256(filepath, expected_sha, local_filename):
-            downloader.log(f"[ERROR] {local_filename} downloaded but failed SHA256 verification")
-            try:
-                os.remove(filepath)
-            except:
-                pass
-            return False
-        else:
-            # Mark file as verified after successful verification
-            downloader.mark_file_verified(repo_id, remote_filename, filepath, expected_sha)
+        downloader.mark_file_verified(repo_id, remote_filename, filepath, expected_sha)
 
     return success
 
@@ -1215,7 +3276,7 @@ def download_models(
     print(f"\nDownloading {model_config['name']}...")
     print(f"Description: {model_config['description']}")
 
-    downloader = RobustDownloader(config)
+    downloader = create_downloader(config)
 
     os.makedirs(target_dir, exist_ok=True)
 
@@ -1247,10 +3308,8 @@ def download_models(
     # Don't create subfolder-specific target directory - download directly to target_dir
     # All files from Index_TTS2 will be downloaded directly into index-tts/checkpoints
 
-    # Check existing files with SHA256 verification
-    to_download = []
-    skipped = []
-
+    # Check existing files with SHA256 verification, all of them at once
+    entries = []
     for filename in files:
         # When downloading to subfolder, remove the subfolder prefix from filename
         if subfolder and filename.startswith(subfolder + "/"):
@@ -1258,26 +3317,22 @@ def download_models(
         else:
             local_filename = filename
         filepath = os.path.normpath(os.path.join(target_dir, local_filename))
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 1024:
-            # Try to verify with SHA256
+        expected_sha = None
+        expected_size = None
+        if os.path.exists(filepath):
             expected_sha = downloader.get_file_sha256(repo_id, filename)
-            if expected_sha:
-                # Check if already verified to skip SHA256 computation
-                if downloader.is_file_verified(repo_id, filename, filepath, expected_sha):
-                    print(f"[SKIP] {filename} already verified (cached)")
-                    skipped.append(filename)
-                elif downloader.verify_file_sha256(filepath, expected_sha, filename):
-                    # Mark as verified after successful verification
-                    downloader.mark_file_verified(repo_id, filename, filepath, expected_sha)
-                    skipped.append(filename)
-                else:
-                    print(f"[RE-DOWNLOAD] {filename} failed verification")
-                    to_download.append(filename)
-            else:
-                # No SHA available, skip if file exists
-                skipped.append(filename)
-        else:
-            to_download.append(filename)
+            info = REPO_METADATA.get_file(repo_id, filename)
+            expected_size = info["size"] if info else None
+        entries.append({"repo_id": repo_id, "filename": filename, "path": filepath,
+                        "sha256": expected_sha, "size": expected_size})
+
+    report = audit_files(downloader, entries)
+    for entry in report["corrupt"]:
+        print(f"[RE-DOWNLOAD] {entry['filename']} failed verification")
+    # No SHA available: keep files that exist, like before
+    skipped = [entry["filename"] for entry in report["verified"] + report["unverified"]]
+    skipped_set = set(skipped)
+    to_download = [filename for filename in files if filename not in skipped_set]
 
     print(f"\nTotal files: {len(files)}")
     if skipped:
@@ -1329,7 +3384,10 @@ def download_models(
 def download_hf_file(repo_id: str, filename: str, target_dir: str, 
                      save_filename: Optional[str] = None,
                      config: Optional[Dict] = None,
-                     cancel_event=None) -> bool:
+                     cancel_event=None,
+                     engine: Optional[str] = None,
+                     status_callback=None,
+                     progress_callback=None) -> bool:
     """
     Clean API for downloading a single file from HuggingFace Hub.
     
@@ -1340,6 +3398,9 @@ def download_hf_file(repo_id: str, filename: str, target_dir: str,
         save_filename: Optional different filename to save as (default: use original filename)
         config: Optional download configuration (uses defaults if None)
         cancel_event: Optional threading.Event to signal cancellation
+        engine: Optional download engine, "thread" or "async" (default: config["engine"])
+        status_callback: Optional callable told "downloading" / "verifying" as the work moves on
+        progress_callback: Optional callable receiving each progress line (also printed to the console)
     
     Returns:
         bool: True if successful, False if failed
@@ -1347,11 +3408,13 @@ def download_hf_file(repo_id: str, filename: str, target_dir: str,
     if config is None:
         config = DEFAULT_DOWNLOAD_CONFIG
     
-    downloader = RobustDownloader(config)
+    downloader = create_downloader(config, engine)
     
     # Pass cancel event to downloader
     if cancel_event:
         downloader.cancel_event = cancel_event
+    downloader.status_callback = status_callback
+    downloader.progress_callback = progress_callback
     
     if save_filename is None:
         save_filename = os.path.basename(filename)
@@ -1378,7 +3441,10 @@ def download_hf_file(repo_id: str, filename: str, target_dir: str,
 def download_hf_snapshot(repo_id: str, target_dir: str, 
                         allow_patterns: Optional[List[str]] = None,
                         config: Optional[Dict] = None,
-                        cancel_event=None) -> bool:
+                        cancel_event=None,
+                        engine: Optional[str] = None,
+                        status_callback=None,
+                        progress_callback=None) -> bool:
     """
     Clean API for downloading a complete repository snapshot from HuggingFace Hub.
     
@@ -1388,6 +3454,9 @@ def download_hf_snapshot(repo_id: str, target_dir: str,
         allow_patterns: Optional list of patterns to filter files
         config: Optional download configuration (uses defaults if None)
 o        cancel_event: Optional threading.Event to signal cancellation
+        engine: Optional download engine, "thread" or "async" (default: config["engine"])
+        status_callback: Optional callable told "downloading" / "verifying" as the work moves on
+        progress_callback: Optional callable receiving each progress line (also printed to the console)
     
     Returns:
         bool: True if successful, False if failed
@@ -1395,11 +3464,13 @@ o        cancel_event: Optional threading.Event to signal cancellation
     if config is None:
         config = DEFAULT_DOWNLOAD_CONFIG
     
-    downloader = RobustDownloader(config)
+    downloader = create_downloader(config, engine)
     
     # Pass cancel event to downloader
     if cancel_event:
         downloader.cancel_event = cancel_event
+    downloader.status_callback = status_callback
+    downloader.progress_callback = progress_callback
     
     # Check for cancellation before starting
     if cancel_event and cancel_event.is_set():
@@ -1407,9 +3478,11 @@ o        cancel_event: Optional threading.Event to signal cancellation
         return False
     
     try:
-        # For snapshot downloads, we'll download all files in the repo
-        # This is a simplified implementation - you may want to add more sophisticated snapshot logic
-        files = downloader.list_files(repo_id)
+        # For snapshot downloads, we'll download all files in the repo. The repo
+        # listing also carries every file's size and SHA256, so the per-file
+        # downloads below don't need to ask the server again.
+        listing = REPO_METADATA.get_repo(repo_id)
+        files = list(listing["files"]) if listing else downloader.list_files(repo_id)
         
         if allow_patterns:
             import fnmatch
@@ -0,0 +1,383 @@
+"""
+Asyncio download engine for the HuggingFace downloader.
+
+AsyncDownloader is a drop-in RobustDownloader: metadata lookups, caches,
+resume journals and SHA verification are shared, but every HTTP stream runs
+on one event loop owned by this module instead of one OS thread per range.
+Several files downloading at once (e.g. the Gradio worker pool) share that
+loop and a single aiohttp session. Disk writes go through a small fixed
+thread pool so a slow disk never stalls the loop.
+
+aiohttp is optional; check AIOHTTP_AVAILABLE or use create_downloader(),
+which falls back to the thread engine without it.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import threading
+import time
+import urllib.parse
+from typing import Optional
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+try:
+    from .HF_model_downloader import (
+        RobustDownloader, PreallocatedFile, RangeScheduler, ByteRange, ConnectionController,
+        RangeConnection, StallWatchdog, BANDWIDTH_LIMITER, REDIRECT_CACHE, RETRY_CONTROLLER,
+    )
+    from .download_metrics import TransferMeter, record_retry, record_failure
+except ImportError:
+    from HF_model_downloader import (
+        RobustDownloader, PreallocatedFile, RangeScheduler, ByteRange, ConnectionController,
+        RangeConnection, StallWatchdog, BANDWIDTH_LIMITER, REDIRECT_CACHE, RETRY_CONTROLLER,
+    )
+    from download_metrics import TransferMeter, record_retry, record_failure
+
+WRITE_THREADS = 4       # Threads doing pwrite() for all async downloads
+PARK_INTERVAL = 0.05    # Seconds a parked range worker waits before asking for a connection again
+
+_loop = None
+_loop_lock = threading.Lock()
+_write_executor = None
+_session = None         # Only touched from the loop thread
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) and return the event loop shared by every AsyncDownloader"""
+    global _loop, _write_executor
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-download-loop", daemon=True).start()
+            _write_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=WRITE_THREADS, thread_name_prefix="async-download-write")
+            _loop = loop
+        return _loop
+
+
+def run_on_loop(coro) -> concurrent.futures.Future:
+    """Schedule a coroutine on the shared loop from any thread"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+async def _get_session() -> "aiohttp.ClientSession":
+    global _session
+    if _session is None or _session.closed:
+        # Range bodies are written at byte offsets, so never let aiohttp decode them.
+        # Connection limits come from the ConnectionBudget, not the connector.
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            auto_decompress=False,
+        )
+    return _session
+
+
+async def _close_session():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+@atexit.register
+def _shutdown_loop():
+    """Close the shared session so aiohttp doesn't warn about open connections at exit"""
+    if _loop is None or not _loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_session(), _loop).result(timeout=5)
+    except Exception:
+        pass
+
+
+class AsyncDownloader(RobustDownloader):
+    """RobustDownloader whose transfers run on the shared asyncio loop.
+
+    The public methods stay synchronous and block the calling thread until
+    the file is done, so callers don't change. Range downloads (in-place
+    mode) and single-connection downloads use aiohttp; the legacy ``.partN``
+    mode and downloads of unknown size keep the thread implementation.
+    """
+
+    def __init__(self, config):
+        if not AIOHTTP_AVAILABLE:
+            raise ImportError("aiohttp is required for the async download engine (pip install aiohttp)")
+        super().__init__(config)
+
+    def _cancelled(self) -> bool:
+        return bool(self.cancel_event and self.cancel_event.is_set())
+
+    def _request_headers(self, extra: Optional[dict] = None) -> dict:
+        headers = {k: v for k, v in self.session.headers.items()
+                   if k.lower() in ("user-agent", "authorization")}
+        headers.update(extra or {})
+        return headers
+
+    def _timeout(self) -> "aiohttp.ClientTimeout":
+        timeout = self.config["timeout"]
+        return aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    async def _pause_async(self, seconds: float):
+        """Async twin of RobustDownloader.pause"""
+        deadline = time.monotonic() + seconds
+        while not self._cancelled() and time.monotonic() < deadline:
+            await asyncio.sleep(min(PARK_INTERVAL * 10, deadline - time.monotonic()))
+
+    async def _throttle_async(self, owner, nbytes: int):
+        """Async twin of RobustDownloader.throttle"""
+        delay = BANDWIDTH_LIMITER.reserve(owner, nbytes)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # ------------------------------ Range downloads ---------------------------
+
+    def run_range_workers(self, url: str, output: PreallocatedFile, scheduler: RangeScheduler,
+                          controller: ConnectionController, num_workers: int, monitor,
+                          watchdog: Optional[StallWatchdog] = None) -> None:
+        """Run the range workers as tasks on the shared loop; monitor from this thread"""
+        future = run_on_loop(self._run_range_workers_async(url, output, scheduler, controller, num_workers, watchdog))
+        while True:
+            try:
+                future.result(timeout=0.5)
+                break
+            except concurrent.futures.TimeoutError:
+                monitor(False)
+            except Exception as e:
+                self.log(f"Download worker exception: {e}")
+                break
+        monitor(True)
+
+    async def _run_range_workers_async(self, url, output, scheduler, controller, num_workers, watchdog=None):
+        session = await _get_session()
+        results = await asyncio.gather(
+            *(self._range_worker_async(session, url, output, scheduler, controller, slot, watchdog)
+              for slot in range(num_workers)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                self.log(f"Download worker exception: {result}")
+
+    async def _range_worker_async(self, session, url: str, output: PreallocatedFile,
+                                  scheduler: RangeScheduler, controller: ConnectionController,
+                                  slot: int, watchdog: Optional[StallWatchdog] = None) -> bool:
+        """Async twin of RobustDownloader._range_worker"""
+        budget = controller.budget
+        wanting = False  # Registered with the budget as a waiting worker
+        try:
+            while True:
+                if self._cancelled():
+                    return False
+                # Park while our slot is disabled or the global connection budget is used up.
+                # The budget is polled without blocking so the loop keeps running; while it
+                # is polled the worker counts as waiting, so other downloads give up their
+                # connections beyond the fair share as they would for a blocked thread.
+                enabled = slot < controller.limit
+                acquired = enabled and (budget is None or budget.acquire(controller.owner, timeout=0))
+                if budget is not None and wanting != (enabled and not acquired):
+                    wanting = not wanting
+                    (budget.want if wanting else budget.unwant)(controller.owner)
+                if not acquired:
+                    if not scheduler.has_work():
+                        return True
+                    await asyncio.sleep(PARK_INTERVAL)
+                    continue
+                try:
+                    byte_range = scheduler.next_range()
+                    if byte_range is None:
+                        return True
+                    success = False
+                    try:
+                        success = await self._download_range_async(
+                            session, url, byte_range, output, scheduler, controller, slot, watchdog)
+                    finally:
+                        scheduler.release(byte_range, failed=not success)
+                finally:
+                    controller.release()
+                if not success:
+                    return False
+        finally:
+            if wanting:
+                budget.unwant(controller.owner)
+
+    async def _download_range_async(self, session, url: str, byte_range: ByteRange,
+                                    output: PreallocatedFile, scheduler: RangeScheduler,
+                                    controller: ConnectionController, slot: int,
+                                    watchdog: Optional[StallWatchdog] = None) -> bool:
+        """Async twin of RobustDownloader.download_range (same return contract)"""
+        loop = asyncio.get_running_loop()
+        max_retries = self.config["max_retries"]
+
+        for attempt in range(max_retries):
+            if self._cancelled():
+                return False
+            actual_start, end = scheduler.position(byte_range)
+            if actual_start > end:
+                return True
+            try:
+                await self._pause_async(RETRY_CONTROLLER.open_for(url))
+                location = REDIRECT_CACHE.get(url) or await loop.run_in_executor(
+                    None, REDIRECT_CACHE.resolve, url, self.follow_redirects)
+                headers = self._request_headers(self.get_range_headers(url, actual_start, end))
+                if urllib.parse.urlsplit(location).netloc != urllib.parse.urlsplit(url).netloc:
+                    headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+                async with session.get(location, headers=headers, timeout=self._timeout()) as response:
+                    if response.status in (403, 410) and location != url:
+                        # Signed location expired: resolve it again and retry right away
+                        REDIRECT_CACHE.invalidate(url, location)
+                        continue
+                    self.note_response(url, response.status, response.headers)
+                    if self.is_upstream_change(url, response.status, response.headers):
+                        self.upstream_changed = True
+                        return False
+                    # A 200 means the server ignored our Range; see download_range
+                    if response.status != 206 and not (response.status == 200 and actual_start == 0):
+                        controller.record_error(throttled=response.status in (429, 503))
+                        raise Exception(f"Bad status code: {response.status}")
+                    if response.status == 206 and not self.range_start_matches(response.headers, actual_start):
+                        controller.record_error()
+                        raise Exception(f"Content-Range mismatch: {response.headers.get('Content-Range')}")
+
+                    meter = TransferMeter(url)
+                    # Aborts come from the monitor thread (or a hedge); close on the loop
+                    connection = RangeConnection(lambda: loop.call_soon_threadsafe(response.close))
+                    scheduler.attach(byte_range, connection)
+                    if watchdog:
+                        watchdog.watch(connection)
+                    try:
+                        async for data in response.content.iter_chunked(BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
+                            meter.add(len(data))
+                            connection.received(len(data))
+                            if self._cancelled():
+                                return False
+                            if controller.should_yield(slot):
+                                return True
+                            offset, allowed = scheduler.reserve(byte_range, len(data))
+                            if allowed < len(data):
+                                data = data[:allowed]
+                            if data:
+                                await loop.run_in_executor(_write_executor, output.write_at, offset, data)
+                                scheduler.commit(byte_range, offset, len(data))
+                                await self._throttle_async(output.path, len(data))
+                            if scheduler.is_complete(byte_range) or connection.aborted:
+                                break
+                    except Exception:
+                        if not connection.aborted:
+                            raise
+                    finally:
+                        connection.finish()
+                        scheduler.attach(byte_range, None)
+                        if watchdog:
+                            watchdog.unwatch(connection)
+                        meter.finish()
+
+                if scheduler.is_complete(byte_range) or connection.aborted:
+                    return True
+                controller.record_error()
+                raise Exception(f"Range incomplete: {byte_range.done}/{byte_range.length}")
+
+            except Exception as e:
+                if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    controller.record_error()
+                if attempt < max_retries - 1:
+                    record_retry(url)
+                    await self._pause_async(self.retry_delay(url, attempt))
+                else:
+                    record_failure(url)
+                    self.log(f"Range {byte_range.start}-{byte_range.end} failed after {max_retries} attempts: {e}")
+                    return False
+
+        return False
+
+    # ------------------------------ Single stream -----------------------------
+
+    def _download_single(self, url: str, filepath: str, filename: str,
+                         file_size: int) -> bool:
+        return run_on_loop(self._download_single_async(url, filepath, filename, file_size)).result()
+
+    async def _download_single_async(self, url: str, filepath: str, filename: str,
+                                     file_size: int) -> bool:
+        """Async twin of RobustDownloader._download_single"""
+        loop = asyncio.get_running_loop()
+        session = await _get_session()
+        max_retries = self.config["max_retries"]
+
+        for attempt in range(max_retries):
+            try:
+                # Check existing file
+                resume_pos = 0
+                if os.path.exists(filepath):
+                    resume_pos = os.path.getsize(filepath)
+                    if resume_pos >= file_size:
+                        self.log(f"[OK] {filename} already complete")
+                        return True
+
+                headers = {'Range': f'bytes={resume_pos}-'} if resume_pos > 0 else {}
+                response = await session.get(url, headers=self._request_headers(headers), timeout=self._timeout())
+                meter = None
+                try:
+                    self.note_response(url, response.status, response.headers)
+                    if response.status in (429, 503):
+                        response.raise_for_status()  # Rate limited, not a server that can't resume
+                    if resume_pos > 0 and response.status != 206:
+                        self.log(f"[WARNING] Resume not supported, restarting")
+                        resume_pos = 0
+                        response.release()
+                        response = await session.get(url, headers=self._request_headers(), timeout=self._timeout())
+                    response.raise_for_status()
+
+                    downloaded = 0
+                    start_time = time.time()
+                    last_update = 0.0
+
+                    if resume_pos > 0:
+                        self.log(f"[RESUMING] {filename} from {self.format_bytes(resume_pos)}")
+                    else:
+                        self.log(f"[DOWNLOADING] {filename} ({self.format_bytes(file_size)})")
+
+                    meter = TransferMeter(url)
+                    with open(filepath, 'ab' if resume_pos > 0 else 'wb') as f:
+                        async for chunk in response.content.iter_chunked(BANDWIDTH_LIMITER.read_size(self.config["chunk_size"])):
+                            if self._cancelled():
+                                self.finalize_progress_line()
+                                return False
+                            await loop.run_in_executor(_write_executor, f.write, chunk)
+                            downloaded += len(chunk)
+                            meter.add(len(chunk))
+                            await self._throttle_async(filepath, len(chunk))
+
+                            # Progress update once per ~0.5s
+                            now = time.time()
+                            if now - last_update >= 0.5:
+                                self.print_progress(resume_pos + downloaded, file_size, start_time, filename)
+                                last_update = now
+                finally:
+                    if meter is not None:
+                        meter.finish()
+                    response.release()
+
+                self.print_progress(resume_pos + downloaded, file_size, start_time, filename)
+                self.clear_progress_line()
+
+                if os.path.getsize(filepath) == file_size:
+                    self.log(f"[OK] {filename} completed")
+                    return True
+                self.log(f"[ERROR] Size mismatch")
+
+            except Exception as e:
+                self.finalize_progress_line()
+                self.log(f"[ERROR] Attempt {attempt + 1}: {e}")
+                if attempt < max_retries - 1:
+                    record_retry(url)
+                    await self._pause_async(self.retry_delay(url, attempt))
+                else:
+                    record_failure(url)
+                    return False
+
+        return False
@@ -0,0 +1,212 @@
+"""
+Content-addressed model store.
+
+Many catalog entries point at the same file: the Wan 2.1 VAE, UMT5 XXL or
+FLUX VAE show up in several bundles and categories, under different
+``save_filename``s and in different folders depending on the SwarmUI /
+ComfyUI / Forge layout. BlobStore keeps one copy of every verified file
+under ``<base path>/.blobs/sha256/<ab>/<sha256>``. Each model path is then a
+hardlink (or reflink, on filesystems that support it) to that entry, so a
+blob that is already on disk is never downloaded or written again.
+
+Linking falls back to a plain copy when the target is on another
+filesystem. Reflinks and copies don't show in a blob's link count, so the
+paths made that way are listed in a ``<sha256>.refs`` file next to the blob
+and prune() keeps the blob while any of them is still there.
+"""
+
+import os
+import shutil
+import uuid
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+STORE_DIRNAME = ".blobs"
+REFS_SUFFIX = ".refs"  # Model paths that are reflinks or copies of the blob, one per line
+FICLONE = 0x40049409  # Linux ioctl: share extents with another file (btrfs, XFS, bcachefs)
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Copy-on-write clone of src to dst; False if the filesystem can't do it"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class BlobStore:
+    """SHA256-keyed store of verified files, shared by all layouts under one base path"""
+
+    def __init__(self, base_path: str):
+        self.root = os.path.join(base_path, STORE_DIRNAME, "sha256")
+
+    def blob_path(self, sha256: str) -> str:
+        sha256 = sha256.lower()
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def has(self, sha256: str, size: Optional[int] = None) -> bool:
+        path = self.blob_path(sha256)
+        if not os.path.isfile(path):
+            return False
+        return size is None or os.path.getsize(path) == size
+
+    def is_linked(self, sha256: str, target: str) -> bool:
+        """True if target already is the store entry (same inode)"""
+        return _same_file(self.blob_path(sha256), target)
+
+    def _add_ref(self, sha256: str, target: str):
+        """Record a model path that uses the blob without being a hardlink of it"""
+        with open(self.blob_path(sha256) + REFS_SUFFIX, 'a', encoding='utf-8') as f:
+            f.write(os.path.abspath(target) + "\n")
+
+    @staticmethod
+    def _live_refs(blob: str) -> list:
+        """Recorded reflink/copy paths of blob that still hold a file of its size"""
+        try:
+            with open(blob + REFS_SUFFIX, encoding='utf-8') as f:
+                paths = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+        size = os.path.getsize(blob)
+        return [path for path in dict.fromkeys(paths)
+                if os.path.isfile(path) and os.path.getsize(path) == size and not _same_file(path, blob)]
+
+    def _place(self, src: str, dst: str) -> str:
+        """Make dst a hardlink/reflink/copy of src atomically; returns the method used"""
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        tmp = f"{dst}.{uuid.uuid4().hex[:8]}.blobtmp"
+        try:
+            try:
+                os.link(src, tmp)
+                method = "hardlink"
+            except OSError:
+                if _reflink(src, tmp):
+                    method = "reflink"
+                else:
+                    shutil.copyfile(src, tmp)
+                    method = "copy"
+            os.replace(tmp, dst)
+            return method
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def materialize(self, sha256: str, target: str) -> Optional[str]:
+        """Point target at the stored blob; returns "hardlink"/"reflink"/"copy",
+        "linked" if it already was, or None if the blob isn't stored."""
+        if not self.has(sha256):
+            return None
+        if self.is_linked(sha256, target):
+            return "linked"
+        method = self._place(self.blob_path(sha256), target)
+        if method != "hardlink":
+            self._add_ref(sha256, target)
+        return method
+
+    def ingest(self, sha256: str, path: str) -> Optional[str]:
+        """Add a verified file to the store without copying it when possible.
+
+        The file is hardlinked (or reflinked) into the store; an existing blob
+        wins and path is re-pointed at it, freeing the duplicate. Returns the
+        method used, or None if the file couldn't be shared (e.g. the store
+        is on another filesystem).
+        """
+        if not os.path.isfile(path):
+            return None
+        blob = self.blob_path(sha256)
+        if os.path.isfile(blob):
+            if _same_file(blob, path):
+                return "linked"
+            if os.path.getsize(blob) == os.path.getsize(path):
+                method = self._place(blob, path)
+                if method != "hardlink":
+                    self._add_ref(sha256, path)
+                return method
+            os.remove(blob)  # Truncated/corrupt store entry; replace it with the verified file
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+            return "hardlink"
+        except FileExistsError:
+            return self.ingest(sha256, path)  # Another worker stored it first
+        except OSError:
+            tmp = f"{blob}.{uuid.uuid4().hex[:8]}.blobtmp"
+            if _reflink(path, tmp):
+                os.replace(tmp, blob)
+                self._add_ref(sha256, path)
+                return "reflink"
+            return None
+
+    def detach(self, target: str, expected_size: int):
+        """Remove a hardlinked target whose size is wrong before it is downloaded.
+
+        The single-stream downloader resumes by appending to a shorter file,
+        which would write through the link into a stored blob. A hardlinked
+        file of the right size is left alone; it is SHA-checked (and removed
+        if it doesn't match) before any download happens.
+        """
+        try:
+            st = os.stat(target)
+        except OSError:
+            return
+        if st.st_nlink > 1 and st.st_size != expected_size:
+            os.remove(target)
+
+    def prune(self) -> int:
+        """Delete blobs no model path uses any more; returns bytes freed.
+
+        A blob is unused when nothing else links to it (link count 1) and
+        none of its recorded reflink/copy paths still holds the file.
+        """
+        freed = 0
+        if not os.path.isdir(self.root):
+            return 0
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name.endswith(".blobtmp"):
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    continue
+                if name.endswith(REFS_SUFFIX):
+                    if os.path.exists(path) and not os.path.exists(path[:-len(REFS_SUFFIX)]):
+                        os.remove(path)  # Its blob is gone
+                    continue
+                st = os.stat(path)
+                if st.st_nlink > 1:
+                    continue
+                live = self._live_refs(path)
+                if live:
+                    with open(path + REFS_SUFFIX, 'w', encoding='utf-8') as f:
+                        f.write("".join(ref + "\n" for ref in live))
+                    continue
+                freed += st.st_size
+                os.remove(path)
+                if os.path.exists(path + REFS_SUFFIX):
+                    os.remove(path + REFS_SUFFIX)
+            if not os.listdir(prefix_dir):
+                os.rmdir(prefix_dir)
+        return freed
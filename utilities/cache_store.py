@@ -0,0 +1,159 @@
+"""
+SQLite-backed caches for the downloaders.
+
+The SHA256 and verified-file caches used to be JSON files that were
+rewritten in full on every new entry, which gets slow with thousands of
+entries and loses writes when the Gradio app, the CLI and URLDownloader run
+at the same time. CacheStore keeps them in one SQLite database in WAL mode:
+lookups hit the primary-key index, every write is a single-row upsert, and
+several processes can read and write concurrently.
+
+Each table is exposed as a MutableMapping (CacheTable), so code that used
+the old dicts keeps working. Existing JSON caches are imported once.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Optional
+
+BUSY_TIMEOUT = 30.0  # Seconds to wait for another process holding the write lock
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class CacheStore:
+    """One SQLite database holding named key -> JSON value tables"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections can't be shared between threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def table(self, name: str) -> "CacheTable":
+        with self._lock:
+            if name not in self._tables:
+                conn = self.connection()
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, path TEXT, updated_at REAL)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_path ON {name}(path)")
+                conn.execute("CREATE TABLE IF NOT EXISTS migrations (source TEXT PRIMARY KEY, migrated_at REAL)")
+                self._tables[name] = CacheTable(self, name)
+            return self._tables[name]
+
+    def migrate_json(self, json_path: str, table: "CacheTable") -> int:
+        """Import a legacy JSON cache into table once; returns the number of entries imported"""
+        if not os.path.exists(json_path):
+            return 0
+        conn = self.connection()
+        source = os.path.abspath(json_path)
+        if conn.execute("SELECT 1 FROM migrations WHERE source = ?", (source,)).fetchone():
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                entries = json.load(f)
+        except Exception:
+            entries = {}
+        table.update({k: v for k, v in entries.items() if k not in table})
+        conn.execute("INSERT OR REPLACE INTO migrations (source, migrated_at) VALUES (?, ?)", (source, time.time()))
+        return len(entries)
+
+
+class CacheTable(MutableMapping):
+    """dict-like view of one cache table; every write is committed immediately"""
+
+    def __init__(self, store: CacheStore, name: str):
+        self.store = store
+        self.name = name
+
+    @staticmethod
+    def _row(key: str, value):
+        path = value.get('path') if isinstance(value, dict) else None
+        return key, json.dumps(value), path, time.time()
+
+    def __getitem__(self, key: str):
+        row = self.store.connection().execute(
+            f"SELECT value FROM {self.name} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value):
+        self.store.connection().execute(
+            f"INSERT OR REPLACE INTO {self.name} (key, value, path, updated_at) VALUES (?, ?, ?, ?)",
+            self._row(key, value))
+
+    def __delitem__(self, key: str):
+        cursor = self.store.connection().execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return self.store.connection().execute(
+            f"SELECT 1 FROM {self.name} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self.store.connection().execute(f"SELECT key FROM {self.name}").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        return self.store.connection().execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
+
+    def update(self, other=(), **kwargs):
+        """Write many entries in one transaction"""
+        items = dict(other, **kwargs)
+        if not items:
+            return
+        conn = self.store.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, path, updated_at) VALUES (?, ?, ?, ?)",
+                [self._row(key, value) for key, value in items.items()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def snapshot(self) -> Dict[str, object]:
+        """All entries, read in one query"""
+        rows = self.store.connection().execute(f"SELECT key, value FROM {self.name}").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def find_by_path(self, path: str) -> Dict[str, object]:
+        """Entries whose value records this local path (uses the path index)"""
+        rows = self.store.connection().execute(
+            f"SELECT key, value FROM {self.name} WHERE path = ?", (path,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+
+def get_cache_store(db_path: str) -> Optional[CacheStore]:
+    """Shared CacheStore for db_path, or None if SQLite can't open it (e.g. read-only folder)"""
+    db_path = os.path.abspath(db_path)
+    with _stores_lock:
+        if db_path not in _stores:
+            store = CacheStore(db_path)
+            try:
+                store.connection()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not open cache database {db_path}: {e}")
+                return None
+            _stores[db_path] = store
+        return _stores[db_path]
@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+"""
+Download Benchmark
+
+Runs the downloaders against a local HTTP server with Range support so a
+change to download_parallel, merge_chunks or verify_file_sha256 can be
+measured instead of guessed. The server can misbehave the way real origins
+and CDNs do: a total and a per-connection bandwidth cap, latency and jitter
+before the first byte, mid-stream stalls, and 429/503 answers. Faults come
+from a seeded random generator, so a run can be repeated.
+
+Every combination of client, file size and connection count is measured:
+several files download at the same time (like the Gradio worker pool), each
+one is SHA256-checked, and the wall time, throughput, CPU time, peak RSS and
+request / file latency percentiles are reported. --json writes the results
+and --compare prints the throughput change against an earlier JSON file.
+
+--write-behind-mb compares the plain buffered write path (0) with the
+write-behind one. Page cache isn't part of RSS, so the peak dirty +
+writeback memory of the machine and the peak memory charged to this
+container's cgroup (page cache included) are reported as well. Use
+--work-dir to write on the volume that matters (e.g. /workspace) rather
+than /tmp.
+
+--tail-control compares the stall watchdog and hedged last ranges (off,
+watchdog, hedge, both). Pair it with --stall-rate or --slow-rate, which
+make some responses stall or crawl, and look at the file p99 column.
+
+--rate-limit-rps makes the server behave like a rate-limited origin: GETs
+over the limit in a one-second sliding window get 429 + Retry-After, and
+rejected ones count against the window too, so retrying in lockstep keeps
+a client throttled.
+
+Clients:
+    thread  RobustDownloader, thread engine, ranges written in place
+    async   RobustDownloader, asyncio engine
+    partn   RobustDownloader, legacy .partN chunks + merge_chunks
+    url     URLDownloader (generic URL path)
+
+Usage:
+    python utilities/download_benchmark.py --files 4 --size-mb 256 --connections 16
+    python utilities/download_benchmark.py --size-mb 64 512 --connections 4 16 --engines thread partn \\
+        --conn-bandwidth-mb 20 --latency-ms 50 --jitter-ms 20 --error-rate 0.02 --json after.json --compare before.json
+    python utilities/download_benchmark.py --files 2 --size-mb 8192 --engines thread partn \\
+        --write-behind-mb 0 64 --work-dir /workspace
+    python utilities/download_benchmark.py --files 2 --size-mb 256 --engines thread async \\
+        --conn-bandwidth-mb 20 --slow-rate 0.05 --stall-rate 0.05 --stall-seconds 60 --tail-control off both
+"""
+
+import argparse
+import collections
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+import requests
+
+from utilities.HF_model_downloader import DEFAULT_DOWNLOAD_CONFIG, create_downloader
+from utilities.file_audit import hash_file
+
+SEND_BLOCK = 1024 * 1024
+PACED_BLOCK = 64 * 1024      # Smaller writes when a bandwidth cap is active, for smoother pacing
+STATS_PATH = "/__stats"      # GET: per-request timings recorded by the server
+RESET_PATH = "/__reset"      # GET: forget recorded timings
+ENGINES = ["thread", "async", "partn", "url"]
+TAIL_CONTROL = {             # Downloader config for each --tail-control mode
+    "off": {"stall_ratio": 0, "stall_timeout": 0, "hedge_tail": False},
+    "watchdog": {"hedge_tail": False},
+    "hedge": {"stall_ratio": 0, "stall_timeout": 0},
+    "both": {},
+}
+
+NO_FAULTS = {
+    "bandwidth": 0,        # bytes/s for the whole server
+    "conn_bandwidth": 0,   # bytes/s per connection
+    "latency": 0.0,        # seconds before every response
+    "jitter": 0.0,         # up to this many extra seconds, random
+    "stall_rate": 0.0,     # share of responses that stall once mid-stream
+    "stall_seconds": 0.0,
+    "slow_rate": 0.0,      # share of responses sent at slow_bandwidth throughout
+    "slow_bandwidth": 0,   # bytes/s
+    "error_rate": 0.0,     # share of GETs answered 429 / 503
+    "rate_limit": 0,       # GETs per second (sliding window, rejected ones count too); excess gets 429
+}
+
+
+# ------------------------------ Fault-injecting server ------------------------------
+
+class TokenBucket:
+    """Bandwidth cap shared by every connection of the server (0 = unlimited)"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def delay(self, nbytes: int) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + nbytes / self.rate
+            return self._next - now
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serves files from server.root with single-range support and injected faults"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _empty(self, status: int, headers: Optional[Dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _roll(self) -> float:
+        with self.server.random_lock:
+            return self.server.random.random()
+
+    def _send(self, head_only: bool):
+        server = self.server
+        faults = server.faults
+        path = os.path.join(server.root, os.path.basename(self.path.split('?')[0]))
+        if not os.path.isfile(path):
+            self._empty(404)
+            return
+
+        received = time.perf_counter()
+        if not head_only and faults["rate_limit"] and server.over_rate_limit():
+            self._empty(429, {'Retry-After': '1'})
+            server.record(received, received, 429, 0)
+            return
+        wait = faults["latency"] + faults["jitter"] * self._roll()
+        if wait:
+            time.sleep(wait)
+        if not head_only and faults["error_rate"] and self._roll() < faults["error_rate"]:
+            status = 429 if self._roll() < 0.5 else 503
+            self._empty(status, {'Retry-After': '1'})
+            server.record(received, received, status, 0)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if head_only:
+            return
+
+        first_byte = None
+        conn_rate = faults["conn_bandwidth"]
+        if faults["slow_rate"] and self._roll() < faults["slow_rate"]:
+            conn_rate = min(conn_rate or faults["slow_bandwidth"], faults["slow_bandwidth"])
+        block_size = PACED_BLOCK if conn_rate or server.bucket.rate else SEND_BLOCK
+        stall_at = None
+        if faults["stall_rate"] and self._roll() < faults["stall_rate"]:
+            stall_at = start + int((end - start + 1) * self._roll())
+        sent = 0
+        paced_start = time.monotonic()
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    data = f.read(min(block_size, remaining))
+                    if not data:
+                        break
+                    if stall_at is not None and start + sent >= stall_at:
+                        time.sleep(faults["stall_seconds"])
+                        stall_at = None
+                    delay = server.bucket.delay(len(data))
+                    if conn_rate:
+                        delay = max(delay, paced_start + (sent + len(data)) / conn_rate - time.monotonic())
+                    if delay > 0:
+                        time.sleep(delay)
+                    self.wfile.write(data)
+                    if first_byte is None:
+                        first_byte = time.perf_counter()
+                    sent += len(data)
+                    remaining -= len(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        server.record(received, first_byte or time.perf_counter(), 206 if match else 200, sent)
+
+    def do_GET(self):
+        if self.path == STATS_PATH:
+            with self.server.stats_lock:
+                recorded = list(self.server.requests)
+            self._json(recorded)
+            return
+        if self.path == RESET_PATH:
+            with self.server.stats_lock:
+                self.server.requests = []
+            self._json({})
+            return
+        self._send(False)
+
+    def do_HEAD(self):
+        self._send(True)
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root: str, faults: Dict, seed: int):
+        super().__init__(('127.0.0.1', 0), RangeRequestHandler)
+        self.root = root
+        self.faults = faults
+        self.bucket = TokenBucket(faults["bandwidth"])
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = []
+        self.stats_lock = threading.Lock()
+        self.recent_gets = collections.deque()
+
+    def over_rate_limit(self) -> bool:
+        """Count a GET in the last second's window; True when the window is over the limit"""
+        now = time.monotonic()
+        with self.stats_lock:
+            while self.recent_gets and self.recent_gets[0] <= now - 1:
+                self.recent_gets.popleft()
+            self.recent_gets.append(now)
+            return len(self.recent_gets) > self.faults["rate_limit"]
+
+    def record(self, received: float, first_byte: float, status: int, nbytes: int):
+        now = time.perf_counter()
+        with self.stats_lock:
+            self.requests.append({"status": status, "bytes": nbytes,
+                                  "ttfb": first_byte - received, "seconds": now - received})
+
+
+def _serve(root: str, faults: Dict, seed: int, port_queue):
+    server = BenchmarkServer(root, faults, seed)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(root: str, faults: Optional[Dict] = None, seed: int = 0):
+    """Run the test server in its own process so it doesn't skew CPU numbers"""
+    faults = dict(NO_FAULTS, **(faults or {}))
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(root, faults, seed, port_queue), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+
+def server_request(base_url: str, path: str):
+    return requests.get(f"{base_url}{path}", timeout=30).json()
+
+
+# ------------------------------------ Client ----------------------------------------
+
+def create_test_files(root: str, count: int, size: int) -> Dict[str, str]:
+    """Write random files and return {name: sha256}"""
+    files = {}
+    for i in range(count):
+        name = f"bench_{size}_{i}.bin"
+        sha = hashlib.sha256()
+        with open(os.path.join(root, name), 'wb') as f:
+            remaining = size
+            while remaining:
+                block = os.urandom(min(SEND_BLOCK * 16, remaining))
+                sha.update(block)
+                f.write(block)
+                remaining -= len(block)
+        files[name] = sha.hexdigest()
+    return files
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 where unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        if resource is not None:
+            scale = 1 if sys.platform == "darwin" else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        return 0
+
+
+def current_dirty() -> int:
+    """Dirty + Writeback page cache of the whole machine in bytes (0 where unknown)"""
+    total = 0
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith(('Dirty:', 'Writeback:')):
+                    total += int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        return 0
+    return total
+
+
+def current_cgroup_memory() -> int:
+    """Memory charged to this process's cgroup, page cache included (0 where unknown)"""
+    for path in ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory/memory.usage_in_bytes'):
+        try:
+            with open(path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            continue
+    return 0
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4)}
+
+
+def download_one(engine: str, config: Dict, url: str, out_dir: str, name: str,
+                 size: int, sha: str) -> bool:
+    if engine == "url":
+        from utilities.url_downloader import URLDownloader
+        downloader = URLDownloader(config)
+        ok, path = downloader.download_file(downloader.parse_url(url), out_dir, name)
+        # URLDownloader doesn't verify; check here so every client is held to the same bar
+        return bool(ok) and hash_file(path)[0] == sha
+    engine_config = dict(config, preallocate=False) if engine == "partn" else config
+    downloader = create_downloader(engine_config, "async" if engine == "async" else "thread")
+    return downloader.download_verified(url, os.path.join(out_dir, name), name, size, sha)
+
+
+def run_engine(engine: str, base_url: str, files: Dict[str, str], size: int,
+               out_dir: str, config: Dict, tail_control: str = "both") -> Dict:
+    """Download every file concurrently with one client and measure it"""
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    server_request(base_url, RESET_PATH)
+    if hasattr(os, 'sync'):
+        os.sync()  # Start without dirty pages left by the test files or the previous run
+
+    results = {}
+    file_seconds = []
+    peak_threads = threading.active_count()
+    rss_start = current_rss()
+    peak_rss = rss_start
+    peak_dirty = current_dirty()
+    cgroup_start = current_cgroup_memory()
+    peak_cgroup = cgroup_start
+    sampling = threading.Event()
+
+    def sample():
+        nonlocal peak_threads, peak_rss, peak_dirty, peak_cgroup
+        while not sampling.is_set():
+            peak_threads = max(peak_threads, threading.active_count())
+            peak_rss = max(peak_rss, current_rss())
+            peak_dirty = max(peak_dirty, current_dirty())
+            peak_cgroup = max(peak_cgroup, current_cgroup_memory())
+            time.sleep(0.02)
+
+    def download(name: str, sha: str):
+        started = time.perf_counter()
+        try:
+            results[name] = download_one(engine, config, f"{base_url}/{name}", out_dir, name, size, sha)
+        except Exception as e:
+            print(f"[ERROR] {engine} {name}: {e}")
+            results[name] = False
+        file_seconds.append(time.perf_counter() - started)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    workers = [threading.Thread(target=download, args=item) for item in files.items()]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    sampling.set()
+    sampler.join()
+
+    requests_seen = server_request(base_url, STATS_PATH)
+    served = [r for r in requests_seen if r["status"] in (200, 206)]
+    total_bytes = size * len(files)
+    return {
+        "engine": engine,
+        "size_mb": size / (1024 * 1024),
+        "connections": config["num_connections"],
+        "write_behind_mb": config.get("write_behind", 0) / (1024 * 1024),
+        "tail_control": tail_control,
+        "ok": all(results.values()),
+        "seconds": round(wall, 3),
+        "mb_per_s": round(total_bytes / wall / (1024 * 1024), 1),
+        "cpu_seconds": round(cpu, 3),
+        "cpu_per_gb": round(cpu / (total_bytes / 1024 ** 3), 3),
+        "peak_threads": peak_threads,
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+        "rss_growth_mb": round((peak_rss - rss_start) / (1024 * 1024), 1),
+        "peak_dirty_mb": round(peak_dirty / (1024 * 1024), 1),
+        "cgroup_growth_mb": round((peak_cgroup - cgroup_start) / (1024 * 1024), 1),
+        "requests": len(requests_seen),
+        "errors_injected": len(requests_seen) - len(served),
+        "request_seconds": percentiles([r["seconds"] for r in served]),
+        "ttfb_seconds": percentiles([r["ttfb"] for r in served]),
+        "file_seconds": percentiles(file_seconds),
+    }
+
+
+def result_key(result: Dict):
+    return (result["engine"], result["size_mb"], result["connections"], result.get("write_behind_mb", 0),
+            result.get("tail_control", "both"))
+
+
+def compare(results: List[Dict], baseline_path: str):
+    """Print the throughput and CPU change of every scenario also present in the baseline"""
+    with open(baseline_path) as f:
+        baseline = {result_key(r): r for r in json.load(f).get("results", [])}
+    print(f"\nCompared with {baseline_path}:")
+    print(f"{'engine':<8} {'MB':>6} {'conns':>6} {'WB MB':>6} {'tail':<8} {'MB/s before':>12} {'after':>8} {'change':>8} "
+          f"{'CPU/GB change':>14}")
+    for r in results:
+        before = baseline.get(result_key(r))
+        if not before or not before.get("mb_per_s"):
+            continue
+        change = (r["mb_per_s"] / before["mb_per_s"] - 1) * 100
+        cpu_change = ((r["cpu_per_gb"] / before["cpu_per_gb"] - 1) * 100) if before.get("cpu_per_gb") else 0.0
+        print(f"{r['engine']:<8} {r['size_mb']:>6g} {r['connections']:>6} {r['write_behind_mb']:>6g} {r['tail_control']:<8} "
+              f"{before['mb_per_s']:>12} "
+              f"{r['mb_per_s']:>8} {change:>+7.1f}% {cpu_change:>+13.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the downloaders against a local, optionally faulty, HTTP server")
+    parser.add_argument("--files", type=int, default=4, help="Files downloaded at the same time")
+    parser.add_argument("--size-mb", type=int, nargs="+", default=[256], help="Size of each file in MB (several = one run each)")
+    parser.add_argument("--connections", type=int, nargs="+", default=[16], help="Range connections per file (several = one run each)")
+    parser.add_argument("--write-behind-mb", type=int, nargs="+", default=[0], help="Downloader write-behind window in MB, 0 = plain buffered writes (several = one run each)")
+    parser.add_argument("--tail-control", nargs="+", default=["both"], choices=list(TAIL_CONTROL),
+                        help="Stall watchdog / hedged last ranges: off, watchdog, hedge or both (several = one run each)")
+    parser.add_argument("--engines", nargs="+", default=["thread", "async"], choices=ENGINES)
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="Server-wide bandwidth cap in MB/s (0 = none)")
+    parser.add_argument("--conn-bandwidth-mb", type=float, default=0, help="Per-connection bandwidth cap in MB/s (0 = none)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Up to this much extra random delay per response")
+    parser.add_argument("--stall-rate", type=float, default=0, help="Share of responses that stall once mid-stream")
+    parser.add_argument("--stall-seconds", type=float, default=5, help="Length of an injected stall")
+    parser.add_argument("--slow-rate", type=float, default=0, help="Share of responses that crawl from start to end")
+    parser.add_argument("--slow-bandwidth-kb", type=float, default=256, help="Rate of a crawling response in KB/s")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of GET requests answered with 429/503")
+    parser.add_argument("--rate-limit-rps", type=float, default=0, help="GETs per second the server accepts before answering 429 + Retry-After (rejected ones count too)")
+    parser.add_argument("--retry-delay", type=float, default=None, help="Downloader base retry delay in seconds (default: downloader config)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for injected faults")
+    parser.add_argument("--work-dir", type=str, default=None, help="Directory for test files and downloads (default: a temp dir)")
+    parser.add_argument("--json", type=str, default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--compare", type=str, default=None, help="Print the change against results saved earlier with --json")
+    args = parser.parse_args()
+
+    faults = {
+        "bandwidth": args.bandwidth_mb * 1024 * 1024,
+        "conn_bandwidth": args.conn_bandwidth_mb * 1024 * 1024,
+        "latency": args.latency_ms / 1000,
+        "jitter": args.jitter_ms / 1000,
+        "stall_rate": args.stall_rate,
+        "stall_seconds": args.stall_seconds,
+        "slow_rate": args.slow_rate,
+        "slow_bandwidth": args.slow_bandwidth_kb * 1024,
+        "error_rate": args.error_rate,
+        "rate_limit": args.rate_limit_rps,
+    }
+    base_config = dict(DEFAULT_DOWNLOAD_CONFIG, adaptive_connections=False)
+    if args.retry_delay is not None:
+        base_config["retry_delay"] = args.retry_delay
+    work_dir = tempfile.mkdtemp(prefix="download_benchmark_", dir=args.work_dir)
+    serve_dir = os.path.join(work_dir, "serve")
+    os.makedirs(serve_dir)
+
+    results: List[Dict] = []
+    try:
+        print(f"Creating test files in {work_dir}...")
+        files_by_size = {size_mb: create_test_files(serve_dir, args.files, size_mb * 1024 * 1024)
+                         for size_mb in args.size_mb}
+        server, base_url = start_server(serve_dir, faults, args.seed)
+        try:
+            for size_mb, files in files_by_size.items():
+                for connections in args.connections:
+                    for write_behind_mb, tail_control in itertools.product(args.write_behind_mb, args.tail_control):
+                        config = dict(base_config, num_connections=connections,
+                                      write_behind=write_behind_mb * 1024 * 1024, **TAIL_CONTROL[tail_control])
+                        for engine in args.engines:
+                            print(f"\n=== {engine}: {args.files} x {size_mb} MB, {connections} connections, "
+                                  f"write-behind {write_behind_mb or 'off'}, tail control {tail_control} ===")
+                            results.append(run_engine(engine, base_url, files, size_mb * 1024 * 1024,
+                                                      os.path.join(work_dir, f"out_{engine}"), config, tail_control))
+        finally:
+            server.terminate()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'engine':<8} {'MB':>6} {'conns':>6} {'WB MB':>6} {'tail':<8} {'ok':<5} {'seconds':>8} {'MB/s':>8} {'CPU s':>7} "
+          f"{'RSS MB':>7} {'dirty MB':>8} {'cgroup+':>8} {'threads':>7} {'req p99':>8} {'file p99':>8}")
+    for r in results:
+        print(f"{r['engine']:<8} {r['size_mb']:>6g} {r['connections']:>6} {r['write_behind_mb']:>6g} {r['tail_control']:<8} "
+              f"{str(r['ok']):<5} "
+              f"{r['seconds']:>8} {r['mb_per_s']:>8} {r['cpu_seconds']:>7} {r['peak_rss_mb']:>7} "
+              f"{r['peak_dirty_mb']:>8} {r['cgroup_growth_mb']:>8} {r['peak_threads']:>7} "
+              f"{r['request_seconds']['p99'] or '-':>8} {r['file_seconds']['p99'] or '-':>8}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "files": args.files,
+                "faults": faults,
+                "seed": args.seed,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Prometheus-style metrics for the downloader.
+
+A minimal, dependency-free registry of counters, gauges and histograms,
+rendered in the Prometheus text exposition format by MetricsServer
+(GET /metrics). RobustDownloader, the async engine and the Gradio worker
+record into the module-level metrics below.
+
+Recording is cheap enough for the hot path: a labelled child is looked up
+once per HTTP response (see TransferMeter) and each block only adds to a
+number under a lock. Gauges such as queue depth are computed when scraped.
+
+Usage:
+    python Downloader_Gradio_App.py --metrics-port 9108
+    curl http://localhost:9108/metrics
+"""
+
+import bisect
+import re
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_PORT = 9108
+MIN_THROUGHPUT_SAMPLE = 1024 * 1024  # Responses smaller than this say little about throughput
+
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+_HF_REPO_RE = re.compile(r'^/(?:(?:datasets|spaces)/)?(.+?)/resolve/')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Value:
+    """One labelled counter or gauge value"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramValue:
+    """One labelled histogram: cumulative bucket counts, sum and count"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class Metric:
+    """Base for a named metric with optional labels; labels(...) returns the child to record on"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in self._items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(child.value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._function = None
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """Compute the (unlabelled) value when scraped instead of storing it"""
+        self._function = function
+
+    def _items(self):
+        if self._function is not None:
+            try:
+                value = _Value()
+                value.value = float(self._function())
+                return [((), value)]
+            except Exception:
+                return []
+        return super()._items()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bucket_names = self.label_names + ("le",)
+        for key, child in self._items():
+            cumulative, total, count = child.samples()
+            for bound, value in zip(self.buckets + (float("inf"),), cumulative):
+                labels = _format_labels(bucket_names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {value}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """All metrics exported by one process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every downloader and worker in the process
+METRICS = MetricsRegistry()
+
+BYTES_DOWNLOADED = METRICS.counter(
+    "hfdl_downloaded_bytes_total", "Bytes received from download sources", ("repo", "host"))
+ACTIVE_CONNECTIONS = METRICS.gauge(
+    "hfdl_active_connections", "HTTP connections currently held by downloads")
+TRANSFER_THROUGHPUT = METRICS.histogram(
+    "hfdl_transfer_throughput_bytes_per_second", "Throughput of each range / chunk / file response",
+    ("host",), THROUGHPUT_BUCKETS)
+RETRIES = METRICS.counter(
+    "hfdl_retries_total", "Requests retried after an error", ("host",))
+CHUNK_FAILURES = METRICS.counter(
+    "hfdl_chunk_failures_total", "Ranges, chunks or files given up after all retries", ("host",))
+CIRCUIT_TRIPS = METRICS.counter(
+    "hfdl_circuit_trips_total", "429/503 bursts that paused new requests to a host and halved its downloads' connections", ("host",))
+STALLED_CONNECTIONS = METRICS.counter(
+    "hfdl_stalled_connections_total", "Range connections restarted by the stall watchdog", ("host",))
+HEDGED_REQUESTS = METRICS.counter(
+    "hfdl_hedged_requests_total", "Duplicate requests raced against the last ranges, by outcome (won, lost)", ("host", "outcome"))
+VERIFY_SECONDS = METRICS.histogram(
+    "hfdl_verify_seconds", "Time spent in SHA256 verification passes")
+MERGE_SECONDS = METRICS.histogram(
+    "hfdl_merge_seconds", "Time spent merging .partN chunk files")
+PENDING_MOVES = METRICS.gauge(
+    "hfdl_pending_moves", "Verified files on scratch waiting for (or in) the move to their target")
+REDIRECTS_AVOIDED = METRICS.counter(
+    "hfdl_redirects_avoided_total", "Requests sent straight to a cached CDN location", ("host",))
+REDIRECT_SECONDS_SAVED = METRICS.counter(
+    "hfdl_redirect_seconds_saved_total", "Redirect latency avoided by reusing CDN locations", ("host",))
+REDIRECT_RESOLVES = METRICS.counter(
+    "hfdl_redirect_resolves_total", "CDN locations resolved: new, expired, or rejected (403/410)", ("host", "reason"))
+CACHE_LOOKUPS = METRICS.counter(
+    "hfdl_cache_lookups_total", "SHA256 and verified-file cache lookups", ("cache", "result"))
+QUEUE_DEPTH = METRICS.gauge(
+    "hfdl_queue_depth", "Models waiting in the download queue")
+RUNNING_DOWNLOADS = METRICS.gauge(
+    "hfdl_running_downloads", "Models downloading right now")
+TASKS = METRICS.counter(
+    "hfdl_tasks_total", "Queued models finished, by result", ("result",))
+TASK_SECONDS = METRICS.histogram(
+    "hfdl_task_seconds", "Wall time of each queued model download")
+
+
+def url_labels(url: str) -> Tuple[str, str]:
+    """(repo, host) labels for a download URL; repo is "-" for non-HuggingFace URLs"""
+    parsed = urllib.parse.urlsplit(url)
+    match = _HF_REPO_RE.match(urllib.parse.unquote(parsed.path))
+    return (match.group(1) if match else "-"), (parsed.hostname or "-")
+
+
+def record_retry(url: str):
+    RETRIES.labels(url_labels(url)[1]).inc()
+
+
+def record_failure(url: str):
+    CHUNK_FAILURES.labels(url_labels(url)[1]).inc()
+
+
+class TransferMeter:
+    """Counts the bytes of one HTTP response and its throughput once it ends"""
+
+    def __init__(self, url: str):
+        repo, self.host = url_labels(url)
+        self._bytes = BYTES_DOWNLOADED.labels(repo, self.host)
+        self.start = time.monotonic()
+        self.count = 0
+
+    def add(self, nbytes: int):
+        self.count += nbytes
+        self._bytes.inc(nbytes)
+
+    def finish(self):
+        elapsed = time.monotonic() - self.start
+        if self.count >= MIN_THROUGHPUT_SAMPLE and elapsed > 0:
+            TRANSFER_THROUGHPUT.labels(self.host).observe(self.count / elapsed)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Serves a registry on /metrics from a background thread"""
+
+    def __init__(self, port: int = DEFAULT_PORT, host: str = "0.0.0.0", registry: MetricsRegistry = METRICS):
+        self.httpd = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "MetricsServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
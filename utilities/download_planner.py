@@ -0,0 +1,229 @@
+"""
+Pre-queue download planner.
+
+Before a bundle, a subcategory or any list of models is queued, plan_downloads()
+resolves the metadata of every repo involved (in parallel, one listing per
+repo), looks at what is already on disk and in the verified cache, and
+returns a DownloadPlan: which files must be downloaded, which only need a
+SHA256 check, which are already done, how many bytes that is, roughly how
+long it will take at recent throughput, and whether every target volume has
+room for it. Callers refuse to queue a plan that doesn't fit.
+"""
+
+import concurrent.futures
+import fnmatch
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from .repo_metadata import REPO_METADATA
+except ImportError:
+    from repo_metadata import REPO_METADATA
+
+METADATA_THREADS = 8
+MIN_FREE_SPACE = 2 * 1024 ** 3      # Keep this much free on every volume after the plan
+THROUGHPUT_MAX_AGE = 7 * 24 * 3600  # Ignore learned throughput older than a week
+
+# Actions, in the order they are reported
+DOWNLOAD = "download"   # Missing, wrong size, or pre_delete
+VERIFY = "verify"       # Right size on disk, SHA256 not checked yet
+LINK = "link"           # Same content already in the model store
+PRESENT = "present"     # Verified earlier and unchanged since
+UNKNOWN = "unknown"     # No metadata (offline / gated repo); size unknown
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if value < 1024.0:
+            return f"{value:.2f} {unit}"
+        value /= 1024.0
+    return f"{value:.2f} PB"
+
+
+def _format_time(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds // 3600}h {(seconds % 3600) // 60}m"
+
+
+def _existing_dir(path: str) -> str:
+    """Closest existing ancestor directory of path (for disk usage)"""
+    path = os.path.abspath(os.path.dirname(path))
+    while not os.path.isdir(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class DownloadPlan:
+    """Files of a planned request grouped by action, with byte counts, ETA and space check"""
+
+    def __init__(self, items: List[Dict], throughput: Optional[float], min_free_space: int):
+        self.items = items
+        self.throughput = throughput
+        self.space = self._check_space(min_free_space)
+
+    def by_action(self, action: str) -> List[Dict]:
+        return [item for item in self.items if item["action"] == action]
+
+    def total_bytes(self, action: str) -> int:
+        return sum(item["size"] or 0 for item in self.by_action(action))
+
+    @property
+    def download_bytes(self) -> int:
+        return self.total_bytes(DOWNLOAD)
+
+    @property
+    def verify_bytes(self) -> int:
+        return self.total_bytes(VERIFY)
+
+    def model_bytes(self, index: int) -> int:
+        """Size of every file of one planned model"""
+        return sum(item["size"] or 0 for item in self.items if item["model_index"] == index)
+
+    def complete_models(self) -> set:
+        """Indexes of models whose files are all present already"""
+        indexes = {item["model_index"] for item in self.items}
+        return {index for index in indexes
+                if all(item["action"] == PRESENT for item in self.items if item["model_index"] == index)}
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if not self.throughput:
+            return None
+        return self.download_bytes / self.throughput
+
+    def _check_space(self, min_free_space: int) -> List[Dict]:
+        """Bytes still to be written per volume vs. free space there"""
+        volumes = {}
+        for item in self.by_action(DOWNLOAD):
+            if not item["size"]:
+                continue
+            directory = _existing_dir(item["path"])
+            try:
+                device = os.stat(directory).st_dev
+            except OSError:
+                continue
+            volume = volumes.setdefault(device, {"path": directory, "needed": 0})
+            # A preallocated .partial already holds its space
+            partial = f"{item['path']}.partial"
+            already = os.path.getsize(partial) if os.path.isfile(partial) else 0
+            volume["needed"] += max(0, item["size"] - already)
+        for volume in volumes.values():
+            try:
+                volume["free"] = shutil.disk_usage(volume["path"]).free
+            except OSError:
+                volume["free"] = None
+            volume["fits"] = volume["free"] is None or volume["needed"] + min_free_space <= volume["free"]
+        return list(volumes.values())
+
+    @property
+    def fits(self) -> bool:
+        return all(volume["fits"] for volume in self.space)
+
+    def summary_lines(self) -> List[str]:
+        lines = [
+            f"Plan: {len(self.items)} files | "
+            f"download {len(self.by_action(DOWNLOAD))} ({_format_bytes(self.download_bytes)}) | "
+            f"verify {len(self.by_action(VERIFY))} ({_format_bytes(self.verify_bytes)}) | "
+            f"link {len(self.by_action(LINK))} | already present {len(self.by_action(PRESENT))}"
+        ]
+        if self.by_action(UNKNOWN):
+            lines.append(f"  {len(self.by_action(UNKNOWN))} files have no metadata (size unknown)")
+        if self.download_bytes:
+            eta = self.eta_seconds
+            if eta is not None:
+                lines.append(f"  Estimated download time: {_format_time(eta)} at {_format_bytes(self.throughput)}/s")
+            else:
+                lines.append("  Estimated download time: unknown (no recent throughput)")
+        for volume in self.space:
+            free = _format_bytes(volume["free"]) if volume["free"] is not None else "unknown"
+            status = "OK" if volume["fits"] else "NOT ENOUGH SPACE"
+            lines.append(f"  Disk {volume['path']}: needs {_format_bytes(volume['needed'])}, free {free} - {status}")
+        return lines
+
+
+def recent_throughput(downloader, bandwidth_limit: float = 0) -> Optional[float]:
+    """Best download rate learned in the last week (bytes/s), capped by the speed limit"""
+    now = time.time()
+    rates = [entry.get("throughput", 0) for entry in downloader.connection_tuning.values()
+             if isinstance(entry, dict) and now - entry.get("updated_at", 0) < THROUGHPUT_MAX_AGE]
+    rate = max(rates, default=0) or None
+    if bandwidth_limit and bandwidth_limit > 0:
+        rate = min(rate, bandwidth_limit) if rate else bandwidth_limit
+    return rate
+
+
+def _model_files(model_info: Dict, target_dir: str, listing: Optional[Dict]) -> List[Tuple[str, str]]:
+    """(repo filename, local path) pairs a queued model will write"""
+    if model_info.get("is_snapshot"):
+        if not listing:
+            return []
+        patterns = model_info.get("allow_patterns")
+        return [(name, os.path.normpath(os.path.join(target_dir, name))) for name in listing["files"]
+                if not patterns or any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    files = []
+    filename = model_info.get("filename_in_repo")
+    save_filename = model_info.get("save_filename")
+    if filename and save_filename:
+        files.append((filename, os.path.join(target_dir, save_filename)))
+    companion = model_info.get("companion_json")
+    if companion:
+        files.append((companion, os.path.join(target_dir, companion)))
+    return files
+
+
+def plan_downloads(models: List[Tuple[Dict, str]], downloader, blob_store=None,
+                   throughput: Optional[float] = None,
+                   min_free_space: int = MIN_FREE_SPACE) -> DownloadPlan:
+    """Plan a list of (model_info, target_dir) before queueing it.
+
+    Args:
+        models: catalog model entries with the directory each one saves into
+        downloader: RobustDownloader whose verified cache tells what is done
+        blob_store: optional BlobStore; files it holds are linked, not downloaded
+        throughput: bytes/s for the ETA (see recent_throughput)
+        min_free_space: bytes that must stay free on each volume
+    """
+    repos = {model_info["repo_id"] for model_info, _ in models if model_info.get("repo_id")}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(METADATA_THREADS, len(repos)))) as executor:
+        listings = dict(zip(repos, executor.map(REPO_METADATA.get_repo, repos)))
+
+    items = []
+    for index, (model_info, target_dir) in enumerate(models):
+        repo_id = model_info.get("repo_id")
+        listing = listings.get(repo_id)
+        for filename, path in _model_files(model_info, target_dir, listing):
+            meta = listing["files"].get(filename) if listing else None
+            item = {
+                "model_index": index,
+                "model_name": model_info.get("name", repo_id),
+                "repo_id": repo_id,
+                "filename": filename,
+                "path": path,
+                "sha256": meta["sha256"] if meta else None,
+                "size": meta["size"] if meta else None,
+            }
+            item["action"] = _classify(item, model_info.get("pre_delete_target", False), downloader, blob_store)
+            items.append(item)
+    return DownloadPlan(items, throughput, min_free_space)
+
+
+def _classify(item: Dict, pre_delete: bool, downloader, blob_store) -> str:
+    path, sha, size = item["path"], item["sha256"], item["size"]
+    if size is None:
+        return UNKNOWN
+    if not pre_delete and os.path.isfile(path) and os.path.getsize(path) == size:
+        if sha and downloader.is_file_verified(item["repo_id"], item["filename"], path, sha):
+            return PRESENT
+        return VERIFY if sha else PRESENT
+    if sha and blob_store is not None and blob_store.has(sha, size):
+        return LINK
+    return DOWNLOAD
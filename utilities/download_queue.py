@@ -0,0 +1,278 @@
+"""
+Priority download queue for the Gradio app.
+
+Replaces the plain FIFO queue.Queue of task tuples. Tasks stay in one
+ordered list that the UI can reorder: move a task up or down, send it to the
+top, or remove it. Models queued together (a bundle or a "Download All")
+form a group that is ordered so a usable set arrives as early as possible:
+companions (VAE, text encoders, LoRAs, ...) first, smallest first, then the
+main checkpoints. A main checkpoint is never handed to a worker while one of
+its group's companions is still waiting; the companion goes first.
+
+get / get_nowait / task_done / qsize / empty behave like queue.Queue, so the
+worker loop barely changes.
+
+With restore(store) every task and its state (queued, downloading,
+verifying, moving, failed) is kept in a cache_store table, so a pod restart or a
+crash doesn't lose a queued bundle: the next start re-queues whatever was
+unfinished, interrupted downloads first (they resume from their journals).
+"""
+
+import itertools
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+COMPANION = "companion"
+MAIN = "main"
+
+# Task states
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+VERIFYING = "verifying"
+MOVING = "moving"        # Verified on scratch, the background move to the target hasn't landed yet
+DONE = "done"
+FAILED = "failed"
+UNFINISHED_STATES = (DOWNLOADING, VERIFYING, MOVING, QUEUED)  # Re-queued on restore, in this order
+FAILED_TTL = 7 * 24 * 3600  # Failed tasks are kept this long for inspection
+
+# Folders holding the big models a set is built around; everything else
+# (vae, clip, clip_vision, Lora, controlnet, upscale_models, ...) is a companion
+MAIN_DIR_KEYS = {"diffusion_models", "Stable-Diffusion", "LLM", "LLM_unsloth_llama",
+                 "Joy_caption", "Joy_caption_monster_joy"}
+
+
+def task_role(model_info: Dict, sub_category_info: Dict) -> str:
+    """COMPANION or MAIN, from the folder the model is saved into"""
+    if model_info.get("is_snapshot"):
+        return MAIN
+    target_key = model_info.get("target_dir_key") or (sub_category_info or {}).get("target_dir_key")
+    return MAIN if target_key in MAIN_DIR_KEYS else COMPANION
+
+
+class DownloadTask:
+    """One queued model: the worker arguments plus what the queue orders by"""
+
+    def __init__(self, task_id: int, args: Tuple, name: str, size: int = 0,
+                 role: str = MAIN, group: Optional[int] = None, state: str = QUEUED):
+        self.task_id = task_id
+        self.args = args
+        self.name = name
+        self.size = size
+        self.role = role
+        self.group = group
+        self.state = state
+
+    def as_dict(self) -> Dict:
+        return {"id": self.task_id, "name": self.name, "size": self.size,
+                "role": self.role, "group": self.group, "state": self.state}
+
+    def record(self, position: int) -> Dict:
+        """What is persisted: everything needed to queue the task again"""
+        return dict(self.as_dict(), args=list(self.args), position=position, updated_at=time.time())
+
+
+class DownloadTaskQueue:
+    """Ordered, reorderable task queue with companion-before-main ordering"""
+
+    def __init__(self):
+        self._tasks: List[DownloadTask] = []
+        self._running: Dict[int, DownloadTask] = {}
+        self._ids = itertools.count(1)
+        self._groups = itertools.count(1)
+        self._cond = threading.Condition()
+        self._store = None
+        self.version = 0  # Bumped on every change so the UI only redraws when needed
+
+    def _changed(self):
+        self.version += 1
+        self._cond.notify_all()
+
+    # ------------------------------ Persistence -------------------------------
+
+    def _save_locked(self, tasks: List[DownloadTask]):
+        if self._store is None or not tasks:
+            return
+        positions = {task.task_id: index for index, task in enumerate(self._tasks)}
+        try:
+            self._store.update({str(task.task_id): task.record(positions.get(task.task_id, -1))
+                                for task in tasks})
+        except Exception as e:
+            print(f"Warning: Could not save download queue: {e}")
+
+    def _forget_locked(self, tasks: List[DownloadTask]):
+        if self._store is None:
+            return
+        for task in tasks:
+            try:
+                del self._store[str(task.task_id)]
+            except KeyError:
+                pass
+            except Exception as e:
+                print(f"Warning: Could not update download queue: {e}")
+
+    def restore(self, store) -> int:
+        """Persist to store (a cache_store table) from now on and re-queue what
+        the previous run left unfinished. Returns the number of tasks restored."""
+        records = store.snapshot()
+        for key, record in list(records.items()):
+            if record.get("state") == FAILED and time.time() - record.get("updated_at", 0) > FAILED_TTL:
+                del store[key]
+                del records[key]
+        unfinished = [r for r in records.values() if r.get("state") in UNFINISHED_STATES]
+        unfinished.sort(key=lambda r: (UNFINISHED_STATES.index(r["state"]), r.get("position", 0), r["id"]))
+        with self._cond:
+            self._store = store
+            top_id = max((r["id"] for r in records.values()), default=0)
+            top_group = max((r.get("group") or 0 for r in records.values()), default=0)
+            self._ids = itertools.count(max(top_id, next(self._ids) - 1) + 1)
+            self._groups = itertools.count(max(top_group, next(self._groups) - 1) + 1)
+            restored = [DownloadTask(r["id"], tuple(r["args"]), r["name"], r.get("size", 0),
+                                     r.get("role", MAIN), r.get("group"), QUEUED) for r in unfinished]
+            self._tasks = restored + self._tasks
+            self._save_locked(self._tasks)
+            self._changed()
+        return len(restored)
+
+    # ------------------------------ Adding tasks ------------------------------
+
+    def put(self, args: Tuple, name: str, size: int = 0, role: str = MAIN) -> DownloadTask:
+        """Queue a single model at the end"""
+        return self.put_group([(args, name, size, role)])[0]
+
+    def put_group(self, items: List[Tuple[Tuple, str, int, str]]) -> List[DownloadTask]:
+        """Queue models that belong together: companions first (smallest first), then mains"""
+        group = next(self._groups)
+        ordered = sorted(items, key=lambda item: (item[3] != COMPANION, item[2] or 0))
+        with self._cond:
+            tasks = [DownloadTask(next(self._ids), args, name, size or 0, role, group)
+                     for args, name, size, role in ordered]
+            self._tasks.extend(tasks)
+            self._save_locked(tasks)
+            self._changed()
+        return tasks
+
+    # ------------------------------ Taking tasks ------------------------------
+
+    def _next_locked(self) -> Optional[DownloadTask]:
+        if not self._tasks:
+            return None
+        task = self._tasks[0]
+        if task.role == MAIN:
+            # A waiting companion of the same group goes before its main model
+            for other in self._tasks[1:]:
+                if other.group == task.group and other.role == COMPANION:
+                    task = other
+                    break
+        self._tasks.remove(task)
+        task.state = DOWNLOADING
+        self._running[task.task_id] = task
+        self._save_locked([task])
+        self._changed()
+        return task
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> DownloadTask:
+        with self._cond:
+            if block and not self._tasks:
+                self._cond.wait_for(lambda: self._tasks, timeout=timeout)
+            task = self._next_locked()
+        if task is None:
+            raise queue.Empty
+        return task
+
+    def get_nowait(self) -> DownloadTask:
+        return self.get(block=False)
+
+    def set_state(self, task: DownloadTask, state: str):
+        """Record what a running task is doing (e.g. VERIFYING)"""
+        with self._cond:
+            if task.state != state:
+                task.state = state
+                self._save_locked([task])
+                self._changed()
+
+    def task_done(self, task: Optional[DownloadTask] = None, success: Optional[bool] = None):
+        """Finish a task taken with get(). Failed tasks stay recorded as FAILED;
+        finished, skipped or cancelled ones (success None) are forgotten."""
+        if task is None:
+            return
+        with self._cond:
+            self._running.pop(task.task_id, None)
+            if success is False:
+                task.state = FAILED
+                self._save_locked([task])
+            else:
+                task.state = DONE
+                self._forget_locked([task])
+            self._changed()
+
+    # ------------------------------ Reordering --------------------------------
+
+    def _index(self, task_id: int) -> int:
+        for index, task in enumerate(self._tasks):
+            if task.task_id == task_id:
+                return index
+        return -1
+
+    def move(self, task_id: int, offset: int) -> bool:
+        """Move a queued task offset places (negative = towards the front)"""
+        with self._cond:
+            index = self._index(task_id)
+            if index < 0:
+                return False
+            task = self._tasks.pop(index)
+            self._tasks.insert(max(0, min(len(self._tasks), index + offset)), task)
+            self._save_locked(self._tasks)
+            self._changed()
+            return True
+
+    def move_to_top(self, task_id: int) -> bool:
+        """Put a task first; a main model brings its waiting companions along, ahead of it"""
+        with self._cond:
+            index = self._index(task_id)
+            if index < 0:
+                return False
+            task = self._tasks[index]
+            moved = [task]
+            if task.role == MAIN:
+                moved = [t for t in self._tasks
+                         if t.group == task.group and t.role == COMPANION] + [task]
+            self._tasks = moved + [t for t in self._tasks if t not in moved]
+            self._save_locked(self._tasks)
+            self._changed()
+            return True
+
+    def remove(self, task_id: int) -> Optional[DownloadTask]:
+        with self._cond:
+            index = self._index(task_id)
+            if index < 0:
+                return None
+            task = self._tasks.pop(index)
+            self._forget_locked([task])
+            self._changed()
+            return task
+
+    def clear(self) -> int:
+        """Drop every waiting task; returns how many there were"""
+        with self._cond:
+            count = len(self._tasks)
+            self._forget_locked(self._tasks)
+            self._tasks = []
+            self._changed()
+            return count
+
+    # ------------------------------ Inspection --------------------------------
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._tasks)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def snapshot(self) -> Tuple[List[Dict], List[Dict]]:
+        """(running, queued) task dicts in queue order"""
+        with self._cond:
+            return ([task.as_dict() for task in self._running.values()],
+                    [task.as_dict() for task in self._tasks])
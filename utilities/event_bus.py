@@ -0,0 +1,98 @@
+"""
+Event bus between the download workers and the Gradio UI.
+
+Log lines go into a ring buffer (a bounded deque) and each gets a sequence
+number. A UI poll asks for what came after the last number it saw and
+appends only those lines to what it shows, so a quiet tick costs one
+comparison and a busy one only the new lines.
+
+Progress is kept apart from the log and coalesced per key (one running
+task): a new progress line replaces the previous one instead of piling up,
+so fast progress updates from many range threads cost the UI nothing
+beyond the latest value.
+"""
+
+import collections
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+MAX_EVENTS = 500  # Log lines kept for the UI
+
+
+def format_event(event: Tuple[int, float, str]) -> str:
+    """A log event as shown in the UI, prefixed with its time"""
+    _, stamp, message = event
+    return f"[{time.strftime('%H:%M:%S', time.localtime(stamp))}] {message}"
+
+
+class EventBus:
+    """Sequence-numbered log ring buffer plus latest-value progress per key"""
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self._events = collections.deque(maxlen=max_events)  # (seq, timestamp, message)
+        self._progress: Dict[Hashable, str] = {}
+        self._seq = 0
+        self._progress_version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    @property
+    def progress_version(self) -> int:
+        return self._progress_version
+
+    # --------------------------------- Log -----------------------------------
+
+    def publish(self, message: str) -> int:
+        """Append a log line; returns its sequence number"""
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, time.time(), message))
+            return self._seq
+
+    def events_since(self, seq: int) -> Tuple[int, List[Tuple[int, float, str]]]:
+        """(last sequence number, events newer than seq); older ones may have rotated out"""
+        with self._lock:
+            if seq >= self._seq:
+                return self._seq, []
+            # Newest events sit at the right; walk back only as far as needed
+            newer = []
+            for event in reversed(self._events):
+                if event[0] <= seq:
+                    break
+                newer.append(event)
+            newer.reverse()
+            return self._seq, newer
+
+    def tail(self, count: int) -> List[str]:
+        """The last count log lines, formatted with their time"""
+        with self._lock:
+            events = list(self._events)[-count:]
+        return [format_event(event) for event in events]
+
+    # ------------------------------- Progress --------------------------------
+
+    def set_progress(self, key: Hashable, text: str):
+        with self._lock:
+            if self._progress.get(key) != text:
+                self._progress[key] = text
+                self._progress_version += 1
+
+    def clear_progress(self, key: Hashable):
+        with self._lock:
+            if self._progress.pop(key, None) is not None:
+                self._progress_version += 1
+
+    def progress(self) -> Dict[Hashable, str]:
+        with self._lock:
+            return dict(self._progress)
+
+    def progress_since(self, version: int) -> Tuple[int, Optional[Dict[Hashable, str]]]:
+        """(current version, progress by key) or (version, None) when nothing changed"""
+        with self._lock:
+            if version == self._progress_version:
+                return version, None
+            return self._progress_version, dict(self._progress)
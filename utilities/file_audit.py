@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Bulk SHA256 audit of downloaded files.
+
+Checking already-present files one at a time keeps a single core busy while
+the disk sits mostly idle; on a fresh pod with a few hundred GB of models
+that takes far too long. audit_files() hashes many files at once in a
+process pool (each worker reads with one large reusable readinto buffer),
+hands the largest files out first so a single huge checkpoint doesn't end up
+alone at the tail, records every match in the downloader's verified cache
+and returns the files grouped as verified / corrupt / missing / unverified.
+
+Usage:
+    python utilities/file_audit.py --repo MonsterMMORPG/Wan_GGUF --dir models/Wan
+    python utilities/file_audit.py --repo MonsterMMORPG/Wan_GGUF --subfolder Index_TTS2 --dir index-tts/checkpoints
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+
+AUDIT_BUFFER_SIZE = 16 * 1024 * 1024   # readinto buffer per worker
+SMALL_FILE_SIZE = 1024                 # Files this small are treated as missing, like download_models does
+
+
+def hash_file(path: str, buffer_size: int = AUDIT_BUFFER_SIZE) -> Tuple[Optional[str], Optional[str]]:
+    """(sha256, error) of one file; runs inside the pool workers.
+
+    Same loop as hashlib.file_digest, but with a much larger buffer than its
+    fixed 256 KB so each read is one big sequential request.
+    """
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            if hasattr(os, 'posix_fadvise'):
+                try:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    pass
+            digest = hashlib.sha256()
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                digest.update(view[:size])
+        return digest.hexdigest(), None
+    except OSError as e:
+        return None, str(e)
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if value < 1024.0:
+            return f"{value:.2f} {unit}"
+        value /= 1024.0
+    return f"{value:.2f} PB"
+
+
+def audit_files(downloader, entries: List[Dict], workers: Optional[int] = None,
+                use_cache: bool = True) -> Dict[str, List[Dict]]:
+    """Verify many local files against their expected SHA256 in parallel.
+
+    Args:
+        downloader: RobustDownloader whose verified cache is read and updated
+        entries: dicts with "repo_id", "filename" (path in the repo), "path"
+            (local file), "sha256" (expected, may be None) and optionally
+            "size" (expected bytes)
+        workers: hashing processes (default: config["audit_workers"], 0 = one per CPU)
+        use_cache: skip files the verified cache already vouches for
+
+    Returns:
+        {"verified": [...], "corrupt": [...], "missing": [...], "unverified": [...]}
+        holding the input entries. Verified entries get "cached": bool,
+        corrupt ones an "error" explaining why.
+    """
+    report = {"verified": [], "corrupt": [], "missing": [], "unverified": []}
+    jobs = []
+
+    for entry in entries:
+        path = entry["path"]
+        if not os.path.isfile(path) or os.path.getsize(path) <= SMALL_FILE_SIZE:
+            report["missing"].append(entry)
+            continue
+        actual_size = os.path.getsize(path)
+        if entry.get("size") and entry["size"] > 0 and actual_size != entry["size"]:
+            report["corrupt"].append(dict(entry, error=f"size {actual_size} != {entry['size']}"))
+            continue
+        if not entry.get("sha256"):
+            report["unverified"].append(entry)
+            continue
+        if use_cache and downloader.is_file_verified(entry["repo_id"], entry["filename"], path, entry["sha256"]):
+            report["verified"].append(dict(entry, cached=True))
+            continue
+        jobs.append((actual_size, entry))
+
+    if not jobs:
+        return report
+
+    # Largest first: the long hashes start right away and the small ones fill the gaps
+    jobs.sort(key=lambda job: job[0], reverse=True)
+    total_bytes = sum(size for size, _ in jobs)
+    if workers is None:
+        workers = downloader.config.get("audit_workers", 0)
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    downloader.log(f"[VERIFYING] {len(jobs)} files ({_format_bytes(total_bytes)}) with {workers} processes...")
+
+    def record(entry: Dict, size: int, sha: Optional[str], error: Optional[str]):
+        name = entry["filename"]
+        if error:
+            report["corrupt"].append(dict(entry, error=error))
+            downloader.log(f"[ERROR] Could not read {name}: {error}")
+        elif sha == entry["sha256"]:
+            downloader.mark_file_verified(entry["repo_id"], entry["filename"], entry["path"], sha)
+            report["verified"].append(dict(entry, cached=False))
+            downloader.log(f"[VERIFIED] {name} ({_format_bytes(size)})")
+        else:
+            report["corrupt"].append(dict(entry, error=f"SHA256 mismatch (got {sha[:16]}...)"))
+            downloader.log(f"[ERROR] SHA256 mismatch: {name}")
+
+    def cancelled() -> bool:
+        return bool(downloader.cancel_event and downloader.cancel_event.is_set())
+
+    start_time = time.time()
+    if workers == 1:
+        for size, entry in jobs:
+            if cancelled():
+                break
+            record(entry, size, *hash_file(entry["path"]))
+    else:
+        # Spawned, not forked: the app calls this from a process running download,
+        # event-loop and mover threads whose locks a fork would copy mid-use
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                          mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = {executor.submit(hash_file, entry["path"]): (size, entry) for size, entry in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                size, entry = futures[future]
+                try:
+                    sha, error = future.result()
+                except Exception as e:
+                    sha, error = None, str(e)
+                record(entry, size, sha, error)
+                if cancelled():
+                    downloader.log("[INFO] Audit cancelled")
+                    break
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = max(time.time() - start_time, 0.001)
+    downloader.log(f"[INFO] Hashed {_format_bytes(total_bytes)} in {elapsed:.1f}s "
+                   f"({_format_bytes(total_bytes / elapsed)}/s)")
+    return report
+
+
+def print_audit_summary(report: Dict[str, List[Dict]]):
+    """Print counts and the files that need attention"""
+    verified = report["verified"]
+    cached = sum(1 for entry in verified if entry.get("cached"))
+    print(f"\n{'='*50}")
+    print("Audit summary:")
+    print(f"  Verified:   {len(verified)} ({cached} from cache)")
+    print(f"  Corrupt:    {len(report['corrupt'])}")
+    print(f"  Missing:    {len(report['missing'])}")
+    print(f"  Unverified: {len(report['unverified'])} (no SHA256 published)")
+    for entry in report["corrupt"]:
+        print(f"  ✗ {entry['path']}: {entry.get('error', 'corrupt')}")
+    for entry in report["missing"]:
+        print(f"  ? {entry['path']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify downloaded HuggingFace files against their SHA256")
+    parser.add_argument("--repo", required=True, help="HuggingFace repository ID")
+    parser.add_argument("--dir", required=True, help="Local directory holding the files")
+    parser.add_argument("--subfolder", default="", help="Only audit this repo subfolder (stored without the prefix)")
+    parser.add_argument("--revision", default="main", help="Branch, tag or commit to check against")
+    parser.add_argument("--workers", type=int, default=0, help="Hashing processes (0 = one per CPU)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-hash files the verified cache already vouches for")
+    args = parser.parse_args()
+
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    from utilities.HF_model_downloader import DEFAULT_DOWNLOAD_CONFIG, REPO_METADATA, create_downloader
+
+    listing = REPO_METADATA.get_repo(args.repo, args.revision)
+    if not listing:
+        print(f"Error: Could not list {args.repo}@{args.revision}")
+        sys.exit(2)
+
+    prefix = args.subfolder.strip("/") + "/" if args.subfolder else ""
+    entries = []
+    for filename, info in listing["files"].items():
+        if not filename.startswith(prefix):
+            continue
+        entries.append({
+            "repo_id": args.repo,
+            "filename": filename,
+            "path": os.path.normpath(os.path.join(args.dir, filename[len(prefix):])),
+            "sha256": info["sha256"],
+            "size": info["size"],
+        })
+
+    downloader = create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread")
+    report = audit_files(downloader, entries, workers=args.workers, use_cache=not args.no_cache)
+    print_audit_summary(report)
+    sys.exit(1 if report["corrupt"] else 0)
+
+
+if __name__ == "__main__":
+    main()
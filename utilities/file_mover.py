@@ -0,0 +1,182 @@
+"""
+Background mover for downloads staged on local scratch.
+
+RunPod's /workspace is a network volume: 16 range connections writing at
+random offsets into it are much slower than into the pod's local NVMe. With
+``scratch_dir`` set, RobustDownloader downloads and verifies a file on
+scratch and hands it to FILE_MOVER, which streams it to its real path from
+one background thread while the next download is already running.
+
+The backlog is bounded: a download that finishes while ``backlog`` files are
+already waiting or moving blocks until one has landed, so scratch never
+fills up with finished files. Code that needs a file at its final path
+registers a callback with after() or blocks in wait().
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+DEFAULT_BACKLOG = 2             # Finished files waiting for (or in) the move
+COPY_BLOCK = 16 * 1024 * 1024
+
+
+def _format_bytes(value: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if value < 1024.0:
+            return f"{value:.2f} {unit}"
+        value /= 1024.0
+    return f"{value:.2f} PB"
+
+
+class _Move:
+    def __init__(self, src: str, dst: str, log: Callable[[str], None], write_behind: int):
+        self.src = src
+        self.dst = dst
+        self.log = log
+        self.write_behind = write_behind
+        self.started = False
+        self.ok: Optional[bool] = None
+        self.done = threading.Event()
+        self.callbacks = []
+
+
+class FileMover:
+    """One background thread moving staged files to their targets, in submit order"""
+
+    def __init__(self, backlog: int = DEFAULT_BACKLOG):
+        self.backlog = backlog
+        self._moves: Dict[str, _Move] = {}  # Target path -> move waiting or running
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def set_backlog(self, backlog: int):
+        with self._cond:
+            self.backlog = max(1, backlog)
+            self._cond.notify_all()
+
+    def submit(self, src: str, dst: str, log: Callable[[str], None] = print, write_behind: int = 0):
+        """Queue src to be moved to dst; blocks while the backlog is full"""
+        dst = os.path.abspath(dst)
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._moves) < max(1, self.backlog) and dst not in self._moves)
+            self._moves[dst] = _Move(src, dst, log, write_behind)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="file-mover", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def is_pending(self, dst: str) -> bool:
+        with self._cond:
+            return os.path.abspath(dst) in self._moves
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._moves)
+
+    def wait(self, dst: str, timeout: Optional[float] = None) -> Optional[bool]:
+        """Wait for the move to dst; True/False once it landed or failed, None if none was pending"""
+        with self._cond:
+            move = self._moves.get(os.path.abspath(dst))
+        if move is None:
+            return None
+        move.done.wait(timeout)
+        return move.ok
+
+    def after(self, dst: str, callback: Callable[[bool], None]):
+        """Run callback(ok) once the move to dst has finished; right away if none is pending"""
+        with self._cond:
+            move = self._moves.get(os.path.abspath(dst))
+            if move is not None:
+                move.callbacks.append(callback)
+                return
+        callback(os.path.exists(dst))
+
+    def wait_all(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._moves)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: any(not move.started for move in self._moves.values()))
+                move = next(move for move in self._moves.values() if not move.started)
+                move.started = True
+            ok = self._move(move)
+            with self._cond:
+                move.ok = ok
+                del self._moves[move.dst]
+                callbacks = move.callbacks
+                move.done.set()
+                self._cond.notify_all()
+            for callback in callbacks:
+                try:
+                    callback(ok)
+                except Exception as e:
+                    move.log(f"[WARNING] After moving {os.path.basename(move.dst)}: {e}")
+
+    def _move(self, move: _Move) -> bool:
+        name = os.path.basename(move.dst)
+        temp_path = f"{move.dst}.moving"
+        started = time.time()
+        try:
+            os.makedirs(os.path.dirname(move.dst), exist_ok=True)
+            size = os.path.getsize(move.src)
+            if os.stat(move.src).st_dev == os.stat(os.path.dirname(move.dst)).st_dev:
+                os.replace(move.src, move.dst)
+            else:
+                self._copy(move, temp_path)
+                os.replace(temp_path, move.dst)
+                os.remove(move.src)
+            try:
+                os.rmdir(os.path.dirname(move.src))  # Per-target staging directory
+            except OSError:
+                pass
+            elapsed = max(0.001, time.time() - started)
+            move.log(f"[OK] Moved {name} to {os.path.dirname(move.dst)} "
+                     f"({_format_bytes(size)} at {_format_bytes(size / elapsed)}/s)")
+            return True
+        except Exception as e:
+            move.log(f"[ERROR] Could not move {name} from scratch to {os.path.dirname(move.dst)}: {e} "
+                     f"(the verified file stays at {move.src})")
+            try:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+    @staticmethod
+    def _copy(move: _Move, temp_path: str):
+        """Stream src into temp_path and make it durable before the rename"""
+        try:
+            from .HF_model_downloader import WriteBehind
+        except ImportError:
+            from HF_model_downloader import WriteBehind
+        with open(move.src, 'rb') as fsrc, open(temp_path, 'wb') as fdst:
+            write_behind = WriteBehind(fdst.fileno(), move.write_behind)
+            offset = 0
+            for block in iter(lambda: fsrc.read(COPY_BLOCK), b''):
+                fdst.write(block)
+                write_behind.wrote(offset, len(block))
+                offset += len(block)
+            fdst.flush()
+            write_behind.finish()
+            os.fsync(fdst.fileno())
+        os.utime(temp_path, (os.path.getatime(move.src), os.path.getmtime(move.src)))
+
+
+# Shared by every downloader in the process
+FILE_MOVER = FileMover()
+
+
+def _finish_moves_at_exit():
+    pending = FILE_MOVER.pending_count()
+    if pending:
+        print(f"[INFO] Waiting for {pending} file(s) to finish moving from scratch...", flush=True)
+        FILE_MOVER.wait_all()
+
+
+atexit.register(_finish_moves_at_exit)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+LAN peer cache for HuggingFace downloads.
+
+Pods in the same region all pull the same 100+ GB from HuggingFace. One of
+them can run a small HTTP server (PeerCacheServer) that exposes the files
+its downloader has already SHA256-verified, with Range support so the
+normal parallel in-place downloader can use it:
+
+    GET/HEAD /sha256/<sha256>             file with that content
+    GET/HEAD /files/<repo_id>/<filename>  file by repo path
+    GET      /index                       {"<repo_id>/<filename>": {"sha256", "size"}}
+
+Downloaders configured with ``peers`` ask PEER_RESOLVER for a peer that has
+the expected SHA256 and only fall back to HuggingFace when none does. The
+SHA256 always comes from HuggingFace metadata and every download is verified
+against it, so bytes from a peer are as trustworthy as bytes from the origin.
+
+Usage:
+    python utilities/peer_cache.py --port 8765
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent
+
+DEFAULT_PORT = 8765
+INDEX_REFRESH = 30.0    # Seconds between rebuilds of the served-file index
+MISS_REFRESH = 5.0      # Rebuild at most this often when a request misses
+PEER_TIMEOUT = 2.0      # Seconds to wait for a peer to answer a lookup
+DEAD_PEER_TTL = 60.0    # Seconds a peer that didn't answer is skipped
+
+
+class PeerIndex:
+    """Verified files a downloader knows about, by SHA256 and by repo path"""
+
+    def __init__(self, downloader):
+        self.downloader = downloader
+        self.by_sha = {}
+        self.by_name = {}
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, min_age: float = 0.0):
+        with self._lock:
+            if time.time() - self._built_at < min_age:
+                return
+            cache = self.downloader.verified_cache
+            entries = cache.snapshot() if hasattr(cache, 'snapshot') else dict(cache)
+            by_sha, by_name = {}, {}
+            for key, info in entries.items():
+                if isinstance(info, dict) and info.get('sha256') and info.get('path'):
+                    by_sha[info['sha256']] = info
+                    by_name[key] = info
+            self.by_sha, self.by_name = by_sha, by_name
+            self._built_at = time.time()
+
+    @staticmethod
+    def _still_valid(info: Dict) -> bool:
+        """The file must be unchanged since it was verified"""
+        try:
+            st = os.stat(info['path'])
+        except OSError:
+            return False
+        return st.st_size == info.get('size') and abs(st.st_mtime - info.get('mtime', 0)) < 1.0
+
+    def lookup(self, sha256: Optional[str] = None, name: Optional[str] = None) -> Optional[Dict]:
+        self.refresh(INDEX_REFRESH)
+        table, key = (self.by_sha, sha256) if sha256 else (self.by_name, name)
+        info = table.get(key)
+        if info is None:
+            self.refresh(MISS_REFRESH)
+            table = self.by_sha if sha256 else self.by_name
+            info = table.get(key)
+        return info if info and self._still_valid(info) else None
+
+    def listing(self) -> Dict[str, Dict]:
+        self.refresh(INDEX_REFRESH)
+        return {name: {'sha256': info['sha256'], 'size': info.get('size')}
+                for name, info in self.by_name.items() if self._still_valid(info)}
+
+
+class PeerRequestHandler(BaseHTTPRequestHandler):
+    """Serves verified files from server.index with single-range support"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _empty(self, status: int, headers: Optional[Dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _resolve(self) -> Optional[Dict]:
+        path = urllib.parse.unquote(self.path.split('?')[0])
+        if path.startswith('/sha256/'):
+            return self.server.index.lookup(sha256=path[len('/sha256/'):].lower())
+        if path.startswith('/files/'):
+            return self.server.index.lookup(name=path[len('/files/'):])
+        return None
+
+    def _send_file(self, head_only: bool):
+        info = self._resolve()
+        if info is None:
+            self._empty(404)
+            return
+        size = info['size']
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if range_header:
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', range_header.strip())
+            if not match or int(match.group(1)) >= size:
+                self._empty(416, {'Content-Range': f'bytes */{size}'})
+                return
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            if end < start:
+                self._empty(416, {'Content-Range': f'bytes */{size}'})
+                return
+        try:
+            f = open(info['path'], 'rb')
+        except OSError:
+            self._empty(404)
+            return
+        with f:
+            self.send_response(206 if range_header else 200)
+            if range_header:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', f'"{info["sha256"]}"')
+            self.send_header('X-Sha256', info['sha256'])
+            self.end_headers()
+            if head_only:
+                return
+            self.wfile.flush()
+            self.connection.sendfile(f, start, end - start + 1)
+        self.server.bytes_served += end - start + 1
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/index':
+            body = json.dumps(self.server.index.listing()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self._send_file(False)
+
+    def do_HEAD(self):
+        self._send_file(True)
+
+
+class PeerCacheServer:
+    """HTTP server exposing a downloader's verified files to other pods"""
+
+    def __init__(self, downloader, host: str = "0.0.0.0", port: int = DEFAULT_PORT):
+        self.httpd = ThreadingHTTPServer((host, port), PeerRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.index = PeerIndex(downloader)
+        self.httpd.bytes_served = 0
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "PeerCacheServer":
+        """Serve in a background thread"""
+        self.httpd.index.refresh()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="peer-cache", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class PeerResolver:
+    """Finds a peer holding a file with a given SHA256; dead peers are skipped for a while"""
+
+    def __init__(self, timeout: float = PEER_TIMEOUT, dead_ttl: float = DEAD_PEER_TTL):
+        self.timeout = timeout
+        self.dead_ttl = dead_ttl
+        self._dead_until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def base_url(peer: str) -> str:
+        peer = peer.strip().rstrip('/')
+        return peer if '://' in peer else f"http://{peer}"
+
+    def find(self, peers: List[str], sha256: str, size: int) -> Optional[str]:
+        """URL of the file on the first peer that has it, or None"""
+        for peer in peers:
+            with self._lock:
+                if self._dead_until.get(peer, 0) > time.time():
+                    continue
+            url = f"{self.base_url(peer)}/sha256/{sha256}"
+            try:
+                response = requests.head(url, timeout=self.timeout)
+            except requests.RequestException:
+                with self._lock:
+                    self._dead_until[peer] = time.time() + self.dead_ttl
+                continue
+            if response.status_code == 200 and response.headers.get('Content-Length') == str(size):
+                return url
+        return None
+
+
+# Shared by every RobustDownloader in the process
+PEER_RESOLVER = PeerResolver()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve already-downloaded, verified models to other pods")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    args = parser.parse_args()
+
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    from utilities.HF_model_downloader import DEFAULT_DOWNLOAD_CONFIG, create_downloader
+
+    server = PeerCacheServer(create_downloader(DEFAULT_DOWNLOAD_CONFIG, "thread"), args.host, args.port).start()
+    print(f"Peer cache serving {len(server.httpd.index.by_sha)} verified files on {server.address}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
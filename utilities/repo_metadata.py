@@ -0,0 +1,110 @@
+"""
+Repo-level metadata resolver for HuggingFace downloads.
+
+One ``model_info(files_metadata=True)`` call returns the commit a revision
+points at plus the size and LFS SHA256 of every file in the repo. Resolving
+that once per repo and revision replaces the per-file metadata lookup, HEAD
+and ranged GET that used to run before every download, so a 40-file bundle
+or snapshot starts moving bytes after a single request.
+
+Results are kept in memory for the whole process (shared by every
+downloader the Gradio workers create). Branch names are re-resolved after a
+few minutes; commit hashes never change and are kept for good.
+"""
+
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from huggingface_hub import HfApi
+
+BRANCH_TTL = 600      # Seconds before a branch/tag listing is fetched again
+FAILURE_TTL = 60      # Seconds before retrying a repo whose listing failed
+COMMIT_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+class RepoMetadataResolver:
+    """Process-wide cache of {filename: {"size", "sha256"}} per repo and revision"""
+
+    def __init__(self, branch_ttl: float = BRANCH_TTL, failure_ttl: float = FAILURE_TTL):
+        self.branch_ttl = branch_ttl
+        self.failure_ttl = failure_ttl
+        self.requests_made = 0
+        self._entries = {}      # (repo_id, revision) -> (expires_at, listing or None)
+        self._lock = threading.Lock()
+        self._key_locks = {}    # One fetch per repo/revision even with several workers asking
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and (entry[0] is None or entry[0] > time.time()):
+            return True, entry[1]
+        return False, None
+
+    def get_repo(self, repo_id: str, revision: str = "main") -> Optional[Dict]:
+        """Listing for a repo revision, fetched at most once per TTL.
+
+        Returns ``{"commit": str, "files": {filename: {"size": int, "sha256": str|None}}}``
+        or None when the Hub can't be asked (offline, gated repo, ...); callers
+        then fall back to per-file probing.
+        """
+        key = (repo_id, revision)
+        found, listing = self._cached(key)
+        if found:
+            return listing
+        with self._key_lock(key):
+            found, listing = self._cached(key)
+            if found:
+                return listing
+            listing = self._fetch(repo_id, revision)
+            if listing is None:
+                expires_at = time.time() + self.failure_ttl
+            elif COMMIT_RE.match(revision):
+                expires_at = None
+            else:
+                expires_at = time.time() + self.branch_ttl
+            with self._lock:
+                self._entries[key] = (expires_at, listing)
+                if listing is not None:
+                    # The resolved commit is immutable; remember it under its own name too
+                    self._entries[(repo_id, listing["commit"])] = (None, listing)
+            return listing
+
+    def _fetch(self, repo_id: str, revision: str) -> Optional[Dict]:
+        self.requests_made += 1
+        try:
+            info = HfApi().model_info(repo_id, revision=revision, files_metadata=True)
+        except Exception as e:
+            print(f"[WARNING] Could not list {repo_id}@{revision} metadata, probing files one by one: {e}")
+            return None
+        files = {}
+        for sibling in info.siblings or []:
+            lfs = sibling.lfs
+            files[sibling.rfilename] = {
+                "size": lfs.get('size') if lfs else sibling.size,
+                "sha256": lfs.get('sha256') if lfs else None,
+            }
+        print(f"[INFO] Resolved {repo_id}@{revision} -> {info.sha[:12]} ({len(files)} files, 1 request)")
+        return {"commit": info.sha, "files": files}
+
+    def get_file(self, repo_id: str, filename: str, revision: str = "main") -> Optional[Dict]:
+        """``{"size", "sha256", "commit"}`` for one file, or None if unknown"""
+        listing = self.get_repo(repo_id, revision)
+        if not listing or filename not in listing["files"]:
+            return None
+        return dict(listing["files"][filename], commit=listing["commit"])
+
+    def invalidate(self, repo_id: Optional[str] = None):
+        """Forget cached listings (all repos, or one)"""
+        with self._lock:
+            for key in [k for k in self._entries if repo_id is None or k[0] == repo_id]:
+                del self._entries[key]
+
+
+# Shared by every RobustDownloader in the process
+REPO_METADATA = RepoMetadataResolver()
@@ -0,0 +1,651 @@
+"""
+Fault-injection tests for the chunked downloader.
+
+A local Range server stands in for HuggingFace and misbehaves on request:
+it truncates bodies, resets connections mid-chunk, stalls or crawls, rate
+limits, ignores the Range header or answers with the wrong Content-Range. Every test checks the output byte
+for byte, and the server logs what it sent, so the tests can also prove that
+a resume never fetches completed data again, including after the download
+process was killed between checkpoints. A LAN peer cache running in a second
+process stands in for another pod that already has the file.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+# Add parent directory to path for imports
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from utilities.HF_model_downloader import RobustDownloader, DEFAULT_DOWNLOAD_CONFIG
+
+FILE_SIZE = 4 * 1024 * 1024 + 123  # Not a multiple of anything the downloader uses
+DATA = bytes((i * 7 + i // 251) & 0xFF for i in range(FILE_SIZE))
+DATA_SHA = hashlib.sha256(DATA).hexdigest()
+WRITE_BLOCK = 16 * 1024
+
+TEST_CONFIG = dict(
+    DEFAULT_DOWNLOAD_CONFIG,
+    num_connections=4,
+    chunk_size=64 * 1024,
+    retry_delay=0,
+    max_retry_delay=0,
+    timeout=10,
+    journal_interval=0.05,
+    journal_fsync=False,
+    segment_size=512 * 1024,
+    min_split_size=128 * 1024,
+    adaptive_connections=False,
+)
+
+# Faults the server can inject into the next GET
+TRUNCATE = "truncate"            # Full Content-Length, half the body, then a clean close
+RESET = "reset"                  # A quarter of the body, a pause to let it arrive, then a TCP reset
+IGNORE_RANGE = "ignore_range"    # 200 with the whole file
+WRONG_RANGE = "wrong_range"      # 206 whose Content-Range starts later than asked
+STALL = "stall"                  # A quarter of the body, then silence with the connection held open
+CRAWL = "crawl"                  # The whole body at CRAWL_RATE
+CRAWL_RATE = 64 * 1024
+THROTTLE = "throttle"            # 429 with Retry-After: RETRY_AFTER
+RETRY_AFTER = 1
+
+
+class FaultyRangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.server.data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+        try:
+            self.send_range()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def send_range(self):
+        data = self.server.data
+        started = time.monotonic()
+        start, end = 0, len(data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        fault = self.server.take_fault()
+        if fault == THROTTLE:
+            self.send_response(429)
+            self.send_header("Retry-After", str(RETRY_AFTER))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.server.record(started, time.monotonic(), int(match.group(1)) if match else 0, 0, fault,
+                               match is not None)
+            return
+        if match and fault != IGNORE_RANGE:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if fault == WRONG_RANGE:
+                start = min(end, start + 1024)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        limit = end - start + 1
+        if fault == TRUNCATE:
+            limit //= 2
+        elif fault in (RESET, STALL):
+            limit //= 4
+        rate = CRAWL_RATE if fault == CRAWL else self.server.rate
+        sent = 0
+        try:
+            while sent < limit:
+                block = data[start + sent:start + min(limit, sent + WRITE_BLOCK)]
+                self.wfile.write(block)
+                sent += len(block)
+                if rate:
+                    time.sleep(len(block) / rate)
+            self.wfile.flush()
+        except OSError:
+            pass
+        # Logged before the connection ends, so the client can't ask again first
+        self.server.record(started, time.monotonic(), start, sent, fault,
+                           match is not None and fault != IGNORE_RANGE)
+        if fault == STALL:
+            self.server.stopped.wait(60)
+        elif fault == RESET:
+            time.sleep(0.2)  # The client reads what was sent; the reset only loses the rest
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            self.connection.close()
+        elif fault == TRUNCATE:
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_WR)
+
+
+class FaultyRangeServer(ThreadingHTTPServer):
+    """Serves DATA with Range support and a script of faults for the next GETs"""
+    daemon_threads = True
+
+    def __init__(self, data: bytes = DATA):
+        super().__init__(("127.0.0.1", 0), FaultyRangeHandler)
+        self.data = data
+        self.rate = 0  # Bytes/s per response, 0 = unlimited
+        self.faults = collections.deque()
+        self.log = []  # (t_start, t_end, first byte, bytes sent, fault, ranged)
+        self.active = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/model.safetensors"
+
+    def add_faults(self, *faults):
+        with self.lock:
+            self.faults.extend(faults)
+
+    def take_fault(self):
+        with self.lock:
+            return self.faults.popleft() if self.faults else None
+
+    def record(self, *entry):
+        with self.lock:
+            self.log.append(entry)
+
+    def requests(self):
+        with self.lock:
+            return list(self.log)
+
+    def bytes_sent(self) -> int:
+        return sum(entry[3] for entry in self.requests())
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+
+@pytest.fixture(autouse=True)
+def private_caches(tmp_path, monkeypatch):
+    """Keep the cache database and tuning files of every test downloader out of the source tree"""
+    cache_dir = tmp_path / "caches"
+    cache_dir.mkdir()
+    monkeypatch.setitem(TEST_CONFIG, "cache_dir", str(cache_dir))
+
+
+@pytest.fixture
+def server():
+    srv = FaultyRangeServer()
+    yield srv
+    srv.stop()
+
+
+def make_downloader(**overrides) -> RobustDownloader:
+    return RobustDownloader(dict(TEST_CONFIG, **overrides))
+
+
+def chunk_bounds(num_chunks: int):
+    """The (start, end) of each .partN chunk, as download_parallel splits the file"""
+    base = FILE_SIZE // num_chunks
+    return [(i * base, FILE_SIZE - 1 if i == num_chunks - 1 else (i + 1) * base - 1)
+            for i in range(num_chunks)]
+
+
+def read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def assert_no_refetch(requests, done=()):
+    """No request asks for bytes that an earlier interrupted response delivered,
+    or that were already on disk (done: (start, end) pairs) when it started.
+
+    Meant for downloads where a range is only ever read by one connection:
+    when another connection takes over the rest of a range, the server may
+    have sent bytes the first one never used.
+    """
+    delivered = [(t_end, start, start + sent - 1) for _, t_end, start, sent, fault, ranged in requests
+                 if ranged and sent and fault in (TRUNCATE, RESET)]
+    for t_start, _, start, sent, fault, ranged in requests:
+        if not ranged:
+            continue
+        for t_end, first, last in delivered:
+            if t_end < t_start:
+                assert not (first <= start <= last), f"bytes {start}+ fetched again (already sent {first}-{last})"
+        for first, last in done:
+            assert not (first <= start <= last), f"bytes {start}+ fetched again (on disk {first}-{last})"
+
+
+# ------------------------------- download_chunk -------------------------------
+
+def test_chunk_resumes_partial_file(server, tmp_path):
+    """A partial .partN is continued from its end, not fetched again"""
+    target = str(tmp_path / "model.safetensors")
+    start, end = 1024 * 1024, 2 * 1024 * 1024 - 1
+    have = 300 * 1000
+    with open(f"{target}.part1", "wb") as f:
+        f.write(DATA[start:start + have])
+
+    assert make_downloader().download_chunk(server.url, start, end, target, 1)
+
+    assert read(f"{target}.part1") == DATA[start:end + 1]
+    assert [entry[2] for entry in server.requests()] == [start + have]
+    assert server.bytes_sent() == end - start + 1 - have
+
+
+def test_chunk_oversized_part_is_refetched(server, tmp_path):
+    """A .partN longer than its chunk is corrupt and downloaded again"""
+    target = str(tmp_path / "model.safetensors")
+    start, end = 0, 256 * 1024 - 1
+    with open(f"{target}.part0", "wb") as f:
+        f.write(DATA[:end + 1] + b"garbage")
+
+    assert make_downloader().download_chunk(server.url, start, end, target, 0)
+
+    assert read(f"{target}.part0") == DATA[:end + 1]
+    assert server.bytes_sent() == end + 1
+
+
+@pytest.mark.parametrize("fault", [TRUNCATE, RESET])
+def test_chunk_interrupted_body_resumes(server, tmp_path, fault):
+    """A body cut short is resumed where it stopped; nothing is fetched twice"""
+    target = str(tmp_path / "model.safetensors")
+    start, end = 1024 * 1024, 2 * 1024 * 1024 - 1
+    server.add_faults(fault)
+
+    assert make_downloader().download_chunk(server.url, start, end, target, 1)
+
+    assert read(f"{target}.part1") == DATA[start:end + 1]
+    requests = server.requests()
+    assert len(requests) == 2
+    assert requests[1][2] > start
+    # Everything the server sent was kept
+    assert server.bytes_sent() == end - start + 1
+    assert_no_refetch(requests)
+
+
+@pytest.mark.parametrize("fault", [IGNORE_RANGE, WRONG_RANGE])
+def test_chunk_rejects_wrong_range(server, tmp_path, fault):
+    """A 200 or a shifted Content-Range is never written into a chunk"""
+    target = str(tmp_path / "model.safetensors")
+    start, end = 1024 * 1024, 2 * 1024 * 1024 - 1
+    server.add_faults(fault)
+
+    assert make_downloader().download_chunk(server.url, start, end, target, 1)
+
+    assert read(f"{target}.part1") == DATA[start:end + 1]
+    assert len(server.requests()) == 2
+
+
+# ----------------------------- merge_chunks -----------------------------------
+
+def test_merge_chunks_missing_part(tmp_path):
+    """A missing part fails the merge and leaves the other parts alone"""
+    target = str(tmp_path / "model.safetensors")
+    bounds = chunk_bounds(3)
+    for i in (0, 2):
+        with open(f"{target}.part{i}", "wb") as f:
+            f.write(DATA[bounds[i][0]:bounds[i][1] + 1])
+
+    assert not make_downloader().merge_chunks(target, 3)
+
+    assert not os.path.exists(target)
+    assert os.path.exists(f"{target}.part0") and os.path.exists(f"{target}.part2")
+
+
+def test_merge_chunks_byte_exact(tmp_path):
+    target = str(tmp_path / "model.safetensors")
+    for i, (start, end) in enumerate(chunk_bounds(4)):
+        with open(f"{target}.part{i}", "wb") as f:
+            f.write(DATA[start:end + 1])
+
+    assert make_downloader().merge_chunks(target, 4)
+
+    assert read(target) == DATA
+    assert not any(os.path.exists(f"{target}.part{i}") for i in range(4))
+
+
+# ---------------------------- download_parallel -------------------------------
+
+def test_parallel_refetches_only_missing_chunk(server, tmp_path):
+    """With .part0 and .part2 on disk only chunk 1 is requested"""
+    target = str(tmp_path / "model.safetensors")
+    bounds = chunk_bounds(3)
+    for i in (0, 2):
+        with open(f"{target}.part{i}", "wb") as f:
+            f.write(DATA[bounds[i][0]:bounds[i][1] + 1])
+
+    downloader = make_downloader(num_connections=3, preallocate=False)
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE)
+
+    assert read(target) == DATA
+    assert [entry[2] for entry in server.requests()] == [bounds[1][0]]
+    assert server.bytes_sent() == bounds[1][1] - bounds[1][0] + 1
+
+
+def test_in_place_imports_legacy_parts(server, tmp_path):
+    """.partN bytes from the chunked mode are copied into the partial file, not refetched"""
+    target = str(tmp_path / "model.safetensors")
+    bounds = chunk_bounds(TEST_CONFIG["num_connections"])
+    done = [(bounds[0][0], bounds[0][1]), (bounds[2][0], bounds[2][0] + 200 * 1000 - 1)]
+    for i, (start, last) in zip((0, 2), done):
+        with open(f"{target}.part{i}", "wb") as f:
+            f.write(DATA[start:last + 1])
+
+    downloader = make_downloader(preallocate=True, hedge_tail=False)
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE)
+
+    assert read(target) == DATA
+    assert not any(os.path.exists(f"{target}.part{i}") for i in range(TEST_CONFIG["num_connections"]))
+    assert_no_refetch(server.requests(), done)
+
+
+@pytest.mark.parametrize("preallocate", [False, True])
+def test_parallel_survives_every_fault(server, tmp_path, preallocate):
+    target = str(tmp_path / "model.safetensors")
+    server.add_faults(TRUNCATE, RESET, IGNORE_RANGE, WRONG_RANGE, TRUNCATE)
+
+    downloader = make_downloader(preallocate=preallocate)
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    assert read(target) == DATA
+    assert not os.path.exists(f"{target}.partial")
+
+
+def test_parked_workers_stop_after_a_range_fails():
+    """Workers parked above the connection limit don't wait for it to climb back once a range has failed"""
+    from utilities.HF_model_downloader import ConnectionController, RangeScheduler
+    from utilities.async_downloader import AsyncDownloader
+
+    failing_start = 5 * 1024
+
+    def fake_range(byte_range, scheduler):
+        if byte_range.start == failing_start:
+            return False
+        scheduler.commit(byte_range, byte_range.start + byte_range.done, byte_range.remaining)
+        return True
+
+    class FakeThreadDownloader(RobustDownloader):
+        def download_range(self, url, byte_range, output, scheduler, controller, slot, watchdog=None):
+            return fake_range(byte_range, scheduler)
+
+    class FakeAsyncDownloader(AsyncDownloader):
+        async def _download_range_async(self, session, url, byte_range, output, scheduler, controller,
+                                        slot, watchdog=None):
+            return fake_range(byte_range, scheduler)
+
+    for downloader_class in (FakeThreadDownloader, FakeAsyncDownloader):
+        scheduler = RangeScheduler([[i * 1024, i * 1024 + 1023, 0] for i in range(20)], min_split_size=1024)
+        # Nothing feeds the controller, so its limit stays at 2 for good
+        controller = ConnectionController("127.0.0.1", initial=2, max_connections=16, adaptive=False)
+        downloader = downloader_class(dict(TEST_CONFIG))
+        worker = threading.Thread(target=downloader.run_range_workers,
+                                  args=("http://127.0.0.1/x", None, scheduler, controller, 16, lambda finished: None),
+                                  daemon=True)
+        worker.start()
+        worker.join(5)
+        assert not worker.is_alive(), downloader_class.__name__
+        assert [r.start for r in scheduler.incomplete()] == [failing_start]
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_budget_shared_between_downloads(tmp_path, engine):
+    """A download that starts while another holds the whole connection budget gets its share right away"""
+    from utilities.HF_model_downloader import CONNECTION_BUDGET, create_downloader
+
+    servers = [FaultyRangeServer(), FaultyRangeServer()]
+    for srv in servers:
+        srv.rate = 2 * 1024 * 1024
+    results = {}
+
+    def download(i):
+        downloader = create_downloader(dict(TEST_CONFIG, stall_ratio=0, stall_timeout=0, hedge_tail=False), engine)
+        results[i] = downloader.download_parallel(servers[i].url, str(tmp_path / f"model{i}.safetensors"),
+                                                  "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    CONNECTION_BUDGET.set_limit(TEST_CONFIG["num_connections"])
+    try:
+        workers = [threading.Thread(target=download, args=(i,)) for i in range(2)]
+        workers[0].start()
+        time.sleep(0.2)
+        workers[1].start()
+        for worker in workers:
+            worker.join(60)
+    finally:
+        CONNECTION_BUDGET.set_limit(0)
+        for srv in servers:
+            srv.stop()
+
+    assert results == {0: True, 1: True}
+    first, second = servers[0].requests(), servers[1].requests()
+    # The second download didn't have to wait for the first to finish
+    assert min(entry[0] for entry in second) < max(entry[1] for entry in first) - 0.5
+
+
+# ------------------------------- Tail latency ---------------------------------
+
+def test_watchdog_restarts_stalled_connection(server, tmp_path):
+    """A connection that goes silent is restarted long before the request timeout"""
+    target = str(tmp_path / "model.safetensors")
+    server.add_faults(STALL)
+
+    downloader = make_downloader(timeout=60, hedge_tail=False, stall_ratio=0, stall_timeout=1)
+    started = time.monotonic()
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    assert time.monotonic() - started < 10
+    assert read(target) == DATA
+    requests = server.requests()
+    stalled = next(entry for entry in requests if entry[4] == STALL)
+    # The rest of the stalled range came from a later request
+    assert any(stalled[2] < entry[2] <= stalled[2] + stalled[3] for entry in requests)
+
+
+def test_hedge_races_crawling_last_range(server, tmp_path):
+    """A duplicate request for a crawling range that can't be split finishes it instead"""
+    target = str(tmp_path / "model.safetensors")
+    server.add_faults(CRAWL)
+    segment = TEST_CONFIG["segment_size"]
+
+    # Segments are too small to split, so only a hedge can help
+    downloader = make_downloader(min_split_size=segment, stall_ratio=0, stall_timeout=0)
+    started = time.monotonic()
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    # The crawling response alone would need segment / CRAWL_RATE = 8s
+    assert time.monotonic() - started < segment / CRAWL_RATE / 2
+    assert read(target) == DATA
+    # The crawling response is cut short once the hedge has won
+    deadline = time.monotonic() + 10
+    while server.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    requests = server.requests()
+    crawled = next(entry for entry in requests if entry[4] == CRAWL)
+    assert any(entry is not crawled and crawled[2] <= entry[2] <= crawled[2] + crawled[3] for entry in requests)
+
+
+# ------------------------------- Rate limiting --------------------------------
+
+def test_rate_limit_pauses_every_connection(server, tmp_path):
+    """After a 429 no connection starts a request before Retry-After has passed"""
+    target = str(tmp_path / "model.safetensors")
+    server.rate = 4 * 1024 * 1024  # Keep the first ranges busy while the 429 arrives
+    server.add_faults(THROTTLE)
+
+    downloader = make_downloader(stall_ratio=0, stall_timeout=0, hedge_tail=False)
+    assert downloader.download_parallel(server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    assert read(target) == DATA
+    requests = server.requests()
+    throttled = next(entry for entry in requests if entry[4] == THROTTLE)
+    # Requests already on their way when the 429 went out aside, nothing starts before Retry-After
+    early = [entry for entry in requests if throttled[1] + 0.05 < entry[0] < throttled[1] + RETRY_AFTER * 0.9]
+    assert not early
+    retried = [entry[0] for entry in requests if entry[2] == throttled[2] and entry[0] > throttled[1]]
+    assert retried and retried[0] >= throttled[1] + RETRY_AFTER * 0.9
+
+
+# ------------------------------- LAN peer cache -------------------------------
+
+PEER_SCRIPT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from utilities.HF_model_downloader import RobustDownloader
+from utilities.peer_cache import PeerCacheServer
+config, path, sha = json.loads(sys.argv[2])
+downloader = RobustDownloader(config)
+downloader.mark_file_verified("org/model", "model.safetensors", path, sha)
+server = PeerCacheServer(downloader, "127.0.0.1", 0).start()
+print(server.address, flush=True)
+sys.stdin.readline()
+"""
+
+
+def test_peer_cache_serves_verified_file(server, tmp_path):
+    """Another process serving a verified file is used before the origin, and the origin once it is gone"""
+    import requests
+    from utilities.peer_cache import PeerResolver
+
+    seeded = tmp_path / "peer" / "model.safetensors"
+    seeded.parent.mkdir()
+    seeded.write_bytes(DATA)
+    peer_config = dict(TEST_CONFIG, cache_dir=str(tmp_path / "peer"))
+    peer = subprocess.Popen([sys.executable, "-c", PEER_SCRIPT, REPO_ROOT, json.dumps([peer_config, str(seeded), DATA_SHA])],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        address = peer.stdout.readline().strip()
+        assert address, "peer cache did not start"
+        base = f"http://{address}"
+
+        # Ranged GET by SHA256 and by repo path
+        response = requests.get(f"{base}/sha256/{DATA_SHA}", headers={"Range": "bytes=1000-1999"}, timeout=10)
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 1000-1999/{FILE_SIZE}"
+        assert response.content == DATA[1000:2000]
+        assert requests.get(f"{base}/files/org/model/model.safetensors", timeout=10).content == DATA
+        # A file the peer doesn't have
+        assert requests.head(f"{base}/sha256/{'0' * 64}", timeout=10).status_code == 404
+        assert PeerResolver().find([address], "0" * 64, FILE_SIZE) is None
+        assert PeerResolver().find([address], DATA_SHA, FILE_SIZE + 1) is None
+
+        # Downloaded from the peer; the origin sees no GET
+        target = str(tmp_path / "from_peer.safetensors")
+        downloader = make_downloader(peers=[address])
+        assert downloader.download_from_sources(server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+        assert read(target) == DATA
+        assert not server.requests()
+
+        # A file the peer doesn't have comes from the origin
+        other = bytes(reversed(DATA))
+        server.data = other
+        target = str(tmp_path / "not_on_peer.safetensors")
+        assert downloader.download_from_sources(server.url, target, "model.safetensors", FILE_SIZE,
+                                                hashlib.sha256(other).hexdigest())
+        assert read(target) == other
+        assert server.requests()
+        server.data = DATA
+    finally:
+        peer.stdin.close()
+        peer.wait(10)
+
+    # The peer is down: the download falls back to the origin
+    server.log.clear()
+    target = str(tmp_path / "peer_down.safetensors")
+    assert make_downloader(peers=[address]).download_from_sources(server.url, target, "model.safetensors",
+                                                                  FILE_SIZE, DATA_SHA)
+    assert read(target) == DATA
+    assert server.requests()
+
+
+# ------------------------- Resume after a killed process ----------------------
+
+CHILD_SCRIPT = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+from utilities.HF_model_downloader import RobustDownloader
+config, url, target, size, sha = json.loads(sys.argv[2])
+RobustDownloader(config).download_parallel(url, target, "model.safetensors", size, sha)
+"""
+
+
+def on_disk_ranges(target: str, preallocate: bool):
+    """(start, end) byte ranges a resume may treat as done"""
+    if preallocate:
+        with open(f"{target}.partial.json") as f:
+            journal = json.load(f)
+        return [(start, start + done - 1) for start, _, done in journal["ranges"] if done]
+    ranges = []
+    for i, (start, _) in enumerate(chunk_bounds(TEST_CONFIG["num_connections"])):
+        part = f"{target}.part{i}"
+        if os.path.exists(part) and os.path.getsize(part):
+            ranges.append((start, start + os.path.getsize(part) - 1))
+    return ranges
+
+
+@pytest.mark.parametrize("preallocate", [False, True])
+def test_resume_after_kill(server, tmp_path, preallocate):
+    """Kill the downloading process midway; the next run fetches only what is missing"""
+    target = str(tmp_path / "model.safetensors")
+    config = dict(TEST_CONFIG, preallocate=preallocate)
+    server.rate = 1024 * 1024  # ~1s per connection for the whole file
+    args = json.dumps([config, server.url, target, FILE_SIZE, DATA_SHA])
+    child = subprocess.Popen([sys.executable, "-c", CHILD_SCRIPT, REPO_ROOT, args],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Kill once a good part of the file is recorded as done on disk
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                if sum(last - first + 1 for first, last in on_disk_ranges(target, preallocate)) >= FILE_SIZE // 4:
+                    break
+            except (OSError, ValueError):
+                pass  # No journal yet
+            time.sleep(0.01)
+    finally:
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+
+    # The killed process's responses end once the server notices
+    deadline = time.monotonic() + 10
+    while server.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    done = on_disk_ranges(target, preallocate)
+    done_bytes = sum(last - first + 1 for first, last in done)
+    assert 0 < done_bytes < FILE_SIZE
+    first_run = len(server.requests())
+    server.rate = 0
+
+    # No range stealing, hedging or watchdog restarts: a connection cut short
+    # may have been sent bytes it never used, which would blur the byte count below
+    downloader = make_downloader(preallocate=preallocate, min_split_size=FILE_SIZE,
+                                 hedge_tail=False, stall_ratio=0, stall_timeout=0)
+    assert downloader.download_parallel(
+        server.url, target, "model.safetensors", FILE_SIZE, DATA_SHA)
+
+    assert read(target) == DATA
+    resumed = server.requests()[first_run:]
+    assert sum(entry[3] for entry in resumed) == FILE_SIZE - done_bytes
+    assert_no_refetch(resumed, done)
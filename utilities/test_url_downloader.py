@@ -13,6 +13,7 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utilities.url_downloader import create_url_downloader
+from utilities.HF_model_downloader import DEFAULT_DOWNLOAD_CONFIG
 from utilities.folder_manager import create_folder_manager
 
 
@@ -140,7 +141,7 @@ def test_download_simulation():
     with tempfile.TemporaryDirectory() as temp_dir:
         print(f"Using temporary directory: {temp_dir}")
         
-        downloader = create_url_downloader()
+        downloader = create_url_downloader(dict(DEFAULT_DOWNLOAD_CONFIG, cache_dir=temp_dir))
         folder_manager = create_folder_manager(temp_dir)
         
         # Test with a small file from httpbin